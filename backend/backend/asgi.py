@@ -10,11 +10,12 @@ django.setup()  # Ensures apps are loaded
 # Now safe to import middleware and routing
 from backend.jwt_middleware import JWTAuthMiddleware
 import meet.routing
+import movie.routing
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": JWTAuthMiddleware(
         URLRouter(
-            meet.routing.websocket_urlpatterns
+            meet.routing.websocket_urlpatterns + movie.routing.websocket_urlpatterns
         )
     ),
 })
@@ -177,6 +177,8 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+# Results are stored only for tasks that opt in with ignore_result=False (the chunks of a chord)
+CELERY_TASK_IGNORE_RESULT = True
 
 
 CHANNEL_LAYERS = {
@@ -189,15 +191,97 @@ CHANNEL_LAYERS = {
 }
 
 import os
+# Shared cache (issued LiveKit tokens); same Redis as Celery and Channels, own database
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_CACHE_URL', 'redis://localhost:6379/1'),
+    }
+}
+
 LIVEKIT_URL = os.getenv('LIVEKIT_URL', 'wss://localhost:7880')
 LIVEKIT_API_KEY = os.getenv('LIVEKIT_API_KEY')
 LIVEKIT_API_SECRET = os.getenv('LIVEKIT_API_SECRET')
-
+# Lifetime of participant tokens from GetLiveKitToken, in seconds
+LIVEKIT_TOKEN_TTL = int(os.getenv('LIVEKIT_TOKEN_TTL', 6 * 60 * 60))
+# A cached participant token is reissued once it has less than this many seconds left
+LIVEKIT_TOKEN_REFRESH_MARGIN = int(os.getenv('LIVEKIT_TOKEN_REFRESH_MARGIN', 10 * 60))
+# Max open connections of the shared LiveKit server API client, per process
+LIVEKIT_API_POOL_SIZE = int(os.getenv('LIVEKIT_API_POOL_SIZE', 10))
+# Seconds before a LiveKit server API request is abandoned
+LIVEKIT_API_TIMEOUT = float(os.getenv('LIVEKIT_API_TIMEOUT', 10))
+
+# Movie bot streaming
+# Module providing the bot's Room and media sources; "meet.fake_rtc" runs bots without a LiveKit server
+BOT_RTC_BACKEND = os.getenv('BOT_RTC_BACKEND', 'livekit.rtc')
+# Where consumers that can't read MEDIA_ROOT (LiveKit ingress, bots on other hosts) fetch movies from.
+# Point it at a file server such as nginx; Django only serves media itself under DEBUG.
+MEDIA_SERVE_URL = os.getenv('MEDIA_SERVE_URL', 'http://localhost:8000/' + MEDIA_URL)
+# Bots read movies straight from MEDIA_ROOT; disable when they run where it isn't mounted
+BOT_READ_LOCAL_MEDIA = os.getenv('BOT_READ_LOCAL_MEDIA', 'true').lower() in ('1', 'true', 'yes')
+# Size of each read from a local movie file; large reads keep the disk access sequential
+BOT_READ_BUFFER_SIZE = int(os.getenv('BOT_READ_BUFFER_SIZE', 1024 * 1024))
+# Max decoded frames buffered between the decode thread and the publisher
+BOT_DECODE_QUEUE_SIZE = int(os.getenv('BOT_DECODE_QUEUE_SIZE', 48))
+# Video frames later than this many seconds behind the media clock are dropped
+BOT_MAX_VIDEO_LATENESS = float(os.getenv('BOT_MAX_VIDEO_LATENESS', 0.1))
+# How far ahead of the media clock audio is pushed into LiveKit's buffer
+BOT_AUDIO_LEAD = float(os.getenv('BOT_AUDIO_LEAD', 0.1))
+# Kernel buffer size of the HLS streamer's ffmpeg pipes
+BOT_PIPE_BUFFER_SIZE = int(os.getenv('BOT_PIPE_BUFFER_SIZE', 1024 * 1024))
+# Rooms starting the same movie within this many seconds share one decode (0 disables).
+# A room joining late starts where the playback is, so this is how much of the movie it may miss.
+BOT_FANOUT_TOLERANCE = float(os.getenv('BOT_FANOUT_TOLERANCE', 2))
+
+# Bot supervisor (python manage.py run_bot_supervisor)
+# Total cores bots may use; empty means all cores
+BOT_SUPERVISOR_CPU_BUDGET = float(os.getenv('BOT_SUPERVISOR_CPU_BUDGET', 0)) or None
+# Estimated cores one bot session uses, reserved when it is admitted
+BOT_SESSION_CPU_COST = float(os.getenv('BOT_SESSION_CPU_COST', 0.5))
+# Estimated cores for a room joining a shared playback (encode only, no decode)
+BOT_FANOUT_SESSION_CPU_COST = float(os.getenv('BOT_FANOUT_SESSION_CPU_COST', 0.25))
+# /health and /metrics listen here; only local scrapers by default
+BOT_SUPERVISOR_HEALTH_HOST = os.getenv('BOT_SUPERVISOR_HEALTH_HOST', '127.0.0.1')
+BOT_SUPERVISOR_HEALTH_PORT = int(os.getenv('BOT_SUPERVISOR_HEALTH_PORT', 8765))
+BOT_SUPERVISOR_REPORT_INTERVAL = float(os.getenv('BOT_SUPERVISOR_REPORT_INTERVAL', 5))
+
+
+# Room starts are queued with an ETA once the room is this many seconds away;
+# keep it below the broker's visibility timeout (1 hour on Redis)
+ROOM_START_SCHEDULE_HORIZON = int(os.getenv('ROOM_START_SCHEDULE_HORIZON', 45 * 60))
+# How often the start reconciliation sweep runs; must be shorter than the horizon
+ROOM_START_SWEEP_INTERVAL = float(os.getenv('ROOM_START_SWEEP_INTERVAL', 300))
+
+# A room stuck starting or stopping this many seconds (e.g. after a worker crash) can be claimed again
+STREAM_TRANSITION_TIMEOUT = int(os.getenv('STREAM_TRANSITION_TIMEOUT', 300))
+# Streams are cleaned up this long after their movie should have ended
+MOVIE_CLEANUP_GRACE_MINUTES = int(os.getenv('MOVIE_CLEANUP_GRACE_MINUTES', 10))
+# ...or, for movies without a duration, this long after they started
+MOVIE_CLEANUP_FALLBACK_HOURS = int(os.getenv('MOVIE_CLEANUP_FALLBACK_HOURS', 3))
+
+# Movie conversion
+# Uploads are cut into up to this many pieces transcoded concurrently (1 converts in one ffmpeg)
+MOVIE_TRANSCODE_CHUNKS = int(os.getenv('MOVIE_TRANSCODE_CHUNKS', os.cpu_count() or 1))
+# ...each at least this long, so short movies aren't split
+MOVIE_TRANSCODE_MIN_CHUNK_SECONDS = int(os.getenv('MOVIE_TRANSCODE_MIN_CHUNK_SECONDS', 120))
+# Transcode the pieces on any Celery worker (a chord) instead of local processes;
+# needs MEDIA_ROOT shared between the workers and CELERY_RESULT_BACKEND
+MOVIE_TRANSCODE_DISTRIBUTED = os.getenv('MOVIE_TRANSCODE_DISTRIBUTED', 'false').lower() in ('1', 'true', 'yes')
+# Chords (distributed movie conversion) need somewhere to collect results; kept out of the broker's database
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
+# Conversion progress is written to the movie and pushed to admins at most this often (seconds)
+MOVIE_PROGRESS_INTERVAL = float(os.getenv('MOVIE_PROGRESS_INTERVAL', 2))
+# ffmpeg logs of conversions, one file per movie (or piece of one)
+MOVIE_CONVERSION_LOG_DIR = os.getenv('MOVIE_CONVERSION_LOG_DIR', str(BASE_DIR / 'logs' / 'conversions'))
 
 CELERY_BEAT_SCHEDULE = {
-    "check-movies-every-minute": {
+    "reconcile-room-starts": {
         "task": "meet.tasks.check_and_start_movies",
-        "schedule": 60.0,   # every 60 seconds
+        "schedule": ROOM_START_SWEEP_INTERVAL,
+    },
+    "reconcile-livekit-ingresses": {
+        "task": "meet.tasks.reconcile_livekit_ingresses",
+        "schedule": float(os.getenv('INGRESS_RECONCILE_INTERVAL', 300)),
     },
     "cleanup-expired-ingresses": {
         "task": "meet.tasks.cleanup_expired_ingresses",
@@ -4,6 +4,7 @@ from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from channels.db import database_sync_to_async
 from .models import Room, Invitation, Message
+from .utils import room_group_name
 from django.contrib.auth.models import User
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -36,7 +37,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             print(f"Valid invitation found: {invitation}")
             
             # Create group name using room ID (same as in tasks.py)
-            self.room_group_name = f'chat_{str(room.id).replace("-", "_")[:50]}'
+            self.room_group_name = room_group_name(room.id)
             
         except Exception as e:
             print(f"Invitation validation failed: {e}")
@@ -124,6 +125,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'stopped_at': event['stopped_at']
         }))
 
+    async def room_events(self, event):
+        """Handle several room events broadcast together"""
+        for room_event in event['events']:
+            handler = getattr(self, room_event['type'], None)
+            if handler:
+                await handler(room_event)
+
     @database_sync_to_async
     def get_valid_invitation(self, user, room):
         # Allow room creator to always join
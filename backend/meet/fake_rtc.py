@@ -0,0 +1,138 @@
+import time
+import asyncio
+import logging
+import itertools
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+_sids = itertools.count(1)
+
+
+# ----------------------------
+# Local stand-in for livekit.rtc
+# ----------------------------
+# Select it with BOT_RTC_BACKEND = "meet.fake_rtc" to run bots without a
+# LiveKit server, e.g. for benchmarks. It only covers what run_bot uses; frames
+# are accepted and counted rather than encoded and sent anywhere.
+class VideoSource:
+    """Accepts video frames like rtc.VideoSource, copying each one as the native capture does"""
+
+    def __init__(self, width, height, *, is_screencast=False):
+        self.width = width
+        self.height = height
+        self.frames = 0
+        self.bytes = 0
+        self.last_capture = None
+        self._buffer = bytearray()
+
+    def capture_frame(self, frame, *, timestamp_us=0, rotation=0):
+        data = memoryview(frame.data).cast('B')
+        if len(self._buffer) != len(data):
+            self._buffer = bytearray(len(data))
+        self._buffer[:] = data
+        self.frames += 1
+        self.bytes += len(data)
+        self.last_capture = time.monotonic()
+
+    async def aclose(self):
+        pass
+
+
+class AudioSource:
+    """Accepts audio frames like rtc.AudioSource, without its playout buffer"""
+
+    def __init__(self, sample_rate, num_channels, queue_size_ms=1000, loop=None):
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.frames = 0
+        self.samples = 0
+
+    @property
+    def queued_duration(self):
+        return 0.0
+
+    async def capture_frame(self, frame):
+        if frame.sample_rate != self.sample_rate or frame.num_channels != self.num_channels:
+            raise ValueError(
+                f"Audio frame is {frame.sample_rate} Hz x{frame.num_channels}, "
+                f"source expects {self.sample_rate} Hz x{self.num_channels}"
+            )
+        self.frames += 1
+        self.samples += frame.samples_per_channel
+
+    def clear_queue(self):
+        pass
+
+    async def wait_for_playout(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class LocalTrack:
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.sid = f"TR_fake{next(_sids)}"
+
+
+class LocalVideoTrack(LocalTrack):
+    @staticmethod
+    def create_video_track(name, source):
+        return LocalVideoTrack(name, source)
+
+
+class LocalAudioTrack(LocalTrack):
+    @staticmethod
+    def create_audio_track(name, source):
+        return LocalAudioTrack(name, source)
+
+
+class LocalTrackPublication:
+    def __init__(self, track, options):
+        self.track = track
+        self.options = options
+        self.sid = track.sid
+        self.name = track.name
+
+
+class LocalParticipant:
+    def __init__(self, identity):
+        self.identity = identity
+        self.track_publications = {}
+
+    async def publish_track(self, track, options=None):
+        publication = LocalTrackPublication(track, options)
+        self.track_publications[publication.sid] = publication
+        return publication
+
+    async def unpublish_track(self, track_sid):
+        self.track_publications.pop(track_sid, None)
+
+
+class Room:
+    """Joins nothing: reads the room and identity from the token and pretends to be connected"""
+
+    def __init__(self, loop=None):
+        self.name = None
+        self.local_participant = None
+        self._connected = False
+
+    async def connect(self, url, token, options=None):
+        # The token isn't verified, but it must at least be one LiveKit would parse
+        claims = jwt.decode(token, options={"verify_signature": False})
+        self.name = claims.get("video", {}).get("room")
+        self.local_participant = LocalParticipant(claims.get("sub"))
+        self._connected = True
+        # Yield like a real connect would, so callers don't rely on it being synchronous
+        await asyncio.sleep(0)
+        logger.debug(f"Fake LiveKit room {self.name} joined as {self.local_participant.identity}")
+
+    def isconnected(self):
+        return self._connected
+
+    async def disconnect(self):
+        self._connected = False
@@ -0,0 +1,113 @@
+import os
+import atexit
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------
+# Shared LiveKit server API client
+# ----------------------------
+class LiveKitClient:
+    """
+    One ``api.LiveKitAPI`` for the whole process, on its own event loop.
+
+    The client lives on a daemon thread running a persistent loop, so its
+    aiohttp connection pool (and the TLS sessions in it) is reused by every
+    request instead of being rebuilt per call. Requests are passed in as
+    ``fn(livekit_api) -> coroutine`` and run on that loop; ``call`` blocks for
+    synchronous code such as Celery tasks and ``acall`` awaits from any other
+    event loop.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="livekit-api", daemon=True)
+        self._thread.start()
+        try:
+            self._api = asyncio.run_coroutine_threadsafe(self._connect(), self._loop).result()
+        except BaseException:
+            # Don't leave a thread and loop behind for every failed attempt
+            self._stop_loop()
+            raise
+
+    async def _connect(self):
+        import aiohttp
+        from livekit import api
+
+        # Bounded pool: a burst of room starts queues for a connection instead of opening one each
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.LIVEKIT_API_POOL_SIZE, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=settings.LIVEKIT_API_TIMEOUT),
+        )
+        try:
+            return api.LiveKitAPI(
+                url=settings.LIVEKIT_URL,
+                api_key=settings.LIVEKIT_API_KEY,
+                api_secret=settings.LIVEKIT_API_SECRET,
+                session=session
+            )
+        except BaseException:
+            await session.close()
+            raise
+
+    def call(self, fn):
+        """Run ``fn(livekit_api)`` on the client loop and return its result"""
+        return asyncio.run_coroutine_threadsafe(self._request(fn), self._loop).result()
+
+    async def acall(self, fn):
+        """Await ``fn(livekit_api)`` from another event loop"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._request(fn), self._loop))
+
+    async def _request(self, fn):
+        return await fn(self._api)
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        session = self._api._session
+        try:
+            asyncio.run_coroutine_threadsafe(session.close(), self._loop).result(timeout=5)
+        except Exception as e:
+            logger.debug(f"Failed to close LiveKit API session: {e}")
+        self._stop_loop()
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_livekit_client():
+    """Return this process's LiveKit API client, creating it on first use"""
+    global _client
+    with _client_lock:
+        # A forked child (e.g. a Celery prefork worker) inherits the object but not its loop thread
+        if _client is None or _client.pid != os.getpid():
+            _client = LiveKitClient()
+        return _client
+
+
+def livekit_call(fn):
+    """Synchronously run ``fn(livekit_api)`` against the shared client"""
+    return get_livekit_client().call(fn)
+
+
+async def livekit_acall(fn):
+    """Run ``fn(livekit_api)`` against the shared client from async code"""
+    return await get_livekit_client().acall(fn)
+
+
+@atexit.register
+def _close_client():
+    if _client is not None and _client.pid == os.getpid():
+        _client.close()
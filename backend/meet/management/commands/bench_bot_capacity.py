@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import tempfile
+import statistics
+import multiprocessing
+import concurrent.futures
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from meet.supervisor import process_rss_bytes
+from meet.utils import select_output_profile
+from movie.bench import write_synthetic_video
+
+
+async def _measure_sessions(room_names, video_file, max_quality, warmup, seconds):
+    """Run bot sessions, then count what they sent over ``seconds`` after a warm-up"""
+    from meet.utils import active_streams, run_bot
+
+    def snapshot():
+        return {name: (stats.frames_sent, stats.frames_dropped) for name, stats in list(active_streams.items())}
+
+    base_rss = process_rss_bytes()
+    tasks = [asyncio.create_task(run_bot(name, video_file, max_quality)) for name in room_names]
+    try:
+        await asyncio.sleep(warmup)
+        start, wall, cpu = snapshot(), time.monotonic(), time.process_time()
+        await asyncio.sleep(seconds)
+        end = snapshot()
+        elapsed, cpu_seconds = time.monotonic() - wall, time.process_time() - cpu
+        rss = process_rss_bytes()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    sessions = []
+    for name in room_names:
+        if name not in start or name not in end:
+            # Never started streaming, or stopped before the measurement ended
+            sessions.append(None)
+            continue
+        sent = end[name][0] - start[name][0]
+        dropped = end[name][1] - start[name][1]
+        sessions.append({'fps': sent / elapsed, 'dropped_per_second': dropped / elapsed})
+    return {
+        'sessions': sessions,
+        'cpu': cpu_seconds / elapsed,
+        'rss': rss,
+        'base_rss': base_rss,
+    }
+
+
+def _worker_sessions(room_names, video_file, max_quality, shared, warmup, seconds):
+    overrides = {
+        'BOT_RTC_BACKEND': 'meet.fake_rtc',
+        # The fake room doesn't check tokens, but run_bot still has to sign one
+        'LIVEKIT_API_KEY': settings.LIVEKIT_API_KEY or 'bench',
+        'LIVEKIT_API_SECRET': settings.LIVEKIT_API_SECRET or 'bench-secret-not-used-for-any-real-server',
+    }
+    if not shared:
+        overrides['BOT_FANOUT_TOLERANCE'] = 0
+    with override_settings(**overrides):
+        return asyncio.run(_measure_sessions(room_names, video_file, max_quality, warmup, seconds))
+
+
+class Command(BaseCommand):
+    help = (
+        "Find how many concurrent bot sessions this machine sustains, streaming into a local "
+        "stand-in for LiveKit (meet.fake_rtc) at increasing session counts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_file', nargs='?', help="Movie to stream; a synthetic one is generated if omitted")
+        parser.add_argument('--max-sessions', type=int, default=16, help="Stop the ramp at this many sessions")
+        parser.add_argument('--step', type=int, default=2, help="Sessions added per ramp step, after a first step of one")
+        parser.add_argument('--workers', type=int, default=1, help="Worker processes the sessions are spread over, like the supervisor's")
+        parser.add_argument('--seconds', type=float, default=10.0, help="Measured seconds per step")
+        parser.add_argument('--warmup', type=float, default=2.0, help="Seconds each step runs before measuring")
+        parser.add_argument('--quality', help="Max quality tier of the sessions (see QUALITY_TIERS)")
+        parser.add_argument('--shared', action='store_true', help="Let sessions share decodes (BOT_FANOUT_TOLERANCE) instead of decoding separately")
+        parser.add_argument('--min-fps-ratio', type=float, default=0.95, help="A step is sustained if every session keeps this share of the target fps")
+        parser.add_argument('--max-drop-rate', type=float, default=0.5, help="...and drops at most this many frames per second")
+        parser.add_argument('--width', type=int, default=1280, help="Width of the synthetic movie")
+        parser.add_argument('--height', type=int, default=720, help="Height of the synthetic movie")
+        parser.add_argument('--fps', type=int, default=30, help="Frame rate of the synthetic movie")
+
+    def handle(self, *args, **options):
+        if options['max_sessions'] < 1 or options['step'] < 1 or options['workers'] < 1:
+            raise CommandError("--max-sessions, --step and --workers must be at least 1")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            video_file = options['video_file']
+            if not video_file:
+                video_file = os.path.join(tmp, 'synthetic.mp4')
+                # Long enough that no session reaches the end while it is measured
+                length = options['warmup'] + options['seconds'] + 5
+                self.stdout.write(f"Generating {length:g}s synthetic movie {options['width']}x{options['height']}@{options['fps']}...")
+                write_synthetic_video(video_file, length, options['width'], options['height'], options['fps'])
+            elif not os.path.isfile(video_file):
+                raise CommandError(f"No such file: {video_file}")
+            self._ramp(video_file, options)
+
+    def _ramp(self, video_file, options):
+        profile = select_output_profile(video_file, options['quality'])
+        target_fps = profile.fps
+        self.stdout.write(f"Output profile {profile.width}x{profile.height}@{target_fps:g}fps, {options['workers']} worker(s)")
+        self.stdout.write(
+            f"{'Sessions':>8}  {'fps avg':>7}  {'fps min':>7}  {'drop/s':>6}  "
+            f"{'CPU/session':>11}  {'RSS/session':>11}  {'Sustained':>9}"
+        )
+
+        counts = sorted({1, *range(options['step'], options['max_sessions'] + 1, options['step'])})
+        capacity = 0
+        for count in counts:
+            result = self._run_step(video_file, count, options)
+            sessions = result['sessions']
+            running = [session for session in sessions if session]
+            fps = [session['fps'] for session in running]
+            drops = [session['dropped_per_second'] for session in running]
+            sustained = (
+                len(running) == count
+                and min(fps) >= target_fps * options['min_fps_ratio']
+                and max(drops) <= options['max_drop_rate']
+            )
+            self.stdout.write(
+                f"{count:>8}  {statistics.mean(fps) if fps else 0:>7.2f}  {min(fps, default=0):>7.2f}  "
+                f"{statistics.mean(drops) if drops else 0:>6.2f}  "
+                f"{result['cpu'] / count:>10.3f}c  {result['rss'] / count / 2 ** 20:>8.1f} MB  "
+                f"{'yes' if sustained else 'no':>9}"
+            )
+            if len(running) < count:
+                self.stderr.write(f"{count - len(running)} session(s) were not streaming at the end of the step")
+            if not sustained:
+                break
+            capacity = count
+
+        if capacity:
+            self.stdout.write(self.style.SUCCESS(f"Sustained capacity: {capacity} concurrent session(s)"))
+        else:
+            self.stdout.write(self.style.ERROR("Could not sustain even one session"))
+
+    def _run_step(self, video_file, count, options):
+        """Spread ``count`` sessions over fresh worker processes and add up what they report"""
+        workers = min(options['workers'], count)
+        room_names = [f"bench-room-{index}" for index in range(count)]
+        shares = [room_names[index::workers] for index in range(workers)]
+
+        # Fresh processes per step, so memory left over by the previous step isn't counted
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context, initializer=django.setup) as pool:
+            futures = [
+                pool.submit(
+                    _worker_sessions, share, video_file, options['quality'], options['shared'],
+                    options['warmup'], options['seconds']
+                )
+                for share in shares
+            ]
+            results = [future.result() for future in futures]
+
+        return {
+            'sessions': [session for result in results for session in result['sessions']],
+            'cpu': sum(result['cpu'] for result in results),
+            # Memory the sessions added on top of an idle worker
+            'rss': sum(max(0, result['rss'] - result['base_rss']) for result in results),
+        }
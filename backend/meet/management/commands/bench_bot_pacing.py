@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from meet.utils import StreamStats, stream_mp4_content
+
+
+class _RecordingVideoSource:
+    """Stand-in for rtc.VideoSource that records when each frame is captured"""
+
+    def __init__(self):
+        self.timestamps = []
+
+    def capture_frame(self, frame):
+        self.timestamps.append(time.perf_counter())
+
+
+class _NullAudioSource:
+    async def capture_frame(self, frame):
+        pass
+
+
+def _burn_cpu():
+    while True:
+        sum(i * i for i in range(10_000))
+
+
+class Command(BaseCommand):
+    help = "Measure bot video pacing for a media file while other processes keep the CPU busy"
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_file', help="Path to the video file to stream")
+        parser.add_argument('--seconds', type=float, default=20.0, help="How long to stream before stopping")
+        parser.add_argument('--busy-procs', type=int, default=1, help="Number of CPU-bound processes competing with the streamer")
+
+    def handle(self, *args, **options):
+        burners = [multiprocessing.Process(target=_burn_cpu, daemon=True) for _ in range(options['busy_procs'])]
+        for process in burners:
+            process.start()
+
+        video_source = _RecordingVideoSource()
+        stats = StreamStats()
+        try:
+            asyncio.run(self._stream(video_source, stats, options['video_file'], options['seconds']))
+        finally:
+            for process in burners:
+                process.terminate()
+
+        timestamps = video_source.timestamps
+        if len(timestamps) < 2:
+            self.stderr.write("Not enough frames captured to measure pacing")
+            return
+
+        gaps_ms = sorted((b - a) * 1000 for a, b in zip(timestamps, timestamps[1:]))
+        elapsed = timestamps[-1] - timestamps[0]
+        self.stdout.write(f"Frames captured:  {len(timestamps)}")
+        self.stdout.write(f"Frames dropped:   {stats.frames_dropped}")
+        self.stdout.write(f"Average fps:      {(len(timestamps) - 1) / elapsed:.2f}")
+        self.stdout.write(f"Frame gap p50:    {statistics.median(gaps_ms):.1f} ms")
+        self.stdout.write(f"Frame gap p99:    {gaps_ms[int(len(gaps_ms) * 0.99)]:.1f} ms")
+        self.stdout.write(f"Frame gap max:    {gaps_ms[-1]:.1f} ms")
+        self.stdout.write(f"Frame gap stdev:  {statistics.pstdev(gaps_ms):.1f} ms")
+        for label, histogram in (("decode", stats.decode_time), ("reformat", stats.reformat_time), ("capture", stats.capture_time)):
+            mean_ms = histogram.sum / histogram.count * 1000 if histogram.count else 0.0
+            self.stdout.write(f"Mean {label + ':':<12}{mean_ms:.2f} ms")
+
+    async def _stream(self, video_source, stats, video_file, seconds):
+        try:
+            await asyncio.wait_for(
+                stream_mp4_content(video_source, _NullAudioSource(), video_file, stats=stats),
+                timeout=seconds
+            )
+        except asyncio.TimeoutError:
+            pass
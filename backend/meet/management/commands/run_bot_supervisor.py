@@ -0,0 +1,24 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from meet.supervisor import BotSupervisor
+
+
+class Command(BaseCommand):
+    help = "Run the movie bot supervisor, hosting bot sessions on one event loop per worker process"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Number of worker processes (defaults to one per core)")
+        parser.add_argument('--cpu-budget', type=float, help="Cores the bots may use in total (defaults to BOT_SUPERVISOR_CPU_BUDGET)")
+        parser.add_argument('--health-host', help="Address of the /health endpoint (defaults to BOT_SUPERVISOR_HEALTH_HOST)")
+        parser.add_argument('--health-port', type=int, help="Port of the /health endpoint (defaults to BOT_SUPERVISOR_HEALTH_PORT)")
+
+    def handle(self, *args, **options):
+        supervisor = BotSupervisor(
+            workers=options['workers'],
+            cpu_budget=options['cpu_budget'],
+            health_host=options['health_host'],
+            health_port=options['health_port'],
+        )
+        asyncio.run(supervisor.run())
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meet', '0002_alter_room_options_remove_room_ingress_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='ingress_id',
+            field=models.CharField(blank=True, help_text='LiveKit ingress ID for streaming', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='max_quality',
+            field=models.CharField(choices=[('1080p', '1080p'), ('720p', '720p'), ('480p', '480p'), ('360p', '360p')], default='720p', help_text='Highest quality the movie bot publishes', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='movie_url',
+            field=models.URLField(blank=True, help_text='Current movie streaming URL', null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meet', '0003_room_ingress_id_room_max_quality_room_movie_url'),
+        ('movie', '0002_alter_moviereview_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='start_task_id',
+            field=models.CharField(blank=True, help_text='Celery task scheduled to start the movie at meet_datetime', max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['movie_started', 'meet_datetime'], name='meet_room_movie_s_703e67_idx'),
+        ),
+    ]
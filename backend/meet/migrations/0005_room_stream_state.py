@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:43
+
+from django.db import migrations, models
+
+
+def mark_started_rooms_streaming(apps, schema_editor):
+    Room = apps.get_model('meet', 'Room')
+    Room.objects.filter(movie_started=True).update(stream_state='streaming')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meet', '0004_room_start_task_id_room_movie_started_meet_datetime_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='stream_state',
+            field=models.CharField(choices=[('stopped', 'Stopped'), ('starting', 'Starting'), ('streaming', 'Streaming'), ('stopping', 'Stopping')], default='stopped', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='stream_state_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_started_rooms_streaming, migrations.RunPython.noop),
+    ]
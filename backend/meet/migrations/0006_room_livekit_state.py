@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meet', '0005_room_stream_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='bot_present',
+            field=models.BooleanField(default=False, help_text='Whether the movie bot is in the LiveKit room'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='ingress_status',
+            field=models.CharField(blank=True, help_text='LiveKit ingress state, e.g. ENDPOINT_PUBLISHING', max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='livekit_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
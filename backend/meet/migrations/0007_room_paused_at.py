@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meet', '0006_room_livekit_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='paused_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
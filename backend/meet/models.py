@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 from movie.models import Movie
@@ -12,6 +12,25 @@ from movie.models import Movie
 User = get_user_model()
 
 class Room(models.Model):
+    QUALITY_CHOICES = [
+        ('1080p', '1080p'),
+        ('720p', '720p'),
+        ('480p', '480p'),
+        ('360p', '360p'),
+    ]
+
+    # Stream lifecycle; starting and stopping are held by the task doing the transition
+    STREAM_STOPPED = 'stopped'
+    STREAM_STARTING = 'starting'
+    STREAM_STREAMING = 'streaming'
+    STREAM_STOPPING = 'stopping'
+    STREAM_STATE_CHOICES = [
+        (STREAM_STOPPED, 'Stopped'),
+        (STREAM_STARTING, 'Starting'),
+        (STREAM_STREAMING, 'Streaming'),
+        (STREAM_STOPPING, 'Stopping'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_rooms')
@@ -24,15 +43,29 @@ class Room(models.Model):
     # Movie-related fields
     movie = models.ForeignKey(Movie, on_delete=models.SET_NULL, null=True, blank=True)
     movie_started = models.BooleanField(default=False)
+    stream_state = models.CharField(max_length=10, choices=STREAM_STATE_CHOICES, default=STREAM_STOPPED)
+    stream_state_changed_at = models.DateTimeField(null=True, blank=True)
     movie_start_time = models.DateTimeField(null=True, blank=True)
     movie_end_time = models.DateTimeField(null=True, blank=True)
+    # Set while playback is paused; movie_end_time is pushed back by the pause on resume
+    paused_at = models.DateTimeField(null=True, blank=True)
     
     # LiveKit streaming fields
     ingress_id = models.CharField(max_length=255, null=True, blank=True, help_text="LiveKit ingress ID for streaming")
     movie_url = models.URLField(null=True, blank=True, help_text="Current movie streaming URL")
+    max_quality = models.CharField(max_length=10, choices=QUALITY_CHOICES, default='720p', help_text="Highest quality the movie bot publishes")
+    # Last state LiveKit reported, through webhooks or ingress reconciliation
+    ingress_status = models.CharField(max_length=32, null=True, blank=True, help_text="LiveKit ingress state, e.g. ENDPOINT_PUBLISHING")
+    bot_present = models.BooleanField(default=False, help_text="Whether the movie bot is in the LiveKit room")
+    livekit_updated_at = models.DateTimeField(null=True, blank=True)
+    start_task_id = models.CharField(max_length=255, null=True, blank=True, help_text="Celery task scheduled to start the movie at meet_datetime")
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Start reconciliation sweep: unstarted rooms by scheduled time
+            models.Index(fields=['movie_started', 'meet_datetime']),
+        ]
     
     def __str__(self):
         return f"{self.name} by {self.creator.email}"
@@ -44,10 +77,56 @@ class Room(models.Model):
         return (self.meet_datetime <= now and 
                 (not self.movie_end_time or self.movie_end_time >= now))
     
+    @classmethod
+    def claim_stream_transition(cls, room_id, from_states, to_state, **filters):
+        """
+        Atomically move a room's stream from one of ``from_states`` to ``to_state``.
+
+        Returns False if the room is in any other state, so only one caller
+        wins each transition. A starting/stopping claim abandoned for longer than
+        STREAM_TRANSITION_TIMEOUT (e.g. by a crashed worker) can be taken over.
+        """
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.STREAM_TRANSITION_TIMEOUT)
+        claimable = models.Q(stream_state__in=from_states) | models.Q(
+            stream_state__in=[cls.STREAM_STARTING, cls.STREAM_STOPPING],
+            stream_state_changed_at__lt=stale
+        )
+        fields = {'stream_state': to_state, 'stream_state_changed_at': now}
+        # movie_started mirrors "not stopped" for existing API clients
+        fields['movie_started'] = to_state != cls.STREAM_STOPPED
+        return cls.objects.filter(claimable, id=room_id, **filters).update(**fields) > 0
+
+    def record_pause(self):
+        """Note that playback paused now, so cleanup waits for it"""
+        Room.objects.filter(id=self.id, paused_at__isnull=True).update(paused_at=timezone.now())
+
+    def record_resume(self):
+        """Push movie_end_time back by the time playback spent paused"""
+        with transaction.atomic():
+            room = Room.objects.select_for_update().only('paused_at', 'movie_end_time').get(id=self.id)
+            if room.paused_at is None:
+                return
+            fields = {'paused_at': None}
+            if room.movie_end_time:
+                fields['movie_end_time'] = room.movie_end_time + (timezone.now() - room.paused_at)
+            Room.objects.filter(id=self.id).update(**fields)
+
+    def record_seek(self, position):
+        """Recompute movie_end_time for playback going on from ``position`` seconds"""
+        if not (self.movie and self.movie.duration_minutes):
+            return
+        remaining = timedelta(seconds=max(0.0, self.movie.duration_minutes * 60 - position))
+        with transaction.atomic():
+            room = Room.objects.select_for_update().only('paused_at').get(id=self.id)
+            # A paused movie only plays the rest once resumed, which shifts this again
+            Room.objects.filter(id=self.id).update(movie_end_time=(room.paused_at or timezone.now()) + remaining)
+
     def start_movie(self):
         """Start the movie playback"""
         if self.movie and not self.movie_started:
             self.movie_started = True
+            self.stream_state = self.STREAM_STREAMING
             self.movie_start_time = timezone.now()
             if self.movie.duration_minutes:
                 self.movie_end_time = self.movie_start_time + timedelta(minutes=self.movie.duration_minutes)
@@ -56,6 +135,7 @@ class Room(models.Model):
     def stop_movie(self):
         """Stop the movie playback"""
         self.movie_started = False
+        self.stream_state = self.STREAM_STOPPED
         self.movie_end_time = timezone.now()
         self.save()
 
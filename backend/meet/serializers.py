@@ -13,10 +13,10 @@ class RoomSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'creator', 'creator_email', 'created_at', 
             'meet_datetime', 'invite_duration_minutes', 'max_participants', 'is_private',
-            'movie', 'movie_details', 'movie_started', 'movie_start_time', 'movie_end_time',
-            'is_active'
+            'movie', 'movie_details', 'movie_started', 'stream_state', 'movie_start_time', 'movie_end_time', 'paused_at',
+            'max_quality', 'is_active'
         ]
-        read_only_fields = ['creator', 'created_at', 'movie_started', 'movie_start_time', 'movie_end_time', 'is_active']
+        read_only_fields = ['creator', 'created_at', 'movie_started', 'stream_state', 'movie_start_time', 'movie_end_time', 'paused_at', 'is_active']
 
 class InvitationSerializer(serializers.ModelSerializer):
     room = serializers.SerializerMethodField()
@@ -0,0 +1,79 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Room, Invitation
+from .utils import invalidate_participant_tokens
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------
+# LiveKit token cache invalidation
+# ----------------------------
+@receiver([post_save, post_delete], sender=Invitation)
+def invitation_changed(sender, instance, **kwargs):
+    """A changed or withdrawn invitation may revoke access, so reissue the room's tokens"""
+    invalidate_participant_tokens(instance.room_id)
+
+
+@receiver(post_init, sender=Room)
+def remember_room_name(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred name is never loaded just for this
+    instance._token_room_name = instance.__dict__.get('name')
+
+
+@receiver(post_save, sender=Room)
+def room_renamed(sender, instance, created, **kwargs):
+    """Cached tokens grant the LiveKit room by name, so a renamed room needs new ones"""
+    name = instance.__dict__.get('name')
+    if not created and name != instance._token_room_name:
+        invalidate_participant_tokens(instance.pk)
+    instance._token_room_name = name
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    invalidate_participant_tokens(instance.pk)
+    if instance.start_task_id:
+        from celery import current_app
+
+        try:
+            current_app.control.revoke(instance.start_task_id)
+        except Exception as e:
+            logger.error(f"Failed to revoke movie start for deleted room {instance.name}: {e}")
+
+
+# ----------------------------
+# Exact-time movie starts
+# ----------------------------
+def _start_schedule(room):
+    # Read from __dict__ so deferred fields are never loaded just for this
+    return room.__dict__.get('meet_datetime'), room.__dict__.get('movie_id')
+
+
+@receiver(post_init, sender=Room)
+def remember_start_schedule(sender, instance, **kwargs):
+    instance._start_schedule = _start_schedule(instance)
+
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, created, **kwargs):
+    """Schedule the movie start when a room is created or its time or movie changes"""
+    from .tasks import schedule_room_start
+
+    schedule = _start_schedule(instance)
+    if created or schedule != instance._start_schedule:
+        instance._start_schedule = schedule
+        room_id = instance.pk
+
+        def schedule():
+            try:
+                schedule_room_start(room_id)
+            except Exception as e:
+                # The reconciliation sweep picks the room up later
+                logger.error(f"Failed to schedule movie start for room_id {room_id}: {e}")
+
+        transaction.on_commit(schedule)
@@ -0,0 +1,561 @@
+import os
+import time
+import signal
+import asyncio
+import logging
+import multiprocessing
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Channel-layer channel the supervisor takes bot commands from
+SUPERVISOR_CHANNEL = "bot-supervisor"
+
+
+# ----------------------------
+# Command channel (used by Celery tasks and views)
+# ----------------------------
+def send_supervisor_command(action, room_id, **kwargs):
+    """Queue a command for the bot supervisor from synchronous code"""
+    from channels.layers import get_channel_layer
+    from asgiref.sync import async_to_sync
+
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.send)(
+        SUPERVISOR_CHANNEL,
+        {
+            'type': 'bot.command',
+            'action': action,
+            'room_id': str(room_id) if room_id else None,
+            **kwargs
+        }
+    )
+
+
+def session_key(message):
+    """
+    Key of the bot session a supervisor command or worker message is about.
+
+    Sessions are keyed by room id, as room names are not unique; commands
+    queued before they were (by start_video_bot) only have the room's name.
+    """
+    return message.get('room_id') or message['room_name']
+
+
+def start_bot_session(room_id, room_name, video_file, max_quality=None):
+    """Ask the supervisor to start streaming ``video_file`` into a room"""
+    send_supervisor_command('start', room_id, room_name=room_name, video_file=video_file, max_quality=max_quality)
+
+
+def stop_bot_session(room_id):
+    """Ask the supervisor to stop the bot streaming into a room"""
+    send_supervisor_command('stop', room_id)
+
+
+def pause_bot_session(room_id):
+    """Ask the supervisor to pause the movie playing in a room"""
+    send_supervisor_command('pause', room_id)
+
+
+def resume_bot_session(room_id):
+    """Ask the supervisor to resume a paused movie"""
+    send_supervisor_command('resume', room_id)
+
+
+def seek_bot_session(room_id, position):
+    """Ask the supervisor to jump the movie in a room to ``position`` seconds"""
+    send_supervisor_command('seek', room_id, position=position)
+
+
+def process_rss_bytes():
+    """Resident memory of this process"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # Peak rather than current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ----------------------------
+# Worker process: one event loop hosting many bot sessions
+# ----------------------------
+class BotWorker:
+    """
+    Runs ``run_bot`` sessions on a single event loop inside a worker process.
+
+    Commands arrive from the supervisor over a multiprocessing connection, and
+    the worker reports finished sessions and periodic stats back over it.
+    """
+
+    def __init__(self, index, conn):
+        self.index = index
+        self.conn = conn
+        # Session key (see session_key) -> task running the room's bot
+        self.sessions = {}
+        # Session key -> PlaybackControl of its session
+        self.controls = {}
+        self._commands = None
+        self._cpu_sample = (time.monotonic(), time.process_time())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._commands = asyncio.Queue()
+        loop.add_reader(self.conn.fileno(), self._on_readable)
+        reporter = asyncio.create_task(self._report_loop())
+        logger.info(f"Bot worker {self.index} started (pid {os.getpid()})")
+
+        try:
+            while True:
+                command = await self._commands.get()
+                if command is None or command['action'] == 'shutdown':
+                    break
+                elif command['action'] == 'start':
+                    self._start(command)
+                elif command['action'] == 'stop':
+                    self._stop(session_key(command))
+                elif command['action'] in ('pause', 'resume', 'seek'):
+                    self._control(command)
+        finally:
+            reporter.cancel()
+            loop.remove_reader(self.conn.fileno())
+            for task in list(self.sessions.values()):
+                task.cancel()
+            await asyncio.gather(*self.sessions.values(), return_exceptions=True)
+            logger.info(f"Bot worker {self.index} stopped")
+
+    def _on_readable(self):
+        try:
+            while self.conn.poll():
+                self._commands.put_nowait(self.conn.recv())
+        except (EOFError, OSError):
+            # Supervisor went away
+            self._commands.put_nowait(None)
+
+    def _start(self, command):
+        from .utils import run_bot, PlaybackControl
+
+        key, room_name, video_file = session_key(command), command['room_name'], command['video_file']
+        if key in self.sessions:
+            logger.warning(f"Bot already running for room {room_name} in worker {self.index}")
+            return
+        control = PlaybackControl()
+        task = asyncio.create_task(run_bot(room_name, video_file, command.get('max_quality'), control=control))
+        task.add_done_callback(lambda _: self._finished(command))
+        self.sessions[key] = task
+        self.controls[key] = control
+        logger.info(f"Worker {self.index} started bot for room {room_name}: {video_file}")
+
+    def _stop(self, key):
+        task = self.sessions.get(key)
+        if task:
+            task.cancel()
+
+    def _control(self, command):
+        control = self.controls.get(session_key(command))
+        if control is None:
+            return
+        if command['action'] == 'pause':
+            control.pause()
+        elif command['action'] == 'resume':
+            control.resume()
+        else:
+            control.seek(command['position'])
+
+    def _finished(self, command):
+        self.sessions.pop(session_key(command), None)
+        self.controls.pop(session_key(command), None)
+        self._send({'event': 'ended', 'room_id': command.get('room_id'), 'room_name': command['room_name']})
+
+    def _cpu_usage(self):
+        """Cores used by this process since the previous sample"""
+        wall, cpu = time.monotonic(), time.process_time()
+        last_wall, last_cpu = self._cpu_sample
+        self._cpu_sample = (wall, cpu)
+        return (cpu - last_cpu) / max(wall - last_wall, 1e-6)
+
+    async def _report_loop(self):
+        from .utils import get_stream_stats
+
+        while True:
+            await asyncio.sleep(settings.BOT_SUPERVISOR_REPORT_INTERVAL)
+            self._send({
+                'event': 'stats',
+                'cpu': round(self._cpu_usage(), 3),
+                'rss': process_rss_bytes(),
+                'streams': get_stream_stats(),
+            })
+
+    def _send(self, message):
+        try:
+            self.conn.send(message)
+        except (BrokenPipeError, OSError):
+            pass
+
+
+def _worker_main(index, conn):
+    import django
+
+    # Workers are spawned fresh, so Django has to be set up again
+    django.setup()
+    # The supervisor handles SIGINT/SIGTERM and shuts workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(BotWorker(index, conn).run())
+
+
+# ----------------------------
+# Metrics export
+# ----------------------------
+# (metric name, StreamStats.as_dict key, help) of the per-room stream metrics
+STREAM_COUNTERS = [
+    ('bot_frames_decoded_total', 'frames_decoded', "Video frames decoded"),
+    ('bot_frames_sent_total', 'frames_sent', "Video frames published to LiveKit"),
+    ('bot_frames_dropped_total', 'frames_dropped', "Video frames dropped for lateness or errors"),
+    ('bot_audio_frames_sent_total', 'audio_frames_sent', "Audio chunks published to LiveKit"),
+]
+STREAM_GAUGES = [
+    ('bot_decode_queue_depth', 'queue_depth', "Decoded frames waiting to be published"),
+    ('bot_video_drift_ms', 'video_drift_ms', "How late the last video frame was published"),
+    ('bot_audio_drift_ms', 'audio_drift_ms', "How late the last audio chunk was published"),
+    ('bot_position_seconds', 'position', "Movie time of the last published frame"),
+]
+STREAM_HISTOGRAMS = [
+    ('bot_decode_seconds', 'decode_seconds', "Time to demux and decode one packet"),
+    ('bot_reformat_seconds', 'reformat_seconds', "Time to scale and convert one video frame to I420"),
+    ('bot_capture_seconds', 'capture_seconds', "Time spent in VideoSource.capture_frame per frame"),
+]
+
+
+class MetricsWriter:
+    """Builds a Prometheus text exposition, one HELP/TYPE header per metric name"""
+
+    def __init__(self):
+        self._families = {}
+
+    def add(self, name, metric_type, help_text, value, labels=None):
+        self._family(name, metric_type, help_text).append(f"{name}{self._labels(labels)} {value}")
+
+    def add_histogram(self, name, help_text, histogram, labels=None):
+        """Add a histogram from LatencyHistogram.as_dict (per-bucket counts, made cumulative here)"""
+        lines = self._family(name, 'histogram', help_text)
+        cumulative = 0
+        bounds = [str(bound) for bound in histogram['buckets']] + ['+Inf']
+        for bound, count in zip(bounds, histogram['counts']):
+            cumulative += count
+            lines.append(f"{name}_bucket{self._labels({**(labels or {}), 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{self._labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{self._labels(labels)} {histogram['count']}")
+
+    def render(self):
+        return "".join(
+            f"# HELP {name} {help_text}\n# TYPE {name} {metric_type}\n" + "".join(f"{line}\n" for line in lines)
+            for name, (metric_type, help_text, lines) in self._families.items()
+        )
+
+    def _family(self, name, metric_type, help_text):
+        return self._families.setdefault(name, (metric_type, help_text, []))[2]
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        pairs = []
+        for key, value in labels.items():
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}"
+
+
+# ----------------------------
+# Supervisor: admission control, command routing, health
+# ----------------------------
+class WorkerHandle:
+    """Supervisor-side view of one worker process"""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        # Session key (see session_key) -> CPU cost reserved for it
+        self.rooms = {}
+        # Session key -> the start command it was admitted for
+        self.starts = {}
+        # (video file, quality tier) -> when this worker last started a shared playback of it
+        self.playbacks = {}
+        self.cpu = 0.0
+        self.rss = 0
+        self.streams = {}
+
+    @property
+    def reserved(self):
+        return sum(self.rooms.values())
+
+    def can_join_playback(self, playback):
+        started = self.playbacks.get(playback)
+        return started is not None and time.monotonic() - started <= settings.BOT_FANOUT_TOLERANCE
+
+    def as_dict(self):
+        return {
+            'index': self.index,
+            'pid': self.process.pid if self.process else None,
+            'alive': bool(self.process and self.process.is_alive()),
+            'rooms': sorted(start['room_name'] for start in self.starts.values()),
+            'reserved_cpu': self.reserved,
+            'measured_cpu': self.cpu,
+            'rss_bytes': self.rss,
+            'streams': self.streams,
+        }
+
+
+class BotSupervisor:
+    """
+    Long-running host for movie bot sessions.
+
+    Starts one worker process per core, each running many bots on one event
+    loop. Start commands are only admitted while the worker they would land on
+    stays within its share of ``cpu_budget``, both by reserved per-session cost
+    and by measured CPU use. Rooms starting a movie another room on a worker
+    started within ``BOT_FANOUT_TOLERANCE`` go to that worker, where they share
+    its decode and cost less. Rooms whose start is rejected, or whose worker
+    dies, are stopped like a stop request would, so they don't stay streaming
+    without a bot.
+    """
+
+    def __init__(self, workers=None, cpu_budget=None, health_host=None, health_port=None):
+        self.cpu_budget = cpu_budget or settings.BOT_SUPERVISOR_CPU_BUDGET or os.cpu_count()
+        self.workers = [WorkerHandle(i) for i in range(workers or os.cpu_count())]
+        self.health_host = health_host or settings.BOT_SUPERVISOR_HEALTH_HOST
+        self.health_port = health_port if health_port is not None else settings.BOT_SUPERVISOR_HEALTH_PORT
+        self.rejected = 0
+        # Session key -> start command waiting for the room's previous bot to end
+        self.pending_starts = {}
+        self.started_at = time.time()
+        self._stopping = None
+
+    @property
+    def worker_capacity(self):
+        return self.cpu_budget / len(self.workers)
+
+    async def run(self):
+        from channels.layers import get_channel_layer
+
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        for worker in self.workers:
+            self._spawn(worker)
+
+        runner = await self._start_health_server()
+        channel_layer = get_channel_layer()
+        logger.info(
+            f"Bot supervisor running {len(self.workers)} workers, "
+            f"CPU budget {self.cpu_budget} cores, health on {self.health_host}:{self.health_port}"
+        )
+
+        stop_wait = asyncio.create_task(self._stopping.wait())
+        try:
+            while not self._stopping.is_set():
+                receive = asyncio.create_task(channel_layer.receive(SUPERVISOR_CHANNEL))
+                done, _ = await asyncio.wait({receive, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+                if receive not in done:
+                    receive.cancel()
+                    break
+                try:
+                    self.handle_command(receive.result())
+                except Exception as e:
+                    logger.error(f"Failed to handle supervisor command: {e}")
+        finally:
+            await self._shutdown(runner)
+
+    def handle_command(self, command):
+        action = command.get('action')
+        key = session_key(command)
+        owner = self._owner(key)
+
+        if action == 'start':
+            if owner:
+                # Normally the bot of a stop sent just before, not ended yet
+                logger.info(
+                    f"Bot for room {command['room_name']} still running in worker {owner.index}, starting again once it ends"
+                )
+                self.pending_starts[key] = command
+                return
+            # Rooms only share a decode if they also publish at the same quality
+            playback = (command.get('video_file'), command.get('max_quality'))
+            worker, cost = self._admit(playback)
+            if worker is None:
+                self.rejected += 1
+                logger.warning(f"Rejected bot for room {command['room_name']}: CPU budget of {self.cpu_budget} cores exhausted")
+                self._stream_failed(command, "the server has no capacity left to play it")
+                return
+            worker.rooms[key] = cost
+            worker.starts[key] = command
+            if not worker.can_join_playback(playback):
+                worker.playbacks[playback] = time.monotonic()
+            self._send(worker, command)
+        elif action in ('stop', 'pause', 'resume', 'seek'):
+            if action == 'stop':
+                self.pending_starts.pop(key, None)
+            if owner:
+                self._send(owner, command)
+        else:
+            logger.warning(f"Unknown supervisor command: {action}")
+
+    def health(self):
+        return {
+            'uptime': round(time.time() - self.started_at),
+            'cpu_budget': self.cpu_budget,
+            'session_cpu_cost': settings.BOT_SESSION_CPU_COST,
+            'sessions': sum(len(worker.rooms) for worker in self.workers),
+            'rejected': self.rejected,
+            'workers': [worker.as_dict() for worker in self.workers],
+        }
+
+    def metrics(self):
+        """Prometheus text exposition of worker and per-room stream metrics"""
+        metrics = MetricsWriter()
+        metrics.add('bot_supervisor_rejected_total', 'counter', "Bot starts rejected for lack of CPU budget", self.rejected)
+        metrics.add('bot_supervisor_cpu_budget_cores', 'gauge', "Cores bots may use on this host", self.cpu_budget)
+        for worker in self.workers:
+            labels = {'worker': worker.index}
+            metrics.add('bot_worker_cpu_cores', 'gauge', "Measured CPU use of a worker process", worker.cpu, labels)
+            metrics.add('bot_worker_reserved_cores', 'gauge', "CPU reserved by sessions admitted to a worker", worker.reserved, labels)
+            metrics.add('bot_worker_rss_bytes', 'gauge', "Resident memory of a worker process", worker.rss, labels)
+            metrics.add('bot_worker_sessions', 'gauge', "Bot sessions running in a worker", len(worker.rooms), labels)
+
+            for room_name, stream in worker.streams.items():
+                labels = {'worker': worker.index, 'room': room_name, 'movie': stream.get('movie') or ''}
+                for name, key, help_text in STREAM_COUNTERS:
+                    metrics.add(name, 'counter', help_text, stream[key], labels)
+                for name, key, help_text in STREAM_GAUGES:
+                    metrics.add(name, 'gauge', help_text, stream[key], labels)
+                for name, key, help_text in STREAM_HISTOGRAMS:
+                    metrics.add_histogram(name, help_text, stream[key], labels)
+        return metrics.render()
+
+    def _admit(self, playback):
+        """Pick a worker for one more session; returns ``(worker, cost)``, worker None if over budget"""
+        live = [worker for worker in self.workers if worker.process.is_alive()]
+
+        def fits(worker, cost):
+            return worker.reserved + cost <= self.worker_capacity and worker.cpu + cost <= self.worker_capacity
+
+        if settings.BOT_FANOUT_TOLERANCE > 0:
+            cost = settings.BOT_FANOUT_SESSION_CPU_COST
+            for worker in live:
+                if worker.can_join_playback(playback) and fits(worker, cost):
+                    return worker, cost
+
+        cost = settings.BOT_SESSION_CPU_COST
+        candidates = [worker for worker in live if fits(worker, cost)]
+        return min(candidates, key=lambda worker: worker.reserved, default=None), cost
+
+    def _stream_failed(self, start, reason):
+        """Stop a room whose bot can't run, as a stop request would, telling its participants why"""
+        from .tasks import stop_room_streams
+
+        try:
+            stop_room_streams.delay(start['room_name'], reason, room_id=start.get('room_id'))
+        except Exception as e:
+            logger.error(f"Failed to stop stream of room {start['room_name']}: {e}")
+
+    def _owner(self, key):
+        for worker in self.workers:
+            if key in worker.rooms:
+                return worker
+        return None
+
+    def _spawn(self, worker):
+        # Spawn rather than fork so workers don't inherit the supervisor's event loop
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        worker.process = context.Process(
+            target=_worker_main,
+            args=(worker.index, child_conn),
+            name=f"bot-worker-{worker.index}",
+            daemon=True
+        )
+        worker.process.start()
+        child_conn.close()
+        worker.conn = parent_conn
+        worker.rooms.clear()
+        worker.starts.clear()
+        worker.playbacks.clear()
+        worker.cpu = 0.0
+        worker.rss = 0
+        worker.streams = {}
+        asyncio.get_running_loop().add_reader(parent_conn.fileno(), self._on_worker_message, worker)
+
+    def _on_worker_message(self, worker):
+        try:
+            while worker.conn.poll():
+                message = worker.conn.recv()
+                if message['event'] == 'ended':
+                    key = session_key(message)
+                    worker.rooms.pop(key, None)
+                    worker.starts.pop(key, None)
+                    worker.streams.pop(message['room_name'], None)
+                    command = self.pending_starts.pop(key, None)
+                    if command:
+                        self.handle_command(command)
+                elif message['event'] == 'stats':
+                    worker.cpu = message['cpu']
+                    worker.rss = message.get('rss', 0)
+                    worker.streams = message['streams']
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+            worker.conn.close()
+            if self._stopping.is_set():
+                return
+            dropped = dict(worker.starts)
+            logger.error(
+                f"Bot worker {worker.index} died, dropping rooms {sorted(start['room_name'] for start in dropped.values())} "
+                "and restarting it"
+            )
+            self._spawn(worker)
+            for key, start in dropped.items():
+                command = self.pending_starts.pop(key, None)
+                if command:
+                    # Its old bot is gone now
+                    self.handle_command(command)
+                else:
+                    self._stream_failed(start, "its movie bot crashed")
+
+    def _send(self, worker, command):
+        try:
+            worker.conn.send(command)
+        except (BrokenPipeError, OSError) as e:
+            logger.error(f"Failed to send command to bot worker {worker.index}: {e}")
+
+    async def _start_health_server(self):
+        from aiohttp import web
+
+        async def health_view(request):
+            return web.json_response(self.health())
+
+        async def metrics_view(request):
+            return web.Response(text=self.metrics(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/health', health_view)
+        app.router.add_get('/metrics', metrics_view)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, self.health_host, self.health_port).start()
+        return runner
+
+    async def _shutdown(self, runner):
+        logger.info("Bot supervisor shutting down")
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            loop.remove_reader(worker.conn.fileno())
+            self._send(worker, {'action': 'shutdown'})
+        for worker in self.workers:
+            await loop.run_in_executor(None, worker.process.join, 10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        await runner.cleanup()
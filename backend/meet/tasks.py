@@ -1,58 +1,131 @@
-import asyncio
 import logging
+import uuid
 from datetime import timedelta
+from django.db.models import Case, Q, Value, When
 from django.utils import timezone
 from django.conf import settings
 from celery import shared_task
+from livekit import api
 from .models import Room
-from .utils import create_livekit_ingress, stop_livekit_ingress  # your functions
-from .utils import run_bot  # async bot streamer
+from .utils import (
+    create_livekit_ingress, stop_livekit_ingress, stop_livekit_ingresses, list_livekit_ingresses, room_group_name,
+    movie_media_path, media_url, bot_media_input, streams_through_bot, BOT_INGRESS_PREFIX
+)
+from .supervisor import start_bot_session, stop_bot_session  # bot streaming
 
 logger = logging.getLogger(__name__)
 
 # ----------------------------
-# Movie starting and ingress
+# Movie start scheduling
 # ----------------------------
+# A scheduled start this many seconds overdue is assumed lost and sent again
+START_OVERDUE_AFTER = 30
+# A failed scheduled start is tried again this many times, first after START_RETRY_DELAY
+# seconds and then twice as long each time
+START_MAX_RETRIES = 3
+START_RETRY_DELAY = 30
+
+
+def schedule_room_start(room_id):
+    """
+    (Re)schedule the start task of a room for its meet_datetime.
+
+    Revokes any previously scheduled start. Rooms further out than
+    ROOM_START_SCHEDULE_HORIZON are left for the reconciliation sweep.
+    """
+    from celery import current_app
+
+    try:
+        room = Room.objects.only('id', 'name', 'meet_datetime', 'movie', 'movie_started', 'start_task_id').get(id=room_id)
+    except Room.DoesNotExist:
+        return
+
+    if room.start_task_id:
+        # Best effort: a start that still runs sees it is no longer the room's task and skips
+        current_app.control.revoke(room.start_task_id)
+
+    horizon = timezone.now() + timedelta(seconds=settings.ROOM_START_SCHEDULE_HORIZON)
+    task_id = None
+    if room.movie_id and not room.movie_started and room.meet_datetime and room.meet_datetime <= horizon:
+        task_id = str(uuid.uuid4())
+
+    # Saved before the task is sent: a start that is due runs at once, and its claim needs the id.
+    # Updated in place so saving doesn't trigger rescheduling again.
+    Room.objects.filter(id=room.id).update(start_task_id=task_id)
+    if task_id is None:
+        return
+    try:
+        start_movie_ingress.apply_async((str(room.id),), {'scheduled': True}, eta=room.meet_datetime, task_id=task_id)
+    except Exception:
+        # Never sent, so leave the room for the sweep to schedule again
+        Room.objects.filter(id=room.id, start_task_id=task_id).update(start_task_id=None)
+        raise
+    logger.info(f"Scheduled movie start for room {room.name} at {room.meet_datetime.isoformat()}")
+
+
 @shared_task
 def check_and_start_movies():
+    """
+    Reconciliation sweep behind the exact-time starts.
+
+    Resends starts that should have run by now but didn't (e.g. lost with a
+    broker restart), and schedules rooms that have just come within the
+    scheduling horizon or are overdue and were never scheduled (e.g. sending
+    their start failed). Both are range scans on the (movie_started,
+    meet_datetime) index.
+    """
     now = timezone.now()
-    rooms_to_start = Room.objects.filter(
-        meet_datetime__lte=now,
-        meet_datetime__gte=now - timedelta(minutes=1),
-        movie_started=False,
-        movie__isnull=False
+    pending = Room.objects.filter(movie_started=False, movie__isnull=False)
+
+    overdue = pending.filter(
+        meet_datetime__lte=now - timedelta(seconds=START_OVERDUE_AFTER),
+        start_task_id__isnull=False
     )
-    for room in rooms_to_start:
+    for room_id, task_id in overdue.values_list('id', 'start_task_id'):
         try:
-            start_movie_ingress.delay(room.id)
-            logger.info(f"Scheduled movie ingress for room: {room.name}")
+            # Same task id, so it still counts as the room's scheduled start
+            start_movie_ingress.apply_async((str(room_id),), {'scheduled': True}, task_id=task_id)
+            logger.warning(f"Resent overdue movie start for room_id {room_id}")
         except Exception as e:
-            logger.error(f"Failed to schedule movie ingress for room {room.name}: {str(e)}")
+            logger.error(f"Failed to resend movie start for room_id {room_id}: {str(e)}")
 
-@shared_task
-def start_movie_ingress(room_id):
+    unscheduled = pending.filter(
+        # Past rooms only if their stream never ran; stopped ones stay stopped
+        Q(meet_datetime__gt=now) | Q(stream_state_changed_at__isnull=True),
+        meet_datetime__lte=now + timedelta(seconds=settings.ROOM_START_SCHEDULE_HORIZON),
+        start_task_id__isnull=True
+    )
+    for room_id in unscheduled.values_list('id', flat=True):
+        try:
+            schedule_room_start(room_id)
+        except Exception as e:
+            logger.error(f"Failed to schedule movie start for room_id {room_id}: {str(e)}")
+
+
+# ----------------------------
+# Movie starting and ingress
+# ----------------------------
+@shared_task(bind=True)
+def start_movie_ingress(self, room_id, scheduled=False):
     try:
-        room = Room.objects.get(id=room_id)
-        if room.movie_started or not room.movie:
-            logger.warning(f"Movie already started or no movie assigned for room: {room.name}")
+        # Claim the start before doing any work, so a duplicate request is a no-op
+        claim = {'movie__isnull': False}
+        if scheduled:
+            # Only the room's current scheduled start may run; fails if it was rescheduled
+            claim['start_task_id'] = self.request.id
+        if not Room.claim_stream_transition(room_id, [Room.STREAM_STOPPED], Room.STREAM_STARTING, **claim):
+            logger.warning(f"Movie already started, superseded or no movie assigned for room_id: {room_id}")
             return
+        if scheduled:
+            Room.objects.filter(id=room_id).update(start_task_id=None)
 
-        # Get movie URL
-        if room.movie.hls_path:
-            hls_path = room.movie.hls_path
-            # Clean up the path - remove any leading media root paths
-            if 'media/movies/' in hls_path:
-                # Extract just the relative path after media/movies/
-                hls_path = hls_path.split('media/movies/', 1)[1]
-            elif hls_path.startswith('/'):
-                hls_path = hls_path.lstrip('/')
-            
-            # Construct proper URL
-            movie_url = f"http://localhost:8000/media/movies/{hls_path}"
-            logger.info(f"Using HLS URL: {movie_url}")
-        else:
-            movie_url = f"http://localhost:8000{settings.MEDIA_URL}{room.movie.movie_file.name}"
-            logger.info(f"Using MP4 URL: {movie_url}")
+        room = Room.objects.select_related('movie').get(id=room_id)
+
+        # The ingress runs on the LiveKit server and fetches the movie over HTTP; the bot
+        # reads it straight from disk when it can, so streaming never goes through Django
+        movie_path = movie_media_path(room.movie)
+        movie_url = media_url(movie_path)
+        logger.info(f"Streaming {movie_path} (served at {movie_url})")
 
         # Create LiveKit ingress
         try:
@@ -62,154 +135,178 @@ def start_movie_ingress(room_id):
             # Check if it's a fallback response
             if ingress_info.get("status") == "fallback":
                 logger.info(f"Using fallback bot streaming for room {room.name}")
-                # Start bot streaming directly
-                from .utils import run_bot
-                import asyncio
-                import threading
-                
-                def run_bot_sync():
-                    try:
-                        # Use asyncio.run to handle the async function
-                        if room.movie.file:
-                            video_file = room.movie.file.path
-                        else:
-                            video_file = movie_url
-                        
-                        logger.info(f"Starting bot streaming: {video_file} -> {room.name}")
-                        asyncio.run(run_bot(room.name, video_file))
-                    except Exception as e:
-                        logger.error(f"Bot streaming failed: {e}")
-                
-                # Run bot in separate thread to avoid blocking
-                bot_thread = threading.Thread(target=run_bot_sync, daemon=True)
-                bot_thread.start()
-                
-            logger.info(f"LiveKit ingress/bot started for room {room.name}, ingress_id={room.ingress_id}")
+            else:
+                logger.info(f"LiveKit ingress started for room {room.name}, ingress_id={room.ingress_id}")
         except Exception as e:
             logger.error(f"Failed to create LiveKit ingress for room {room.name}: {e}")
             room.ingress_id = None
 
+        # Only one publisher per room: the bot plays the movie when there is no real ingress.
+        # Hand it to the supervisor instead of holding a worker slot for the whole movie.
+        # Sent before the room is marked streaming, so a stop claimed from here on is always
+        # either seen by us below or queued behind this start.
+        if streams_through_bot(room.ingress_id) and movie_url and room.name:
+            start_bot_session(room.id, room.name, bot_media_input(movie_path), max_quality=room.max_quality)
+
         # Update room status
-        room.movie_started = True
         room.movie_start_time = timezone.now()
+        # When cleanup may reclaim the stream
+        room.movie_end_time = None
+        if room.movie.duration_minutes:
+            room.movie_end_time = room.movie_start_time + timedelta(minutes=room.movie.duration_minutes)
         room.movie_url = movie_url
-        room.save()
-
-        # Notify participants
-        notify_movie_started.delay(room.id)
-        notify_movie_bot_joined.delay(room.id)
+        streaming = Room.objects.filter(id=room.id, stream_state=Room.STREAM_STARTING).update(
+            stream_state=Room.STREAM_STREAMING,
+            stream_state_changed_at=timezone.now(),
+            movie_started=True,
+            movie_start_time=room.movie_start_time,
+            movie_end_time=room.movie_end_time,
+            paused_at=None,
+            movie_url=movie_url,
+            ingress_id=room.ingress_id
+        )
+        if not streaming:
+            # Stopped while we were starting: undo what the stop couldn't see yet
+            logger.info(f"Room {room.name} was stopped while starting, tearing down")
+            _stop_stream(room)
+            return
 
-        # Start bot streamer in background
-        if movie_url and room.name:
-            # Start the bot in a separate Celery task to avoid blocking
-            start_video_bot.delay(room.name, movie_url)
+        # Notify participants straight from here, with the room we already have
+        broadcast_room_events(room.id, movie_started_events(room))
 
-    except Room.DoesNotExist:
-        logger.error(f"Room with id {room_id} does not exist")
     except Exception as e:
         logger.error(f"Failed to start movie for room_id {room_id}: {str(e)}")
+        # Release the claim, so the room can be started again
+        released = Room.objects.filter(id=room_id, stream_state=Room.STREAM_STARTING).update(
+            stream_state=Room.STREAM_STOPPED,
+            stream_state_changed_at=timezone.now(),
+            movie_started=False
+        )
+        if not released:
+            return
+        if scheduled and self.request.retries < START_MAX_RETRIES:
+            # The retry keeps this task's id, so it is the room's scheduled start again (unless rescheduled since)
+            Room.objects.filter(id=room_id, start_task_id__isnull=True).update(start_task_id=self.request.id)
+            raise self.retry(countdown=START_RETRY_DELAY * 2 ** self.request.retries)
+        # Nothing starts the room by itself now; tell whoever is waiting in it
+        movie_title = Room.objects.filter(id=room_id).values_list('movie__title', flat=True).first()
+        broadcast_room_events(room_id, movie_stopped_events(movie_title, "it could not be started"))
 
 
 # ----------------------------
 # Movie stopping and cleanup
 # ----------------------------
+def _stop_stream(room):
+    """Stop a room's LiveKit ingress and its bot"""
+    # Stop LiveKit ingress
+    if room.ingress_id:
+        try:
+            stop_livekit_ingress(room.ingress_id)
+            logger.info(f"Stopped LiveKit ingress for room {room.name}")
+        except Exception as e:
+            logger.error(f"Failed to stop ingress for room {room.name}: {e}")
+
+    # Stop the bot streaming into the room
+    try:
+        stop_bot_session(room.id)
+    except Exception as e:
+        logger.error(f"Failed to stop bot for room {room.name}: {e}")
+
+
 @shared_task
-def stop_movie_ingress(room_id):
+def stop_movie_ingress(room_id, reason=None):
     try:
-        room = Room.objects.get(id=room_id)
-        if not room.movie_started:
-            logger.warning(f"Movie not started for room: {room.name}")
+        # Claim the stop first; a duplicate stop, or one for a stopped room, does nothing
+        if not Room.claim_stream_transition(room_id, [Room.STREAM_STARTING, Room.STREAM_STREAMING], Room.STREAM_STOPPING):
+            logger.warning(f"Movie not started or already stopping for room_id: {room_id}")
             return
 
-        # Stop LiveKit ingress
-        if room.ingress_id:
-            try:
-                stop_livekit_ingress(room.ingress_id)
-                logger.info(f"Stopped LiveKit ingress for room {room.name}")
-            except Exception as e:
-                logger.error(f"Failed to stop ingress for room {room.name}: {e}")
+        room = Room.objects.select_related('movie').get(id=room_id)
+        _stop_stream(room)
 
         # Update room
-        room.movie_started = False
-        room.movie_url = None
-        room.movie_start_time = None
-        room.ingress_id = None
-        room.save()
+        Room.objects.filter(id=room.id, stream_state=Room.STREAM_STOPPING).update(
+            stream_state=Room.STREAM_STOPPED,
+            stream_state_changed_at=timezone.now(),
+            movie_started=False,
+            movie_url=None,
+            movie_start_time=None,
+            paused_at=None,
+            ingress_id=None,
+            ingress_status=None,
+            bot_present=False
+        )
 
         # Notify participants
-        notify_movie_stopped.delay(room.id)
+        broadcast_room_events(room.id, movie_stopped_events(room.movie.title if room.movie else None, reason))
 
-    except Room.DoesNotExist:
-        logger.error(f"Room with id {room_id} does not exist")
     except Exception as e:
         logger.error(f"Failed to stop movie for room_id {room_id}: {str(e)}")
 
 
+@shared_task
+def stop_room_streams(room_name, reason=None, room_id=None):
+    """
+    Stop the stream of room ``room_id``.
+
+    For the bot supervisor, when it can't run a room's bot (out of capacity,
+    or its worker died). Bots started without a room id (start_video_bot)
+    stop every streaming room named ``room_name``.
+    """
+    rooms = Room.objects.filter(stream_state__in=[Room.STREAM_STARTING, Room.STREAM_STREAMING])
+    rooms = rooms.filter(id=room_id) if room_id else rooms.filter(name=room_name)
+    for room_id in rooms.values_list('id', flat=True):
+        stop_movie_ingress(str(room_id), reason=reason)
+
+
 # ----------------------------
 # Participant notifications
 # ----------------------------
-@shared_task
-def notify_movie_started(room_id):
+def broadcast_room_events(room_id, events):
+    """Send several events to a room's participants in one channel-layer round trip"""
     try:
         from channels.layers import get_channel_layer
         from asgiref.sync import async_to_sync
-        room = Room.objects.get(id=room_id)
         channel_layer = get_channel_layer()
-        group_name = f'chat_{str(room.id).replace("-", "_")[:50]}'
         async_to_sync(channel_layer.group_send)(
-            group_name,
+            room_group_name(room_id),
             {
-                'type': 'movie_started',
-                'message': 'Movie has started!',
-                'movie_title': room.movie.title if room.movie else 'Unknown',
-                'started_at': room.movie_start_time.isoformat() if room.movie_start_time else None
+                'type': 'room_events',
+                'events': events
             }
         )
-        logger.info(f"Notified participants that movie started in room: {room.name}")
+        logger.info(f"Sent {', '.join(event['type'] for event in events)} to room_id {room_id}")
     except Exception as e:
-        logger.error(f"Failed to notify movie started for room_id {room_id}: {str(e)}")
+        logger.error(f"Failed to notify room_id {room_id}: {str(e)}")
 
-@shared_task
-def notify_movie_stopped(room_id):
-    try:
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        room = Room.objects.get(id=room_id)
-        channel_layer = get_channel_layer()
-        group_name = f'chat_{str(room.id).replace("-", "_")[:50]}'
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': 'movie_stopped',
-                'message': 'Movie has stopped!',
-                'movie_title': room.movie.title if room.movie else 'Unknown',
-                'stopped_at': timezone.now().isoformat()
-            }
-        )
-        logger.info(f"Notified participants that movie stopped in room: {room.name}")
-    except Exception as e:
-        logger.error(f"Failed to notify movie stopped for room_id {room_id}: {str(e)}")
 
-@shared_task
-def notify_movie_bot_joined(room_id):
-    try:
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        room = Room.objects.get(id=room_id)
-        channel_layer = get_channel_layer()
-        group_name = f'chat_{str(room.id).replace("-", "_")[:50]}'
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': 'chat_message',
-                'message': f'🎬 Movie Bot has joined! "{room.movie.title}" is now starting. Enjoy the show! 🍿',
-                'username': 'Movie Bot',
-                'timestamp': timezone.now().isoformat()
-            }
-        )
-        logger.info(f"Movie bot join notification sent for room: {room.name}")
-    except Exception as e:
-        logger.error(f"Failed to send movie bot notification for room_id {room_id}: {str(e)}")
+def movie_started_events(room):
+    movie_title = room.movie.title if room.movie else 'Unknown'
+    return [
+        {
+            'type': 'movie_started',
+            'message': 'Movie has started!',
+            'movie_title': movie_title,
+            'started_at': room.movie_start_time.isoformat() if room.movie_start_time else None
+        },
+        {
+            'type': 'chat_message',
+            'message': f'🎬 Movie Bot has joined! "{movie_title}" is now starting. Enjoy the show! 🍿',
+            'username': 'Movie Bot',
+            'timestamp': timezone.now().isoformat()
+        },
+    ]
+
+
+def movie_stopped_events(movie_title, reason=None):
+    return [
+        {
+            'type': 'movie_stopped',
+            'message': f'Movie has stopped: {reason}' if reason else 'Movie has stopped!',
+            'movie_title': movie_title or 'Unknown',
+            'stopped_at': timezone.now().isoformat()
+        },
+    ]
 
 
 # ----------------------------
@@ -217,32 +314,137 @@ def notify_movie_bot_joined(room_id):
 # ----------------------------
 @shared_task
 def cleanup_expired_ingresses():
-    cutoff_time = timezone.now() - timedelta(hours=3)
-    expired_rooms = Room.objects.filter(
-        movie_started=True,
-        movie_start_time__lt=cutoff_time,
-        ingress_id__isnull=False
+    """
+    Stop every stream whose movie has run its length.
+
+    Rooms are due MOVIE_CLEANUP_GRACE_MINUTES after their movie_end_time, which
+    pauses and seeks move, or MOVIE_CLEANUP_FALLBACK_HOURS after starting if the
+    movie has no duration. Paused rooms wait until they have been paused for
+    MOVIE_CLEANUP_FALLBACK_HOURS. Ingresses are deleted concurrently and all
+    rooms are reset with one update.
+    """
+    now = timezone.now()
+    fallback = now - timedelta(hours=settings.MOVIE_CLEANUP_FALLBACK_HOURS)
+    due = (
+        Q(paused_at__isnull=True, movie_end_time__lt=now - timedelta(minutes=settings.MOVIE_CLEANUP_GRACE_MINUTES)) |
+        Q(paused_at__isnull=True, movie_end_time__isnull=True, movie_start_time__lt=fallback) |
+        Q(paused_at__lt=fallback)
+    )
+    # Claim all due rooms for stopping in one conditional update, as claim_stream_transition
+    # does: a room another stop holds, or one restarted since, doesn't match and is left alone
+    if not Room.objects.filter(due, stream_state=Room.STREAM_STREAMING).update(
+        stream_state=Room.STREAM_STOPPING,
+        stream_state_changed_at=now
+    ):
+        return
+    # The rooms this run claimed carry its timestamp
+    expired = list(
+        Room.objects.filter(stream_state=Room.STREAM_STOPPING, stream_state_changed_at=now)
+        .values_list('id', 'name', 'ingress_id', 'movie__title')
     )
-    for room in expired_rooms:
+    expired_ids = [room_id for room_id, _, _, _ in expired]
+
+    ingress_ids = [ingress_id for _, _, ingress_id, _ in expired if ingress_id]
+    if ingress_ids:
+        results = stop_livekit_ingresses(ingress_ids)
+        failed = [ingress_id for ingress_id, result in results.items() if result['status'] == 'error']
+        if failed:
+            logger.error(f"Failed to stop {len(failed)} expired ingresses: {failed}")
+
+    for room_id, room_name, _, _ in expired:
         try:
-            stop_movie_ingress.delay(room.id)
-            logger.info(f"Scheduled cleanup for expired room: {room.name}")
+            stop_bot_session(room_id)
         except Exception as e:
-            logger.error(f"Failed to schedule cleanup for room {room.name}: {str(e)}")
+            logger.error(f"Failed to stop bot for room {room_name}: {e}")
+
+    # Same reset as stop_movie_ingress, for all rooms at once
+    Room.objects.filter(id__in=expired_ids, stream_state=Room.STREAM_STOPPING).update(
+        stream_state=Room.STREAM_STOPPED,
+        stream_state_changed_at=timezone.now(),
+        movie_started=False,
+        movie_url=None,
+        movie_start_time=None,
+        paused_at=None,
+        ingress_id=None,
+        ingress_status=None,
+        bot_present=False
+    )
+
+    for room_id, _, _, movie_title in expired:
+        broadcast_room_events(room_id, movie_stopped_events(movie_title))
+    logger.info(f"Cleaned up {len(expired)} finished rooms")
+
+
+# ----------------------------
+# LiveKit ingress reconciliation
+# ----------------------------
+@shared_task
+def reconcile_livekit_ingresses():
+    """
+    Safety net for missed ingress webhooks: refresh every room's ingress status from one listing.
+
+    Ingresses LiveKit no longer knows about are marked MISSING.
+    """
+    rooms = list(
+        Room.objects.filter(ingress_id__isnull=False).exclude(ingress_id__startswith=BOT_INGRESS_PREFIX)
+        .values_list('id', 'ingress_id', 'ingress_status')
+    )
+    if not rooms:
+        return
+
+    try:
+        ingresses = list_livekit_ingresses()
+    except Exception as e:
+        logger.error(f"Failed to list LiveKit ingresses: {str(e)}")
+        return
+
+    changes = {}
+    for room_id, ingress_id, ingress_status in rooms:
+        info = ingresses.get(ingress_id)
+        current = api.IngressState.Status.Name(info.state.status) if info else 'MISSING'
+        if current != ingress_status:
+            changes[room_id] = current
+    if not changes:
+        return
+
+    # One UPDATE for all changed rooms
+    Room.objects.filter(id__in=changes).update(
+        ingress_status=Case(*(When(id=room_id, then=Value(current)) for room_id, current in changes.items())),
+        livekit_updated_at=timezone.now()
+    )
+    logger.info(f"Reconciled ingress status of {len(changes)} rooms")
 
 
 @shared_task
 def start_video_bot(room_name, movie_url):
-    """Start the video bot in an async context"""
+    """Forward a bot start to the bot supervisor (kept for already-queued tasks)"""
     try:
         logger.info(f"Starting video bot for room: {room_name}, URL: {movie_url}")
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(run_bot(room_name, movie_url))
+        start_bot_session(None, room_name, movie_url)
     except Exception as e:
-        logger.error(f"Failed to run video bot for room {room_name}: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-    finally:
-        loop.close()
-        logger.info(f"Video bot task completed for room: {room_name}")
+        logger.error(f"Failed to start video bot for room {room_name}: {str(e)}")
+
+
+@shared_task
+def notify_movie_started(room_id):
+    """Tell a room its movie started (kept for already-queued tasks; see broadcast_room_events)"""
+    room = Room.objects.select_related('movie').filter(id=room_id).first()
+    if room:
+        # The bot's chat message went out as notify_movie_bot_joined
+        broadcast_room_events(room.id, movie_started_events(room)[:1])
+
+
+@shared_task
+def notify_movie_bot_joined(room_id):
+    """Tell a room the movie bot joined (kept for already-queued tasks; see broadcast_room_events)"""
+    room = Room.objects.select_related('movie').filter(id=room_id).first()
+    if room:
+        broadcast_room_events(room.id, movie_started_events(room)[1:])
+
+
+@shared_task
+def notify_movie_stopped(room_id):
+    """Tell a room its movie stopped (kept for already-queued tasks; see broadcast_room_events)"""
+    room = Room.objects.select_related('movie').filter(id=room_id).first()
+    if room:
+        broadcast_room_events(room.id, movie_stopped_events(room.movie.title if room.movie else None))
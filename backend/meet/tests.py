@@ -1,3 +1,1199 @@
-from django.test import TestCase
+import asyncio
+import gc
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import warnings
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from celery.exceptions import Retry
+from rest_framework.test import APIClient
+
+from movie.models import Movie
+
+from .consumers import ChatConsumer
+from .livekit_client import LiveKitClient
+from .models import Invitation, Room
+from .supervisor import STREAM_COUNTERS, STREAM_GAUGES, STREAM_HISTOGRAMS, BotSupervisor, MetricsWriter
+from .tasks import (
+    START_RETRY_DELAY, check_and_start_movies, cleanup_expired_ingresses, notify_movie_bot_joined, notify_movie_started,
+    notify_movie_stopped, reconcile_livekit_ingresses, start_movie_ingress, stop_room_streams
+)
+from .utils import (
+    AUDIO_CHANNELS, AUDIO_SAMPLE_RATE, BOT_IDENTITY, DEFAULT_PROFILE, DecodedFrame, LatencyHistogram, MediaClock,
+    MediaDecoder, OutputProfile, StreamStats, choose_output_profile, find_bot_rendition, join_shared_playback,
+    movie_media_path, open_local_media, select_output_profile, shared_playbacks, stream_media, stream_mp4_content
+)
+
+
+RAMP_PERIOD = 20000
+
+
+def write_ramp_movie(path, video_seconds, audio_seconds, fps=25):
+    """Tiny movie whose PCM audio is a ramp (sample n is n % RAMP_PERIOD), outlasting its video"""
+    import av
+    import numpy as np
+
+    with av.open(path, 'w', format='matroska') as container:
+        video = container.add_stream('mpeg4', rate=fps)
+        video.width, video.height, video.pix_fmt = 64, 48, 'yuv420p'
+        audio = container.add_stream('pcm_s16le', rate=AUDIO_SAMPLE_RATE)
+        audio.layout = 'stereo'
+
+        picture = np.zeros((48, 64, 3), dtype=np.uint8)
+        for index in range(int(video_seconds * fps)):
+            frame = av.VideoFrame.from_ndarray(picture, format='rgb24')
+            frame.pts = index
+            container.mux(video.encode(frame))
+        container.mux(video.encode())
+
+        samples_per_frame = 1024
+        for start in range(0, int(audio_seconds * AUDIO_SAMPLE_RATE), samples_per_frame):
+            ramp = ((start + np.arange(samples_per_frame)) % RAMP_PERIOD).astype(np.int16)
+            frame = av.AudioFrame.from_ndarray(np.repeat(ramp, AUDIO_CHANNELS)[None, :], format='s16', layout='stereo')
+            frame.sample_rate = AUDIO_SAMPLE_RATE
+            frame.pts = start
+            container.mux(audio.encode(frame))
+        container.mux(audio.encode())
+
+
+class MediaDecoderAudioTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.movie = os.path.join(cls.tmp.name, 'ramp.mkv')
+        # Once the video ends the queue holds nothing but audio chunks
+        write_ramp_movie(cls.movie, video_seconds=1, audio_seconds=4)
+        cls.seekable = os.path.join(cls.tmp.name, 'seekable.mkv')
+        write_ramp_movie(cls.seekable, video_seconds=4, audio_seconds=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    async def _consume(self, max_queue):
+        import numpy as np
+
+        decoder = MediaDecoder(self.movie, 64, 48, max_queue=max_queue)
+        decoder.start()
+        chunks = []
+        try:
+            while (item := await decoder.get()) is not None:
+                if item.kind == 'video':
+                    decoder.release(item.data)
+                    continue
+                received = np.frombuffer(item.data, dtype=np.int16)[::AUDIO_CHANNELS].copy()
+                # Like the publisher, keep using the chunk while the decoder fills the queue up again
+                await asyncio.sleep(0.002)
+                published = np.frombuffer(item.data, dtype=np.int16)[::AUDIO_CHANNELS].copy()
+                chunks.append((received, published))
+        finally:
+            decoder.stop()
+        return chunks
+
+    def test_queued_audio_chunks_stay_intact(self):
+        import numpy as np
+
+        for max_queue in (2, 4, 8):
+            with self.subTest(max_queue=max_queue):
+                chunks = asyncio.run(self._consume(max_queue))
+                # The last chunk is padded out with silence
+                audio = np.concatenate([received for received, _ in chunks[:-1]])
+                self.assertEqual(len(audio), 4 * AUDIO_SAMPLE_RATE - 4 * AUDIO_SAMPLE_RATE % len(chunks[0][0]))
+                self.assertTrue(np.array_equal(audio, np.arange(len(audio)) % RAMP_PERIOD), "queued chunks were overwritten")
+                for received, published in chunks:
+                    self.assertTrue(np.array_equal(received, published), "chunk changed while it was being published")
+
+    def test_seek_marker_precedes_frames_from_new_position(self):
+        import numpy as np
+
+        async def consume():
+            decoder = MediaDecoder(self.seekable, 64, 48, max_queue=4)
+            request = decoder.request_seek(2.5)
+            decoder.start()
+            items = []
+            try:
+                while (item := await decoder.get()) is not None:
+                    if item.kind == 'video':
+                        decoder.release(item.data)
+                    elif item.kind == 'audio':
+                        item = item._replace(data=np.frombuffer(item.data, dtype=np.int16)[::AUDIO_CHANNELS].copy())
+                    items.append(item)
+            finally:
+                decoder.stop()
+            return request, items
+
+        request, items = asyncio.run(consume())
+        self.assertEqual((items[0].kind, items[0].data, items[0].pts), ('seek', request, 2.5))
+        frames = items[1:]
+        self.assertNotIn('seek', [item.kind for item in frames])
+        # Lands on the keyframe at or before the position
+        self.assertTrue(2.0 <= frames[0].pts <= 2.5, frames[0].pts)
+        for item in frames:
+            self.assertGreaterEqual(item.pts, 2.0)
+            if item.kind == 'audio':
+                # Timestamps still match the audio they come with
+                expected = round(item.pts * AUDIO_SAMPLE_RATE) % RAMP_PERIOD
+                self.assertLessEqual(abs(int(item.data[0]) - expected), AUDIO_SAMPLE_RATE // 1000)
+
+    def test_put_after_loop_closed_leaves_no_coroutine_behind(self):
+        loop = asyncio.new_event_loop()
+        decoder = MediaDecoder(self.movie, 64, 48, loop=loop)
+        loop.close()
+        item = DecodedFrame('audio', b'', 0, 0.0)
+        # Leave earlier tests' garbage out of what is caught
+        gc.collect()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertFalse(decoder._put(item))
+            # Closed between the check and the call
+            with mock.patch.object(loop, 'is_closed', return_value=False):
+                self.assertFalse(decoder._put(item))
+            gc.collect()
+        self.assertEqual([str(warning.message) for warning in caught if 'never awaited' in str(warning.message)], [])
+
+
+class FakeLoop:
+    """Event loop time that only moves when a test moves it"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+class MediaClockTests(SimpleTestCase):
+    def setUp(self):
+        self.loop = FakeLoop()
+        self.clock = MediaClock(loop=self.loop)
+
+    def test_paces_by_timestamps_from_first_seen(self):
+        # Anchored to the first timestamp, wherever the stream starts
+        self.assertEqual(self.clock.lateness(42.0), 0.0)
+        self.assertAlmostEqual(self.clock.lateness(42.04), -0.04)
+        self.loop.now += 0.1
+        self.assertAlmostEqual(self.clock.lateness(42.04), 0.06)
+        self.assertAlmostEqual(self.clock.lateness(43.0), -0.9)
+
+    def test_pause_shifts_schedule(self):
+        self.clock.lateness(0.0)
+        self.loop.now += 1.0
+        self.clock.pause()
+        self.loop.now += 5.0
+        # Pausing again doesn't restart the pause
+        self.clock.pause()
+        self.loop.now += 5.0
+        self.clock.resume()
+        self.assertAlmostEqual(self.clock.lateness(1.0), 0.0)
+
+    def test_pause_before_first_frame_shifts_nothing(self):
+        self.clock.pause()
+        self.loop.now += 5.0
+        self.clock.resume()
+        self.assertEqual(self.clock.lateness(0.0), 0.0)
+
+    def test_reset_anchors_on_next_timestamp(self):
+        self.clock.lateness(0.0)
+        self.loop.now += 2.0
+        # After a seek to 600s
+        self.clock.reset()
+        self.assertEqual(self.clock.lateness(600.0), 0.0)
+        self.assertAlmostEqual(self.clock.lateness(600.5), -0.5)
+
+
+class FakeDecoder:
+    """MediaDecoder handing out ``items``, each after ``delay`` seconds of fake decode time"""
+
+    def __init__(self, loop, items):
+        self.loop = loop
+        self.items = list(items)
+        self.released = []
+        self.queue_depth = 0
+        self.max_queue = self.max_depth = 4
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def request_seek(self, position):
+        raise AssertionError("not seeking")
+
+    async def get(self):
+        if not self.items:
+            return None
+        delay, item = self.items.pop(0)
+        self.loop.now += delay
+        return item
+
+    def release(self, buffer):
+        self.released.append(buffer)
+
+
+@override_settings(BOT_MAX_VIDEO_LATENESS=0.1)
+class StreamPacingTests(SimpleTestCase):
+    profile = OutputProfile(4, 4, 25, 100_000)
+
+    def stream(self, items):
+        loop = FakeLoop()
+        decoder = FakeDecoder(loop, items)
+        video_source = mock.Mock()
+        stats = StreamStats()
+        with mock.patch('meet.utils.MediaDecoder', return_value=decoder), \
+                mock.patch('meet.utils.MediaClock', lambda: MediaClock(loop=loop)), \
+                mock.patch('meet.utils.asyncio.sleep', loop.sleep):
+            asyncio.run(stream_mp4_content(video_source, None, 'movie.mp4', self.profile, stats=stats))
+        return stats, video_source, decoder
+
+    def frame(self, pts, delay=0.0):
+        return delay, DecodedFrame('video', bytearray(4 * 4 * 3 // 2), None, pts)
+
+    def test_late_frames_dropped_until_caught_up(self):
+        items = [self.frame(0.0), self.frame(0.04), self.frame(0.08)]
+        # The decoder stalls for 300ms
+        items += [self.frame(0.12, delay=0.3), self.frame(0.16), self.frame(0.40), self.frame(0.44)]
+        stats, video_source, decoder = self.stream(items)
+
+        self.assertEqual(stats.frames_sent, 5)
+        self.assertEqual(stats.frames_dropped, 2)
+        self.assertEqual(video_source.capture_frame.call_count, 5)
+        self.assertAlmostEqual(stats.position, 0.44)
+        # Every buffer goes back to the pool, sent or dropped
+        self.assertEqual(len(decoder.released), 7)
+
+    def test_frames_on_time_are_all_sent(self):
+        stats, video_source, _ = self.stream([self.frame(index * 0.04, delay=0.03) for index in range(25)])
+        self.assertEqual((stats.frames_sent, stats.frames_dropped), (25, 0))
+        # Waited for the frames due later, so none went out late
+        self.assertAlmostEqual(stats.video_drift, 0.0)
+
+
+class LocalMediaTests(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.playlist = os.path.join(self.media_root, 'hls', '1', 'master.m3u8')
+        os.makedirs(os.path.dirname(self.playlist))
+        with open(self.playlist, 'w') as f:
+            f.write("#EXTM3U\n")
+
+    def path(self, hls_path):
+        return movie_media_path(Movie(title='Movie', movie_file='movies/movie.mp4', duration_minutes=90, hls_path=hls_path))
+
+    def test_movie_media_path(self):
+        cases = [
+            # Not converted yet: the upload, whether or not it is still there
+            (None, os.path.join(self.media_root, 'movies', 'movie.mp4')),
+            (self.playlist, self.playlist),
+            ('hls/1/master.m3u8', self.playlist),
+            ('/hls/1/master.m3u8', self.playlist),
+            # Converted under another checkout's media folder
+            ('/home/old/checkout/media/hls/1/master.m3u8', self.playlist),
+            # Gone: where it would be, for the caller to fail on
+            ('hls/2/master.m3u8', os.path.join(self.media_root, 'hls', '2', 'master.m3u8')),
+        ]
+        for hls_path, expected in cases:
+            with self.subTest(hls_path):
+                self.assertEqual(self.path(hls_path), expected)
+
+    def test_movie_media_path_stays_in_media_root(self):
+        for hls_path in ('../../etc/passwd', '/srv/media/../../etc/passwd', 'hls/../../outside.m3u8'):
+            with self.subTest(hls_path), self.assertRaises(SuspiciousFileOperation):
+                self.path(hls_path)
+
+    def test_open_local_media(self):
+        with mock.patch('meet.utils.os.posix_fadvise', create=True) as fadvise:
+            with open_local_media(self.playlist) as media:
+                self.assertEqual(media.read(), b"#EXTM3U\n")
+        if hasattr(os, 'POSIX_FADV_SEQUENTIAL'):
+            fadvise.assert_called_once_with(mock.ANY, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    def test_open_local_media_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            open_local_media(os.path.join(self.media_root, 'movies', 'gone.mp4'))
+
+
+class OutputProfileTests(SimpleTestCase):
+    def test_choose_output_profile(self):
+        cases = [
+            # (source width, height, fps, max quality) -> (width, height, fps, max bitrate)
+            ((1920, 1080, 24, '1080p'), (1920, 1080, 24, 4_800_000)),
+            ((1920, 1080, 24, '720p'), (1280, 720, 24, 2_400_000)),
+            # Frame rate capped at BOT_MAX_FRAMERATE; no tier means the default
+            ((1920, 1080, 60, None), (1280, 720, 30, 3_000_000)),
+            ((1920, 1080, 30, 'ultra'), (1280, 720, 30, 3_000_000)),
+            # Never scaled up, and the bitrate follows the pixels actually sent
+            ((1280, 720, 30, '1080p'), (1280, 720, 30, 2_666_666)),
+            ((64, 48, 25, '720p'), (64, 48, 25, 8_333)),
+            # Aspect ratio kept, whichever side limits
+            ((1920, 804, 24, '720p'), (1280, 536, 24, 1_786_666)),
+            ((1440, 1080, 25, '480p'), (640, 480, 25, 936_768)),
+            # Odd sizes rounded down to even; unknown frame rate taken as the cap
+            ((853, 479, 0, '360p'), (640, 358, 30, 795_555)),
+        ]
+        for source, expected in cases:
+            with self.subTest(source):
+                self.assertEqual(choose_output_profile(*source), OutputProfile(*expected))
+
+    def test_select_output_profile_probes_source(self):
+        with tempfile.TemporaryDirectory() as folder:
+            movie = os.path.join(folder, 'movie.mkv')
+            write_ramp_movie(movie, video_seconds=1, audio_seconds=1)
+            self.assertEqual(select_output_profile(movie, '1080p'), choose_output_profile(64, 48, 25, '1080p'))
+
+    def test_select_output_profile_falls_back_when_probe_fails(self):
+        with self.assertLogs('meet.utils', 'WARNING'):
+            self.assertEqual(select_output_profile('/no/such/movie.mp4'), DEFAULT_PROFILE)
+        with self.assertLogs('meet.utils', 'WARNING'):
+            # Still no more than the room asked for
+            self.assertEqual(select_output_profile('/no/such/movie.mp4', '480p'), OutputProfile(852, 480, 30, 1_496_487))
+
+
+class FindBotRenditionTests(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.hls_folder = os.path.join(self.media_root, 'hls', '1')
+        self.playlist = os.path.join(self.hls_folder, 'master.m3u8')
+        self.rendition = os.path.join(self.hls_folder, 'bot.mp4')
+        os.makedirs(self.hls_folder)
+        with open(self.playlist, 'w') as f:
+            f.write(
+                "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=3000000,RESOLUTION=1280x720\n720p.m3u8\n"
+                "#EXT-X-STREAM-INF:BANDWIDTH=900000,RESOLUTION=640x360\n360p.m3u8\n"
+            )
+
+    def add_rendition(self):
+        open(self.rendition, 'wb').close()
+
+    def test_finds_rendition_next_to_playlist(self):
+        self.add_rendition()
+        for video_file in [
+            self.playlist,
+            'http://localhost:8000/media/hls/1/master.m3u8',
+            'https://cdn.example.com/media/hls/1/master.m3u8?token=abc',
+        ]:
+            with self.subTest(video_file):
+                self.assertEqual(find_bot_rendition(video_file), self.rendition)
+
+    def test_finds_rendition_of_source_file(self):
+        source = os.path.join(self.media_root, 'movies', 'movie.mp4')
+        os.makedirs(os.path.join(f"{source}_hls"))
+        open(os.path.join(f"{source}_hls", 'bot.mp4'), 'wb').close()
+        self.assertEqual(find_bot_rendition(source), os.path.join(f"{source}_hls", 'bot.mp4'))
+
+    def test_none_without_rendition_or_outside_media(self):
+        self.assertIsNone(find_bot_rendition(self.playlist))
+        self.add_rendition()
+        self.assertIsNone(find_bot_rendition('http://localhost:8000/static/hls/1/master.m3u8'))
+        self.assertIsNone(find_bot_rendition(os.path.join(self.media_root, 'movies', 'movie.mp4')))
+
+    def stream(self, profile=DEFAULT_PROFILE):
+        with mock.patch('meet.utils.stream_mp4_content') as mp4, mock.patch('meet.utils.stream_hls_content') as hls:
+            asyncio.run(stream_media(None, None, self.playlist, profile))
+        played = mp4 if mp4.called else hls
+        return played.call_args.args[2]
+
+    def test_stream_media_plays_rendition(self):
+        self.add_rendition()
+        self.assertEqual(self.stream(), self.rendition)
+
+    def test_stream_media_falls_back_to_hls(self):
+        # No rendition: the smallest variant at least as tall as the output
+        self.assertEqual(self.stream(), os.path.join(self.hls_folder, '720p.m3u8'))
+        self.add_rendition()
+        # Larger than the rendition: it would have to be scaled up
+        self.assertEqual(self.stream(OutputProfile(1920, 1080, 30, 6_000_000)), os.path.join(self.hls_folder, '720p.m3u8'))
+
+
+@override_settings(BOT_FANOUT_TOLERANCE=2)
+class SharedPlaybackTests(SimpleTestCase):
+    profile = choose_output_profile(1920, 1080, 24, '720p')
+
+    async def _leave(self):
+        played = []
+
+        async def play_forever(*args, **kwargs):
+            played.append(args)
+            await asyncio.Event().wait()
+
+        with mock.patch('meet.utils.stream_media', play_forever):
+            rooms = [
+                asyncio.create_task(join_shared_playback(name, 'movie.mp4', self.profile, object(), object()))
+                for name in ('first', 'second')
+            ]
+            await asyncio.sleep(0.01)
+            self.assertEqual(len(shared_playbacks[('movie.mp4', self.profile)]), 1)
+            # One decode, at the rooms' output profile
+            self.assertEqual([args[3] for args in played], [self.profile])
+            for room in rooms:
+                room.cancel()
+            await asyncio.gather(*rooms, return_exceptions=True)
+            await asyncio.sleep(0.01)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    def test_leaving_rooms_leave_no_tasks_behind(self):
+        self.assertEqual(asyncio.run(self._leave()), [])
+        self.assertNotIn(('movie.mp4', self.profile), shared_playbacks)
+
+
+class PlaybackControlViewTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.creator = User.objects.create_user(email='creator@example.com', password='x')
+        self.guest = User.objects.create_user(email='guest@example.com', password='x')
+        movie, = Movie.objects.bulk_create([Movie(title='Long movie', movie_file='movies/long.mp4', duration_minutes=100)])
+        self.start = timezone.now() - timedelta(minutes=10)
+        self.room = Room.objects.create(
+            name='movie-night', creator=self.creator, movie=movie, meet_datetime=self.start,
+            stream_state=Room.STREAM_STREAMING, movie_started=True, stream_state_changed_at=self.start,
+            movie_start_time=self.start, movie_end_time=self.start + timedelta(minutes=100)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+        self.commands = {}
+        for action in ('pause', 'resume', 'seek'):
+            patcher = mock.patch(f'meet.views.{action}_bot_session')
+            self.commands[action] = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, action, data=None, now=None):
+        with mock.patch('meet.models.timezone.now', return_value=now or timezone.now()):
+            return self.client.post(f'/meet/rooms/{self.room.id}/{action}_movie/', data or {}, format='json')
+
+    def refresh(self):
+        self.room.refresh_from_db()
+        return self.room
+
+    def test_only_creator_controls_playback(self):
+        self.client.force_authenticate(self.guest)
+        # The guest can see the room, but not control it
+        self.assertEqual(self.post('pause').status_code, 403)
+        self.commands['pause'].assert_not_called()
+
+    def test_room_must_be_streaming_through_bot(self):
+        Room.objects.filter(id=self.room.id).update(stream_state=Room.STREAM_STOPPED)
+        self.assertEqual(self.post('pause').status_code, 400)
+        Room.objects.filter(id=self.room.id).update(stream_state=Room.STREAM_STREAMING, ingress_id='IN_abc')
+        self.assertEqual(self.post('seek', {'position': 10}).status_code, 400)
+        for command in self.commands.values():
+            command.assert_not_called()
+
+    def test_pause_and_resume_move_end_time(self):
+        paused = timezone.now()
+        self.assertEqual(self.post('pause', now=paused).status_code, 200)
+        self.commands['pause'].assert_called_once_with(self.room.id)
+        self.assertEqual(self.refresh().paused_at, paused)
+        # A second pause doesn't restart the pause
+        self.post('pause', now=paused + timedelta(minutes=1))
+        self.assertEqual(self.refresh().paused_at, paused)
+
+        self.assertEqual(self.post('resume', now=paused + timedelta(minutes=15)).status_code, 200)
+        self.commands['resume'].assert_called_once_with(self.room.id)
+        self.assertIsNone(self.refresh().paused_at)
+        self.assertEqual(self.room.movie_end_time, self.start + timedelta(minutes=115))
+
+    def test_seek_recomputes_end_time(self):
+        now = timezone.now()
+        response = self.post('seek', {'position': 30 * 60}, now=now)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['position'], 1800.0)
+        self.commands['seek'].assert_called_once_with(self.room.id, 1800.0)
+        self.assertEqual(self.refresh().movie_end_time, now + timedelta(minutes=70))
+
+    def test_seek_needs_a_position(self):
+        for position in (None, 'soon', -5, 'inf'):
+            self.assertEqual(self.post('seek', {'position': position}).status_code, 400, position)
+        self.commands['seek'].assert_not_called()
+
+
+class LiveKitClientTests(SimpleTestCase):
+    def test_failed_connect_stops_loop_thread(self):
+        with mock.patch('livekit.api.LiveKitAPI', side_effect=ValueError("no url")), \
+                mock.patch('aiohttp.ClientSession.close', autospec=True) as close:
+            with self.assertRaises(ValueError):
+                LiveKitClient()
+        close.assert_called_once()
+        self.assertNotIn('livekit-api', [thread.name for thread in threading.enumerate()])
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    LIVEKIT_API_KEY='test-key',
+    LIVEKIT_API_SECRET='test-secret-long-enough-for-hs256-signing',
+)
+class LiveKitTokenCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        User = get_user_model()
+        self.creator = User.objects.create_user(email='creator@example.com', password='x')
+        self.guest = User.objects.create_user(email='guest@example.com', password='x')
+        self.room = Room.objects.create(name='movie-night', creator=self.creator, meet_datetime=timezone.now() + timedelta(hours=1))
+        self.invitation = Invitation.objects.create(
+            room=self.room, invited_user=self.guest, expires_at=timezone.now() + timedelta(hours=2)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def get_token(self, room_id):
+        return self.client.post('/meet/get-token/', {'roomId': room_id}, format='json')
+
+    def spellings(self):
+        room_id = str(self.room.id)
+        return [room_id, room_id.upper(), room_id.replace('-', ''), '{' + room_id + '}']
+
+    def test_token_is_reused(self):
+        first = self.get_token(str(self.room.id))
+        self.assertEqual(first.status_code, 200)
+        for spelling in self.spellings():
+            self.assertEqual(self.get_token(spelling).data['token'], first.data['token'])
+
+    def test_withdrawn_invitation_revokes_every_spelling(self):
+        for spelling in self.spellings():
+            self.assertEqual(self.get_token(spelling).status_code, 200)
+        self.invitation.delete()
+        for spelling in self.spellings():
+            self.assertEqual(self.get_token(spelling).status_code, 403, spelling)
+
+    def test_renamed_room_gets_new_tokens(self):
+        import jwt
+
+        self.get_token(str(self.room.id))
+        self.room.name = 'renamed'
+        self.room.save()
+        token = self.get_token(str(self.room.id)).data['token']
+        self.assertEqual(jwt.decode(token, options={'verify_signature': False})['video']['room'], 'renamed')
+
+    def test_invalid_room_id(self):
+        self.assertEqual(self.get_token('not-a-room').status_code, 400)
+        self.assertEqual(self.client.post('/meet/get-token/', {}, format='json').status_code, 400)
+
+
+@override_settings(MOVIE_CLEANUP_GRACE_MINUTES=10, MOVIE_CLEANUP_FALLBACK_HOURS=3)
+class MovieEndTimeTests(TestCase):
+    def setUp(self):
+        creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        # bulk_create skips the upload signals, which would hash and convert the file
+        self.movie, = Movie.objects.bulk_create([Movie(title='Long movie', movie_file='movies/long.mp4', duration_minutes=100)])
+        self.start = timezone.now() - timedelta(minutes=50)
+        self.room = Room.objects.create(
+            name='movie-night', creator=creator, movie=self.movie, meet_datetime=self.start,
+            stream_state=Room.STREAM_STREAMING, movie_started=True, stream_state_changed_at=self.start,
+            movie_start_time=self.start, movie_end_time=self.start + timedelta(minutes=100)
+        )
+
+    def refresh(self):
+        self.room.refresh_from_db()
+        return self.room
+
+    def cleanup(self):
+        with mock.patch('meet.tasks.stop_bot_session'), mock.patch('meet.tasks.broadcast_room_events'):
+            cleanup_expired_ingresses()
+        return self.refresh().stream_state
+
+    def test_resume_pushes_end_back_by_pause(self):
+        with mock.patch('meet.models.timezone.now', return_value=self.start + timedelta(minutes=10)):
+            self.room.record_pause()
+        with mock.patch('meet.models.timezone.now', return_value=self.start + timedelta(minutes=40)):
+            self.room.record_resume()
+        self.assertIsNone(self.refresh().paused_at)
+        self.assertEqual(self.room.movie_end_time, self.start + timedelta(minutes=130))
+
+    def test_seek_recomputes_end(self):
+        now = timezone.now()
+        with mock.patch('meet.models.timezone.now', return_value=now):
+            self.room.record_seek(90 * 60)
+        self.assertEqual(self.refresh().movie_end_time, now + timedelta(minutes=10))
+
+    def test_seek_while_paused_counts_from_resume(self):
+        paused = timezone.now() - timedelta(minutes=5)
+        with mock.patch('meet.models.timezone.now', return_value=paused):
+            self.room.record_pause()
+        self.room.record_seek(0)
+        with mock.patch('meet.models.timezone.now', return_value=paused + timedelta(minutes=20)):
+            self.room.record_resume()
+        self.assertEqual(self.refresh().movie_end_time, paused + timedelta(minutes=120))
+
+    def test_cleanup_uses_stored_end(self):
+        # Run past its length from the start, but resumed late enough to still be playing
+        Room.objects.filter(id=self.room.id).update(
+            movie_start_time=self.start - timedelta(hours=2), movie_end_time=timezone.now() + timedelta(minutes=5)
+        )
+        self.assertEqual(self.cleanup(), Room.STREAM_STREAMING)
+        Room.objects.filter(id=self.room.id).update(movie_end_time=timezone.now() - timedelta(minutes=11))
+        self.assertEqual(self.cleanup(), Room.STREAM_STOPPED)
+        self.assertIsNone(self.room.paused_at)
+
+    def test_cleanup_only_stops_rooms_it_claims(self):
+        ended = timezone.now() - timedelta(minutes=11)
+        Room.objects.filter(id=self.room.id).update(movie_end_time=ended)
+        # Due by the same end time, but restarted and being stopped by someone else
+        restarted = Room.objects.create(
+            name='restarted', creator=self.room.creator, movie=self.movie, meet_datetime=self.start,
+            stream_state=Room.STREAM_STARTING, movie_end_time=ended, stream_state_changed_at=timezone.now()
+        )
+        stopping = Room.objects.create(
+            name='stopping', creator=self.room.creator, movie=self.movie, meet_datetime=self.start,
+            stream_state=Room.STREAM_STOPPING, movie_end_time=ended, stream_state_changed_at=timezone.now()
+        )
+        with mock.patch('meet.tasks.stop_bot_session') as stop_bot, mock.patch('meet.tasks.broadcast_room_events') as broadcast:
+            cleanup_expired_ingresses()
+        stop_bot.assert_called_once_with(self.room.id)
+        self.assertEqual([call.args[0] for call in broadcast.call_args_list], [self.room.id])
+        self.assertEqual(self.refresh().stream_state, Room.STREAM_STOPPED)
+        restarted.refresh_from_db()
+        stopping.refresh_from_db()
+        self.assertEqual(restarted.stream_state, Room.STREAM_STARTING)
+        self.assertEqual(stopping.stream_state, Room.STREAM_STOPPING)
+
+    def test_cleanup_waits_for_paused_rooms(self):
+        Room.objects.filter(id=self.room.id).update(
+            movie_end_time=timezone.now() - timedelta(hours=1), paused_at=timezone.now() - timedelta(hours=2)
+        )
+        self.assertEqual(self.cleanup(), Room.STREAM_STREAMING)
+        Room.objects.filter(id=self.room.id).update(paused_at=timezone.now() - timedelta(hours=4))
+        self.assertEqual(self.cleanup(), Room.STREAM_STOPPED)
+
+
+@override_settings(BOT_SESSION_CPU_COST=1.0, BOT_FANOUT_TOLERANCE=0)
+class BotSupervisorTests(SimpleTestCase):
+    def setUp(self):
+        self.supervisor = BotSupervisor(workers=1, cpu_budget=1, health_port=0)
+        self.worker = self.supervisor.workers[0]
+        self.worker.process = mock.Mock(**{'is_alive.return_value': True})
+        self.worker.conn = mock.Mock()
+        self.supervisor._stopping = asyncio.Event()
+        patcher = mock.patch('meet.tasks.stop_room_streams.delay')
+        self.stop_room_streams = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start(self, room_id, room_name='movie-night'):
+        self.supervisor.handle_command(
+            {'action': 'start', 'room_id': room_id, 'room_name': room_name, 'video_file': 'movie.mp4'}
+        )
+
+    def stop(self, room_id):
+        self.supervisor.handle_command({'action': 'stop', 'room_id': room_id})
+
+    def worker_says(self, *messages):
+        self.worker.conn.poll.side_effect = [True] * len(messages) + [False]
+        self.worker.conn.recv.side_effect = messages
+        self.supervisor._on_worker_message(self.worker)
+
+    def sent(self):
+        return [call.args[0]['action'] for call in self.worker.conn.send.call_args_list]
+
+    def test_health_listens_locally_by_default(self):
+        self.assertEqual(self.supervisor.health_host, '127.0.0.1')
+        with override_settings(BOT_SUPERVISOR_HEALTH_HOST='0.0.0.0'):
+            self.assertEqual(BotSupervisor(workers=1).health_host, '0.0.0.0')
+        self.assertEqual(BotSupervisor(workers=1, health_host='10.0.0.5').health_host, '10.0.0.5')
+
+    def test_rejected_start_stops_room(self):
+        self.start('first')
+        # Same name, another room
+        self.start('second')
+        self.assertEqual(self.supervisor.rejected, 1)
+        self.stop_room_streams.assert_called_once_with('movie-night', mock.ANY, room_id='second')
+
+    def test_restart_waits_for_previous_bot(self):
+        self.start('room')
+        self.stop('room')
+        self.start('room')
+        self.assertEqual(self.sent(), ['start', 'stop'])
+        self.worker_says({'event': 'ended', 'room_id': 'room', 'room_name': 'movie-night'})
+        self.assertEqual(self.sent(), ['start', 'stop', 'start'])
+        self.assertIn('room', self.worker.rooms)
+        self.stop_room_streams.assert_not_called()
+
+    def test_stop_drops_waiting_restart(self):
+        self.start('room')
+        self.stop('room')
+        self.start('room')
+        self.stop('room')
+        self.worker_says({'event': 'ended', 'room_id': 'room', 'room_name': 'movie-night'})
+        self.assertEqual(self.sent(), ['start', 'stop', 'stop'])
+
+    @override_settings(BOT_SESSION_CPU_COST=0.5)
+    def test_rooms_sharing_a_name_are_separate_sessions(self):
+        self.start('first')
+        self.start('second')
+        self.assertEqual(self.sent(), ['start', 'start'])
+        self.stop('first')
+        self.worker_says({'event': 'ended', 'room_id': 'first', 'room_name': 'movie-night'})
+        self.assertEqual(list(self.worker.rooms), ['second'])
+        self.assertEqual(self.supervisor.health()['workers'][0]['rooms'], ['movie-night'])
+
+    def test_start_without_room_id_is_keyed_by_name(self):
+        # Queued by start_video_bot before sessions were keyed by room id
+        self.supervisor.handle_command({'action': 'start', 'room_name': 'movie-night', 'video_file': 'movie.mp4'})
+        self.supervisor.handle_command({'action': 'stop', 'room_name': 'movie-night'})
+        self.assertEqual(self.sent(), ['start', 'stop'])
+        self.worker_says({'event': 'ended', 'room_id': None, 'room_name': 'movie-night'})
+        self.assertEqual(self.worker.rooms, {})
+
+    def test_dead_worker_stops_its_rooms(self):
+        self.start('room')
+        self.worker.conn.poll.side_effect = EOFError
+        with mock.patch('meet.supervisor.asyncio.get_running_loop'), mock.patch.object(self.supervisor, '_spawn') as spawn:
+            self.supervisor._on_worker_message(self.worker)
+        spawn.assert_called_once_with(self.worker)
+        self.stop_room_streams.assert_called_once_with('movie-night', mock.ANY, room_id='room')
+
+
+class MetricsWriterTests(SimpleTestCase):
+    def test_prometheus_text(self):
+        histogram = LatencyHistogram()
+        for seconds in (0.0004, 0.003, 0.004, 0.5):
+            histogram.observe(seconds)
+        metrics = MetricsWriter()
+        metrics.add('bot_frames_sent_total', 'counter', "Video frames published", 10, {'room': 'a'})
+        metrics.add('bot_supervisor_cpu_budget_cores', 'gauge', "Cores bots may use", 4)
+        # Same family again: one header for both
+        metrics.add('bot_frames_sent_total', 'counter', "Video frames published", 3, {'room': 'say "hi"\\\n'})
+        metrics.add_histogram('bot_decode_seconds', "Decode time", histogram.as_dict(), {'room': 'a'})
+
+        buckets = "".join(
+            f'bot_decode_seconds_bucket{{room="a",le="{bound}"}} {count}\n'
+            for bound, count in zip([*LatencyHistogram.BUCKETS, '+Inf'], [1, 1, 1, 3, 3, 3, 3, 3, 3, 4])
+        )
+        self.assertEqual(
+            metrics.render(),
+            "# HELP bot_frames_sent_total Video frames published\n"
+            "# TYPE bot_frames_sent_total counter\n"
+            'bot_frames_sent_total{room="a"} 10\n'
+            'bot_frames_sent_total{room="say \\"hi\\"\\\\\\n"} 3\n'
+            "# HELP bot_supervisor_cpu_budget_cores Cores bots may use\n"
+            "# TYPE bot_supervisor_cpu_budget_cores gauge\n"
+            "bot_supervisor_cpu_budget_cores 4\n"
+            "# HELP bot_decode_seconds Decode time\n"
+            "# TYPE bot_decode_seconds histogram\n"
+            + buckets +
+            'bot_decode_seconds_sum{room="a"} 0.5074\n'
+            'bot_decode_seconds_count{room="a"} 4\n'
+        )
+
+    def test_supervisor_metrics_cover_every_stream(self):
+        supervisor = BotSupervisor(workers=1, cpu_budget=1, health_port=0)
+        stats = StreamStats('movie-night', 'movie.mp4')
+        stats.frames_sent = 250
+        supervisor.workers[0].streams = {'movie-night': stats.as_dict()}
+        text = supervisor.metrics()
+        self.assertIn('bot_frames_sent_total{worker="0",room="movie-night",movie="movie.mp4"} 250\n', text)
+        self.assertIn('bot_capture_seconds_count{worker="0",room="movie-night",movie="movie.mp4"} 0\n', text)
+        # One header per family: two of the supervisor, four of the workers, then the stream ones
+        self.assertEqual(text.count("# TYPE bot_frames_sent_total counter\n"), 1)
+        self.assertEqual(text.count("# TYPE "), 2 + 4 + len(STREAM_COUNTERS) + len(STREAM_GAUGES) + len(STREAM_HISTOGRAMS))
+
+
+class StopRoomStreamsTests(TestCase):
+    def setUp(self):
+        creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        movie, = Movie.objects.bulk_create([Movie(title='Long movie', movie_file='movies/long.mp4', duration_minutes=100)])
+        # Room names are not unique
+        self.room, self.namesake = [
+            Room.objects.create(
+                name='movie-night', creator=creator, movie=movie, meet_datetime=timezone.now(),
+                stream_state=Room.STREAM_STREAMING, movie_started=True, stream_state_changed_at=timezone.now()
+            )
+            for _ in range(2)
+        ]
+
+    def states(self):
+        return [Room.objects.get(id=room.id).stream_state for room in (self.room, self.namesake)]
+
+    def test_stops_and_tells_participants_why(self):
+        with mock.patch('meet.tasks._stop_stream'), mock.patch('meet.tasks.broadcast_room_events') as broadcast:
+            stop_room_streams('movie-night', 'its movie bot crashed', room_id=str(self.room.id))
+        self.room.refresh_from_db()
+        self.assertFalse(self.room.movie_started)
+        self.assertEqual(self.states(), [Room.STREAM_STOPPED, Room.STREAM_STREAMING])
+        self.assertEqual(broadcast.call_args.args[1][0]['message'], 'Movie has stopped: its movie bot crashed')
+
+    def test_without_room_id_stops_rooms_by_name(self):
+        with mock.patch('meet.tasks._stop_stream'), mock.patch('meet.tasks.broadcast_room_events'):
+            stop_room_streams('movie-night', 'its movie bot crashed')
+        self.assertEqual(self.states(), [Room.STREAM_STOPPED, Room.STREAM_STOPPED])
+
+
+@override_settings(STREAM_TRANSITION_TIMEOUT=300)
+class ClaimStreamTransitionTests(TransactionTestCase):
+    def setUp(self):
+        creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        self.room = Room.objects.create(name='movie-night', creator=creator, meet_datetime=timezone.now())
+
+    def claim(self, from_states, to_state, **filters):
+        return Room.claim_stream_transition(self.room.id, from_states, to_state, **filters)
+
+    def test_concurrent_claims_have_one_winner(self):
+        claimers = 8
+        barrier = threading.Barrier(claimers)
+        results = []
+
+        def claim_start():
+            try:
+                barrier.wait()
+                results.append(self.claim([Room.STREAM_STOPPED], Room.STREAM_STARTING))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim_start) for _ in range(claimers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False] * (claimers - 1) + [True])
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.stream_state, Room.STREAM_STARTING)
+        self.assertTrue(self.room.movie_started)
+
+    def test_claim_needs_a_from_state(self):
+        self.assertFalse(self.claim([Room.STREAM_STREAMING], Room.STREAM_STOPPING))
+        self.assertTrue(self.claim([Room.STREAM_STOPPED], Room.STREAM_STARTING))
+        self.assertFalse(self.claim([Room.STREAM_STOPPED], Room.STREAM_STARTING))
+
+    def test_claim_respects_filters(self):
+        Room.objects.filter(id=self.room.id).update(start_task_id='current')
+        self.assertFalse(self.claim([Room.STREAM_STOPPED], Room.STREAM_STARTING, start_task_id='revoked'))
+        self.assertTrue(self.claim([Room.STREAM_STOPPED], Room.STREAM_STARTING, start_task_id='current'))
+
+    def test_abandoned_claim_can_be_taken_over(self):
+        self.assertTrue(self.claim([Room.STREAM_STOPPED], Room.STREAM_STARTING))
+        self.assertFalse(self.claim([Room.STREAM_STREAMING], Room.STREAM_STOPPING))
+        Room.objects.filter(id=self.room.id).update(stream_state_changed_at=timezone.now() - timedelta(seconds=301))
+        self.assertTrue(self.claim([Room.STREAM_STREAMING], Room.STREAM_STOPPING))
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.stream_state, Room.STREAM_STOPPING)
+
+
+class StartMovieIngressTests(TestCase):
+    def setUp(self):
+        creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        movie, = Movie.objects.bulk_create([Movie(title='Long movie', movie_file='movies/long.mp4', duration_minutes=100)])
+        self.room = Room.objects.create(name='movie-night', creator=creator, movie=movie, meet_datetime=timezone.now())
+        for target in ('broadcast_room_events', 'start_bot_session'):
+            patcher = mock.patch(f'meet.tasks.{target}')
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def start(self, **ingress):
+        with mock.patch('meet.tasks.create_livekit_ingress', **ingress):
+            start_movie_ingress(str(self.room.id))
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.stream_state, Room.STREAM_STREAMING)
+
+    def test_ingress_is_the_only_publisher(self):
+        self.start(return_value={'ingress_id': 'IN_abc', 'status': 'created'})
+        self.assertEqual(self.room.ingress_id, 'IN_abc')
+        self.start_bot_session.assert_not_called()
+
+    def test_bot_plays_without_ingress(self):
+        self.start(return_value={'ingress_id': 'bot-movie-night-1', 'status': 'fallback'})
+        self.start_bot_session.assert_called_once()
+        Room.objects.filter(id=self.room.id).update(stream_state=Room.STREAM_STOPPED)
+        self.start_bot_session.reset_mock()
+        self.start(side_effect=RuntimeError("LiveKit down"))
+        self.assertIsNone(self.room.ingress_id)
+        self.start_bot_session.assert_called_once()
+
+
+@override_settings(ROOM_START_SCHEDULE_HORIZON=45 * 60)
+class RoomStartSchedulingTests(TestCase):
+    def setUp(self):
+        self.creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        self.movie, = Movie.objects.bulk_create([Movie(title='Long movie', movie_file='movies/long.mp4', duration_minutes=100)])
+        for name, target in (('apply_async', 'meet.tasks.start_movie_ingress.apply_async'), ('revoke', 'celery.current_app.control.revoke')):
+            patcher = mock.patch(target)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def create_room(self, meet_datetime, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Room.objects.create(name='movie-night', creator=self.creator, movie=self.movie, meet_datetime=meet_datetime, **fields)
+
+    def scheduled(self):
+        """(task id, eta) of each start sent"""
+        return [(call.kwargs['task_id'], call.kwargs.get('eta')) for call in self.apply_async.call_args_list]
+
+    def test_start_scheduled_for_meet_time(self):
+        meet_at = timezone.now() + timedelta(minutes=20)
+        room = self.create_room(meet_at)
+        room.refresh_from_db()
+        self.assertEqual(self.scheduled(), [(room.start_task_id, meet_at)])
+        self.assertEqual(self.apply_async.call_args.args, ((str(room.id),), {'scheduled': True}))
+
+    def test_rescheduling_revokes_previous_start(self):
+        room = self.create_room(timezone.now() + timedelta(minutes=20))
+        room.refresh_from_db()
+        first = room.start_task_id
+        room.meet_datetime += timedelta(minutes=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            room.save()
+        room.refresh_from_db()
+        self.revoke.assert_called_once_with(first)
+        self.assertNotEqual(room.start_task_id, first)
+        self.assertEqual(self.scheduled()[-1], (room.start_task_id, room.meet_datetime))
+
+    def test_rooms_beyond_horizon_are_left_to_the_sweep(self):
+        room = self.create_room(timezone.now() + timedelta(hours=2))
+        room.refresh_from_db()
+        self.assertIsNone(room.start_task_id)
+        self.apply_async.assert_not_called()
+        # Come within the horizon
+        Room.objects.filter(id=room.id).update(meet_datetime=timezone.now() + timedelta(minutes=30))
+        check_and_start_movies()
+        room.refresh_from_db()
+        self.assertEqual([task_id for task_id, _ in self.scheduled()], [room.start_task_id])
+
+    def test_sweep_resends_lost_start_with_same_id(self):
+        room = self.create_room(timezone.now() - timedelta(minutes=5), start_task_id='lost')
+        self.apply_async.reset_mock()
+        Room.objects.filter(id=room.id).update(start_task_id='lost')
+        check_and_start_movies()
+        self.assertEqual(self.scheduled(), [('lost', None)])
+
+    def test_sweep_schedules_overdue_rooms_that_never_started(self):
+        past = timezone.now() - timedelta(minutes=5)
+        Room.objects.bulk_create([
+            Room(name='never-started', creator=self.creator, movie=self.movie, meet_datetime=past),
+            Room(name='stopped', creator=self.creator, movie=self.movie, meet_datetime=past, stream_state_changed_at=past),
+        ])
+        check_and_start_movies()
+        room = Room.objects.get(name='never-started')
+        self.assertEqual(self.scheduled(), [(room.start_task_id, past)])
+        self.assertIsNone(Room.objects.get(name='stopped').start_task_id)
+
+    def test_failed_send_leaves_room_for_the_sweep(self):
+        self.apply_async.side_effect = ConnectionError("broker down")
+        room = self.create_room(timezone.now() + timedelta(minutes=20))
+        room.refresh_from_db()
+        self.assertIsNone(room.start_task_id)
+
+
+class ScheduledStartTests(TestCase):
+    def setUp(self):
+        creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        movie, = Movie.objects.bulk_create([Movie(title='Long movie', movie_file='movies/long.mp4', duration_minutes=100)])
+        self.room, = Room.objects.bulk_create([
+            Room(name='movie-night', creator=creator, movie=movie, meet_datetime=timezone.now(), start_task_id='current')
+        ])
+        for target in ('broadcast_room_events', 'start_bot_session', 'create_livekit_ingress'):
+            patcher = mock.patch(f'meet.tasks.{target}')
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.create_livekit_ingress.return_value = {'ingress_id': 'bot-movie-night-1', 'status': 'fallback'}
+
+    def run_start(self, task_id='current', retries=0):
+        start_movie_ingress.apply((str(self.room.id),), {'scheduled': True}, task_id=task_id, retries=retries)
+        self.room.refresh_from_db()
+        return self.room
+
+    def test_superseded_start_does_nothing(self):
+        self.assertEqual(self.run_start(task_id='revoked').stream_state, Room.STREAM_STOPPED)
+        self.start_bot_session.assert_not_called()
+        self.assertEqual(self.run_start().stream_state, Room.STREAM_STREAMING)
+        self.assertIsNone(self.room.start_task_id)
+
+    def test_failed_start_is_retried_with_backoff(self):
+        with mock.patch('meet.tasks.movie_media_path', side_effect=OSError("gone")), \
+                mock.patch.object(start_movie_ingress, 'retry', return_value=Retry()) as retry:
+            room = self.run_start(retries=1)
+        retry.assert_called_once_with(countdown=START_RETRY_DELAY * 2)
+        self.assertEqual(room.stream_state, Room.STREAM_STOPPED)
+        # Still the room's scheduled start, so the retry can claim it
+        self.assertEqual(room.start_task_id, 'current')
+        self.broadcast_room_events.assert_not_called()
+
+    def test_last_failed_retry_tells_the_room(self):
+        with mock.patch('meet.tasks.movie_media_path', side_effect=OSError("gone")), \
+                mock.patch.object(start_movie_ingress, 'retry') as retry:
+            room = self.run_start(retries=3)
+        retry.assert_not_called()
+        self.assertEqual(room.stream_state, Room.STREAM_STOPPED)
+        events = self.broadcast_room_events.call_args.args[1]
+        self.assertEqual(events[0]['message'], 'Movie has stopped: it could not be started')
+
+
+def ingress_info(ingress_id, status, room_name='movie-night'):
+    from livekit import api
+
+    return api.IngressInfo(ingress_id=ingress_id, room_name=room_name, state=api.IngressState(status=status))
+
+
+@override_settings(LIVEKIT_API_KEY='test-key', LIVEKIT_API_SECRET='test-secret-long-enough-for-hs256-signing')
+class LiveKitWebhookTests(TestCase):
+    def setUp(self):
+        creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        self.room = Room.objects.create(
+            name='movie-night', creator=creator, meet_datetime=timezone.now(),
+            stream_state=Room.STREAM_STREAMING, movie_started=True, ingress_id='IN_1'
+        )
+        patcher = mock.patch('meet.views.stop_movie_ingress.delay')
+        self.stop_movie_ingress = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body, secret='test-secret-long-enough-for-hs256-signing', signed_body=None):
+        import base64
+        import hashlib
+        from livekit import api
+
+        headers = {}
+        if secret:
+            digest = hashlib.sha256((signed_body or body).encode()).digest()
+            token = api.AccessToken('test-key', secret).with_sha256(base64.b64encode(digest).decode()).to_jwt()
+            headers['HTTP_AUTHORIZATION'] = token
+        return self.client.post('/meet/livekit-webhook/', body, content_type='application/webhook+json', **headers)
+
+    def event(self, **fields):
+        from google.protobuf.json_format import MessageToJson
+        from livekit import api
+
+        return MessageToJson(api.WebhookEvent(**fields))
+
+    def refresh(self):
+        self.room.refresh_from_db()
+        return self.room
+
+    def test_rejects_unsigned_and_forged_bodies(self):
+        from livekit import api
+
+        body = self.event(event='ingress_started', ingress_info=ingress_info('IN_1', api.IngressState.ENDPOINT_PUBLISHING))
+        self.assertEqual(self.post(body, secret=None).status_code, 401)
+        self.assertEqual(self.post(body, secret='someone-elses-secret-long-enough-for-hs256').status_code, 401)
+        self.assertEqual(self.post(body, signed_body=self.event(event='room_finished')).status_code, 401)
+        self.assertIsNone(self.refresh().ingress_status)
+        self.assertIsNone(self.room.livekit_updated_at)
+
+    def test_ingress_events_record_status(self):
+        from livekit import api
+
+        body = self.event(event='ingress_started', ingress_info=ingress_info('IN_1', api.IngressState.ENDPOINT_PUBLISHING))
+        self.assertEqual(self.post(body).status_code, 200)
+        self.assertEqual(self.refresh().ingress_status, 'ENDPOINT_PUBLISHING')
+        self.assertIsNotNone(self.room.livekit_updated_at)
+        self.post(self.event(event='ingress_ended', ingress_info=ingress_info('IN_1', api.IngressState.ENDPOINT_INACTIVE)))
+        self.assertEqual(self.refresh().ingress_status, 'ENDPOINT_INACTIVE')
+
+    def test_bot_presence(self):
+        from livekit import api
+
+        livekit_room = api.Room(name='movie-night')
+        self.post(self.event(event='participant_joined', room=livekit_room, participant=api.ParticipantInfo(identity='guest')))
+        self.assertFalse(self.refresh().bot_present)
+        self.post(self.event(event='participant_joined', room=livekit_room, participant=api.ParticipantInfo(identity=BOT_IDENTITY)))
+        self.assertTrue(self.refresh().bot_present)
+
+        # The bot leaving ends the stream
+        self.post(self.event(event='participant_left', room=livekit_room, participant=api.ParticipantInfo(identity=BOT_IDENTITY)))
+        self.assertFalse(self.refresh().bot_present)
+        self.stop_movie_ingress.assert_called_once_with(str(self.room.id))
+
+    def test_room_finished_stops_stream(self):
+        from livekit import api
+
+        self.assertEqual(self.post(self.event(event='room_finished', room=api.Room(name='movie-night'))).status_code, 200)
+        self.stop_movie_ingress.assert_called_once_with(str(self.room.id))
+
+    def test_unknown_events_are_accepted(self):
+        self.assertEqual(self.post(self.event(event='track_published')).status_code, 200)
+
+
+class ReconcileLiveKitIngressesTests(TestCase):
+    def setUp(self):
+        creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        Room.objects.bulk_create([
+            Room(name=ingress_id, creator=creator, meet_datetime=timezone.now(), ingress_id=ingress_id, ingress_status=status)
+            for ingress_id, status in (
+                ('IN_new', None), ('IN_same', 'ENDPOINT_PUBLISHING'), ('IN_gone', 'ENDPOINT_PUBLISHING'),
+                ('bot-movie-night-1', None),
+            )
+        ])
+
+    def statuses(self):
+        return {room.name: (room.ingress_status, room.livekit_updated_at is not None) for room in Room.objects.all()}
+
+    def test_updates_changed_rooms_in_one_listing(self):
+        from livekit import api
+
+        listing = {
+            'IN_new': ingress_info('IN_new', api.IngressState.ENDPOINT_BUFFERING),
+            'IN_same': ingress_info('IN_same', api.IngressState.ENDPOINT_PUBLISHING),
+        }
+        with mock.patch('meet.tasks.list_livekit_ingresses', return_value=listing) as list_ingresses:
+            reconcile_livekit_ingresses()
+        list_ingresses.assert_called_once_with()
+        self.assertEqual(self.statuses(), {
+            'IN_new': ('ENDPOINT_BUFFERING', True),
+            'IN_same': ('ENDPOINT_PUBLISHING', False),
+            'IN_gone': ('MISSING', True),
+            # The bot publishes those itself; there is no ingress to ask about
+            'bot-movie-night-1': (None, False),
+        })
+
+    def test_failed_listing_changes_nothing(self):
+        before = self.statuses()
+        with mock.patch('meet.tasks.list_livekit_ingresses', side_effect=ConnectionError("LiveKit down")):
+            reconcile_livekit_ingresses()
+        self.assertEqual(self.statuses(), before)
+
+
+class RoomEventsTests(TestCase):
+    def test_consumer_sends_each_event_in_order(self):
+        consumer = ChatConsumer()
+        consumer.send = mock.AsyncMock()
+        events = [
+            {'type': 'movie_started', 'message': 'Movie has started!', 'movie_title': 'Movie', 'started_at': None},
+            {'type': 'chat_message', 'message': 'Bot joined', 'username': 'Movie Bot', 'timestamp': 'now'},
+            # From a newer server: skipped, not an error
+            {'type': 'movie_rated', 'rating': 5},
+            {'type': 'movie_stopped', 'message': 'Movie has stopped!', 'movie_title': 'Movie', 'stopped_at': 'later'},
+        ]
+        asyncio.run(consumer.room_events({'type': 'room_events', 'events': events}))
+        sent = [json.loads(call.kwargs['text_data']) for call in consumer.send.await_args_list]
+        self.assertEqual(sent, [
+            {'type': 'movie_started', 'message': 'Movie has started!', 'movie_title': 'Movie', 'started_at': None},
+            {'message': 'Bot joined', 'username': 'Movie Bot'},
+            {'type': 'movie_stopped', 'message': 'Movie has stopped!', 'movie_title': 'Movie', 'stopped_at': 'later'},
+        ])
+
+    def test_queued_notify_tasks_forward_to_one_broadcast(self):
+        creator = get_user_model().objects.create_user(email='creator@example.com', password='x')
+        movie, = Movie.objects.bulk_create([Movie(title='Movie', movie_file='movies/movie.mp4', duration_minutes=90)])
+        room = Room.objects.create(
+            name='movie-night', creator=creator, movie=movie, meet_datetime=timezone.now(),
+            movie_start_time=timezone.now()
+        )
+        with mock.patch('meet.tasks.broadcast_room_events') as broadcast:
+            notify_movie_started(room.id)
+            notify_movie_bot_joined(room.id)
+            notify_movie_stopped(room.id)
+            # Deleted since the task was queued
+            notify_movie_stopped(uuid.uuid4())
+        self.assertEqual(
+            [(room_id, [event['type'] for event in events]) for (room_id, events), _ in broadcast.call_args_list],
+            [(room.id, ['movie_started']), (room.id, ['chat_message']), (room.id, ['movie_stopped'])]
+        )
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RoomViewSet, CreateInvitation, UserInvitationsList, GetLiveKitToken, AcceptInvitation
+from .views import RoomViewSet, CreateInvitation, UserInvitationsList, GetLiveKitToken, AcceptInvitation, LiveKitWebhook
 
 router = DefaultRouter()
 router.register(r'rooms', RoomViewSet)
@@ -11,4 +11,5 @@ urlpatterns = [
     path('my-invitations/', UserInvitationsList.as_view(), name='user_invitations'),
     path('invitations/<int:invitation_id>/accept/', AcceptInvitation.as_view(), name='accept_invitation'),
     path('get-token/', GetLiveKitToken.as_view(), name='get_livekit_token'),
+    path('livekit-webhook/', LiveKitWebhook.as_view(), name='livekit_webhook'),
 ]
\ No newline at end of file
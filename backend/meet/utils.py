@@ -1,15 +1,52 @@
 import os
+import json
 import time
+import bisect
 import asyncio
+import hashlib
+import importlib
 import logging
+import queue
+import threading
+import uuid
+import concurrent.futures
+from collections import namedtuple
+from urllib.parse import quote, unquote, urlparse
 import requests
 import jwt
 from livekit import api, rtc
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .livekit_client import livekit_call
 
 logger = logging.getLogger(__name__)
 
+# Default output size of the movie bot's video track, also used for the bot rendition
+BOT_VIDEO_WIDTH = 1280
+BOT_VIDEO_HEIGHT = 720
+BOT_MAX_FRAMERATE = 30
+
+# Quality tier -> (max width, max height, max bitrate at that size and 30 fps)
+QUALITY_TIERS = {
+    '1080p': (1920, 1080, 6_000_000),
+    '720p': (1280, 720, 3_000_000),
+    '480p': (854, 480, 1_500_000),
+    '360p': (640, 360, 800_000),
+}
+DEFAULT_QUALITY = '720p'
+# LiveKit participant identities of the movie bot and of ingress-published streams
+BOT_IDENTITY = "video-bot"
+INGRESS_IDENTITY = "movie-bot"
+
+# Bot audio is always published as 48kHz stereo s16, in fixed-length chunks
+AUDIO_SAMPLE_RATE = 48000
+AUDIO_CHANNELS = 2
+# LiveKit paces audio in 10 ms frames; 20 ms chunks halve the per-frame overhead
+AUDIO_CHUNK_MS = 20
+
 # ----------------------------
 # Token generation
 # ----------------------------
@@ -28,43 +65,83 @@ def generate_livekit_token(room_name=None):
     token = jwt.encode(payload, settings.LIVEKIT_API_SECRET, algorithm="HS256")
     return token
 
+
+def _canonical_room_id(room_id):
+    """The room id spelled one way, so no other spelling of it can dodge invalidation; ValueError if invalid"""
+    return uuid.UUID(str(room_id))
+
+
+def _token_version_key(room_id):
+    return f"livekit-token-version:{_canonical_room_id(room_id)}"
+
+
+def participant_token_cache_key(room_id, user_id, grants):
+    """
+    Cache key for a participant token issued for ``grants`` (a dict of VideoGrants fields).
+
+    Keys include a per-room version, so ``invalidate_participant_tokens`` drops
+    every token of a room at once.
+    """
+    room_id = _canonical_room_id(room_id)
+    # Seeded from the clock so a version evicted from the cache never comes back with old keys
+    version = cache.get_or_set(_token_version_key(room_id), time.time_ns(), None)
+    digest = hashlib.sha1(json.dumps(grants, sort_keys=True).encode()).hexdigest()[:16]
+    return f"livekit-token:{room_id}:{version}:{user_id}:{digest}"
+
+
+def invalidate_participant_tokens(room_id):
+    """Forget all cached participant tokens for a room"""
+    try:
+        cache.incr(_token_version_key(room_id))
+    except ValueError:
+        # No version yet, so nothing was cached under this room
+        pass
+    except Exception as e:
+        logger.error(f"Failed to invalidate LiveKit tokens for room {room_id}: {e}")
+
+# ----------------------------
+# Room websocket group
+# ----------------------------
+def room_group_name(room_id):
+    """Channel-layer group of a room's chat and event websockets"""
+    return f'chat_{str(room_id).replace("-", "_")[:50]}'
+
 # ----------------------------
 # LiveKit ingress management
 # ----------------------------
+# Ingress IDs recorded for rooms the movie bot streams into instead of a LiveKit ingress
+BOT_INGRESS_PREFIX = "bot-"
+
+
+def streams_through_bot(ingress_id):
+    """Whether a room with this ingress ID gets its movie from the bot rather than a LiveKit ingress"""
+    return not ingress_id or ingress_id.startswith(BOT_INGRESS_PREFIX)
+
+
 def create_livekit_ingress(room_name: str, input_url: str) -> dict:
     """
     Create a LiveKit ingress to stream a video into a room
     Returns ingress info including ingress ID
     """
     try:
-        # Use LiveKit API client instead of direct HTTP requests
-        from livekit import api
-        
-        # Create LiveKit API client
-        livekit_api = api.LiveKitAPI(
-            url=settings.LIVEKIT_URL,
-            api_key=settings.LIVEKIT_API_KEY,
-            api_secret=settings.LIVEKIT_API_SECRET
-        )
-        
         # Create ingress request
         ingress_info = api.CreateIngressRequest(
             input_type=api.IngressInput.URL_INPUT,
             name=f"Movie Stream - {room_name}",
             room_name=room_name,
-            participant_identity="movie-bot",
+            participant_identity=INGRESS_IDENTITY,
             participant_name="Movie Bot",
             url=input_url,
             video=api.IngressVideoOptions(
-                source=api.TrackSource.SOURCE_CAMERA,
+                source=api.TrackSource.CAMERA,
             ),
             audio=api.IngressAudioOptions(
-                source=api.TrackSource.SOURCE_MICROPHONE,
+                source=api.TrackSource.MICROPHONE,
             )
         )
         
-        # Create the ingress
-        ingress = livekit_api.ingress.create_ingress(ingress_info)
+        # Create the ingress over the shared, already-connected API client
+        ingress = livekit_call(lambda livekit_api: livekit_api.ingress.create_ingress(ingress_info))
         
         logger.info(f"Created LiveKit ingress: {ingress.ingress_id}")
         return {
@@ -79,7 +156,7 @@ def create_livekit_ingress(room_name: str, input_url: str) -> dict:
         # Fallback: just return a mock ingress for bot streaming
         logger.info("Fallback: Using direct bot streaming instead of ingress")
         return {
-            "ingress_id": f"bot-{room_name}-{int(time.time())}",
+            "ingress_id": f"{BOT_INGRESS_PREFIX}{room_name}-{int(time.time())}",
             "url": input_url,
             "stream_key": "",
             "status": "fallback"
@@ -91,21 +168,12 @@ def stop_livekit_ingress(ingress_id: str) -> dict:
     """
     try:
         # Check if it's a fallback bot ingress
-        if ingress_id and ingress_id.startswith("bot-"):
+        if ingress_id and ingress_id.startswith(BOT_INGRESS_PREFIX):
             logger.info(f"Fallback bot ingress {ingress_id} - no need to stop via API")
             return {"status": "fallback_stopped"}
         
-        # Use LiveKit API client for real ingress
-        from livekit import api
-        
-        livekit_api = api.LiveKitAPI(
-            url=settings.LIVEKIT_URL,
-            api_key=settings.LIVEKIT_API_KEY,
-            api_secret=settings.LIVEKIT_API_SECRET
-        )
-        
         # Delete the ingress
-        livekit_api.ingress.delete_ingress(api.DeleteIngressRequest(ingress_id=ingress_id))
+        livekit_call(lambda livekit_api: livekit_api.ingress.delete_ingress(api.DeleteIngressRequest(ingress_id=ingress_id)))
         logger.info(f"Successfully stopped LiveKit ingress {ingress_id}")
         return {"status": "stopped"}
 
@@ -114,16 +182,78 @@ def stop_livekit_ingress(ingress_id: str) -> dict:
         # For fallback, just log and continue
         return {"status": "error", "message": str(e)}
 
+def stop_livekit_ingresses(ingress_ids) -> dict:
+    """
+    Stop/delete several LiveKit ingresses concurrently
+    Returns a result like ``stop_livekit_ingress``'s for each ingress ID
+    """
+    results = {}
+    to_delete = []
+    for ingress_id in ingress_ids:
+        if ingress_id.startswith(BOT_INGRESS_PREFIX):
+            results[ingress_id] = {"status": "fallback_stopped"}
+        else:
+            to_delete.append(ingress_id)
+    if not to_delete:
+        return results
+
+    async def delete_all(livekit_api):
+        return await asyncio.gather(
+            *(livekit_api.ingress.delete_ingress(api.DeleteIngressRequest(ingress_id=ingress_id)) for ingress_id in to_delete),
+            return_exceptions=True
+        )
+
+    try:
+        outcomes = livekit_call(delete_all)
+    except Exception as e:
+        outcomes = [e] * len(to_delete)
+    for ingress_id, outcome in zip(to_delete, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to stop LiveKit ingress {ingress_id}: {str(outcome)}")
+            results[ingress_id] = {"status": "error", "message": str(outcome)}
+        else:
+            results[ingress_id] = {"status": "stopped"}
+    logger.info(f"Stopped {len(to_delete)} LiveKit ingresses")
+    return results
+
+def list_livekit_ingresses() -> dict:
+    """
+    Fetch every LiveKit ingress in one listing (following pages if the server splits it)
+    Returns ingress ID -> IngressInfo
+    """
+    async def list_all(livekit_api):
+        ingresses = {}
+        page_token = None
+        while True:
+            request = api.ListIngressRequest()
+            if page_token:
+                request.page_token.CopyFrom(page_token)
+            response = await livekit_api.ingress.list_ingress(request)
+            for info in response.items:
+                ingresses[info.ingress_id] = info
+            page_token = getattr(response, 'next_page_token', None)
+            if not page_token or not page_token.token:
+                return ingresses
+
+    return livekit_call(list_all)
+
 # ----------------------------
 # Async bot streamer
 # ----------------------------
-async def run_bot(room_name: str, video_file: str):
+def get_rtc_backend():
+    """The module the bot takes Room, sources and tracks from (BOT_RTC_BACKEND)"""
+    return importlib.import_module(settings.BOT_RTC_BACKEND)
+
+
+async def run_bot(room_name: str, video_file: str, max_quality: str = None, control=None):
     """
     Connects to a LiveKit room and streams a video file as a bot participant.
 
     Args:
         room_name (str): The name of the LiveKit room to join.
         video_file (str): The absolute path to the video file to stream.
+        max_quality (str): Highest quality tier to publish (see QUALITY_TIERS).
+        control (PlaybackControl): Pause/resume/seek requests for this session.
     """
     LIVEKIT_API_KEY = settings.LIVEKIT_API_KEY
     LIVEKIT_API_SECRET = settings.LIVEKIT_API_SECRET
@@ -131,7 +261,7 @@ async def run_bot(room_name: str, video_file: str):
 
     # Generate token for bot
     token = api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
-    token.with_identity("video-bot")
+    token.with_identity(BOT_IDENTITY)
     token.with_grants(api.VideoGrants(
         room_join=True,
         room=room_name,
@@ -139,7 +269,8 @@ async def run_bot(room_name: str, video_file: str):
     ))
 
     # Connect to room
-    room = rtc.Room()
+    backend = get_rtc_backend()
+    room = backend.Room()
     logger.info(f"Bot connecting to room: {room_name}")
     try:
         await room.connect(LIVEKIT_SERVER_URL, token.to_jwt())
@@ -148,19 +279,25 @@ async def run_bot(room_name: str, video_file: str):
         logger.error(f"Failed to connect bot: {e}")
         return
 
+    # Size the track from the source, capped by the room's quality tier
+    profile = await asyncio.to_thread(select_output_profile, video_file, max_quality)
+    logger.info(f"Bot output for room {room_name}: {profile.width}x{profile.height}@{profile.fps:g}fps, {profile.max_bitrate} bps")
+
     # Create video and audio sources
-    video_source = rtc.VideoSource(width=1280, height=720)
-    audio_source = rtc.AudioSource(sample_rate=48000, num_channels=2)
+    video_source = backend.VideoSource(width=profile.width, height=profile.height)
+    audio_source = backend.AudioSource(sample_rate=AUDIO_SAMPLE_RATE, num_channels=AUDIO_CHANNELS)
     
     # Create tracks
-    video_track = rtc.LocalVideoTrack.create_video_track("video-bot-track", video_source)
-    audio_track = rtc.LocalAudioTrack.create_audio_track("audio-bot-track", audio_source)
+    video_track = backend.LocalVideoTrack.create_video_track("video-bot-track", video_source)
+    audio_track = backend.LocalAudioTrack.create_audio_track("audio-bot-track", audio_source)
 
     # Publish tracks
     try:
+        # Simulcast lets LiveKit serve lower layers to constrained viewers
         video_options = rtc.TrackPublishOptions(
             source=rtc.TrackSource.SOURCE_CAMERA,
-            video_encoding=rtc.VideoEncoding(max_framerate=30, max_bitrate=5_000_000),
+            video_encoding=rtc.VideoEncoding(max_framerate=profile.fps, max_bitrate=profile.max_bitrate),
+            simulcast=True,
         )
         audio_options = rtc.TrackPublishOptions(
             source=rtc.TrackSource.SOURCE_MICROPHONE
@@ -175,194 +312,985 @@ async def run_bot(room_name: str, video_file: str):
         return
 
     # Stream video and audio
+    stats = StreamStats(room_name, movie_label(video_file))
+    active_streams[room_name] = stats
     try:
-        if video_file.endswith('.m3u8') or 'hls' in video_file:
-            logger.info(f"Streaming HLS content: {video_file}")
-            await stream_hls_content(video_source, audio_source, video_file)
+        if settings.BOT_FANOUT_TOLERANCE > 0:
+            await join_shared_playback(room_name, video_file, profile, video_source, audio_source, control=control)
         else:
-            logger.info(f"Streaming MP4 content: {video_file}")
-            await stream_mp4_content(video_source, audio_source, video_file)
+            await stream_media(video_source, audio_source, video_file, profile, stats=stats, control=control)
                 
     except asyncio.CancelledError:
         logger.info("Bot stream cancelled.")
     except Exception as e:
         logger.error(f"Error while streaming: {e}")
     finally:
+        active_streams.pop(room_name, None)
         await room.disconnect()
         logger.info("Bot disconnected.")
 
 
-async def stream_mp4_content(video_source, audio_source, video_file):
-    """Stream MP4 file content to LiveKit sources"""
+def movie_media_path(movie):
+    """
+    Local path of the file a movie streams from: its HLS playlist once converted, else the upload.
+
+    The file may not exist; raises SuspiciousFileOperation for a stored path
+    that resolves outside MEDIA_ROOT.
+    """
+    if not movie.hls_path:
+        return movie.movie_file.path
+    path = movie.hls_path
+    if not os.path.isfile(path):
+        # Stored relative to MEDIA_ROOT, or under the media folder of another checkout;
+        # the storage refuses (SuspiciousFileOperation) anything resolving outside MEDIA_ROOT
+        relative = path.split('media/', 1)[1] if 'media/' in path else path.lstrip('/')
+        path = default_storage.path(relative)
+    return path
+
+
+def media_url(path):
+    """URL a file under MEDIA_ROOT is served at (MEDIA_SERVE_URL), for consumers on other hosts"""
+    relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    return settings.MEDIA_SERVE_URL.rstrip('/') + '/' + quote(relative)
+
+
+def bot_media_input(path):
+    """What a bot is given to play ``path``: the path itself if it can read MEDIA_ROOT, else its URL"""
+    return path if settings.BOT_READ_LOCAL_MEDIA else media_url(path)
+
+
+def open_local_media(path):
+    """
+    Open a local movie file for decoding with large buffered reads.
+
+    Tells the kernel the file is read front to back, so it reads ahead
+    aggressively instead of paging it in a little at a time.
+    """
+    media = open(path, 'rb', buffering=settings.BOT_READ_BUFFER_SIZE)
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(media.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    return media
+
+
+def find_bot_rendition(video_file):
+    """
+    Local path of the pre-scaled bot rendition generated for a movie, if any.
+
+    ``video_file`` may be the movie's HLS playlist or source file, as a local
+    path or a URL under MEDIA_URL; the rendition sits in the HLS folder.
+    """
+    from movie.tasks import BOT_RENDITION_NAME
+
+    path = video_file
+    if '://' in path:
+        path = unquote(urlparse(path).path)
+        media_prefix = '/' + settings.MEDIA_URL.strip('/') + '/'
+        if not path.startswith(media_prefix):
+            return None
+        path = os.path.join(settings.MEDIA_ROOT, path[len(media_prefix):])
+
+    hls_folder = os.path.dirname(path) if path.endswith('.m3u8') else f"{path}_hls"
+    rendition = os.path.join(hls_folder, BOT_RENDITION_NAME)
+    return rendition if os.path.isfile(rendition) else None
+
+
+# A bot's video output format, chosen per source and room
+OutputProfile = namedtuple('OutputProfile', ['width', 'height', 'fps', 'max_bitrate'])
+
+DEFAULT_PROFILE = OutputProfile(BOT_VIDEO_WIDTH, BOT_VIDEO_HEIGHT, BOT_MAX_FRAMERATE, QUALITY_TIERS[DEFAULT_QUALITY][2])
+
+
+def choose_output_profile(source_width, source_height, source_fps, max_quality=None):
+    """
+    Pick the bot's output size, frame rate and bitrate for a source.
+
+    The source is scaled down to fit the quality tier, keeping its aspect
+    ratio, but never scaled up; the frame rate is the source's, capped at
+    BOT_MAX_FRAMERATE. The tier's bitrate is scaled by the pixel rate actually
+    sent, so small or low-rate sources don't get a full-size budget.
+    """
+    max_width, max_height, tier_bitrate = QUALITY_TIERS.get(max_quality, QUALITY_TIERS[DEFAULT_QUALITY])
+    scale = min(1.0, max_width / source_width, max_height / source_height)
+    # I420 needs even dimensions
+    width = max(2, int(source_width * scale) // 2 * 2)
+    height = max(2, int(source_height * scale) // 2 * 2)
+    fps = min(source_fps or BOT_MAX_FRAMERATE, BOT_MAX_FRAMERATE)
+
+    pixel_rate = width * height * fps
+    tier_pixel_rate = max_width * max_height * BOT_MAX_FRAMERATE
+    max_bitrate = int(tier_bitrate * min(1.0, pixel_rate / tier_pixel_rate))
+    return OutputProfile(width, height, fps, max_bitrate)
+
+
+def select_output_profile(video_file, max_quality=None):
+    """Probe ``video_file`` and choose its output profile; blocking, run it off the event loop"""
     import av
-    
+
     try:
-        # Open the video file
-        container = av.open(video_file)
-        video_stream = container.streams.video[0] if container.streams.video else None
-        audio_stream = container.streams.audio[0] if container.streams.audio else None
-        
-        if not video_stream:
-            logger.error("No video stream found in file")
-            return
-            
-        logger.info(f"Video stream info: {video_stream.width}x{video_stream.height}, codec: {video_stream.codec.name}")
-        logger.info(f"Video frame rate: {video_stream.average_rate}, time_base: {video_stream.time_base}")
-        
-        if audio_stream:
-            logger.info(f"Audio stream info: {audio_stream.sample_rate}Hz, {audio_stream.channels} channels, codec: {audio_stream.codec.name}")
-        
-        # Set target frame rate
-        target_fps = 30
-        frame_duration = 1.0 / target_fps
-        
-        frame_count = 0
-        start_time = asyncio.get_event_loop().time()
-        
-        for packet in container.demux():
-            if packet.stream == video_stream:
-                for frame in packet.decode():
+        with av.open(video_file) as container:
+            stream = container.streams.video[0]
+            return choose_output_profile(stream.width, stream.height, float(stream.average_rate or 0), max_quality)
+    except Exception as e:
+        logger.warning(f"Could not probe {video_file}, using default output profile: {e}")
+        if max_quality in QUALITY_TIERS:
+            return choose_output_profile(BOT_VIDEO_WIDTH, BOT_VIDEO_HEIGHT, BOT_MAX_FRAMERATE, max_quality)
+        return DEFAULT_PROFILE
+
+
+def select_hls_variant(playlist, height):
+    """
+    The smallest rendition of a local master playlist that is at least ``height`` tall.
+
+    Saves decoding (and downscaling) the top of the ladder when the bot sends
+    less. Falls back to the largest rendition, and returns anything that isn't
+    a readable master playlist unchanged.
+    """
+    if not os.path.isfile(playlist):
+        return playlist
+    variants = []
+    with open(playlist) as f:
+        lines = [line.strip() for line in f]
+    for line, uri in zip(lines, lines[1:]):
+        if line.startswith('#EXT-X-STREAM-INF:') and 'RESOLUTION=' in line:
+            resolution = line.split('RESOLUTION=', 1)[1].split(',', 1)[0]
+            variants.append((int(resolution.split('x')[1]), uri))
+    if not variants:
+        return playlist
+    fitting = [variant for variant in variants if variant[0] >= height]
+    _, uri = min(fitting) if fitting else max(variants)
+    return os.path.join(os.path.dirname(playlist), uri)
+
+
+async def stream_media(video_source, audio_source, video_file, profile=DEFAULT_PROFILE, stats=None, control=None):
+    """Stream an HLS playlist or a plain media file to LiveKit sources"""
+    # The bot rendition is only good enough if we don't need more pixels than it has
+    fits_rendition = profile.width <= BOT_VIDEO_WIDTH and profile.height <= BOT_VIDEO_HEIGHT
+    rendition = find_bot_rendition(video_file) if fits_rendition else None
+    if rendition:
+        # Already scaled for the bot, so playback only needs a cheap decode
+        logger.info(f"Streaming pre-scaled bot rendition: {rendition}")
+        await stream_mp4_content(video_source, audio_source, rendition, profile, stats=stats, control=control)
+    elif video_file.endswith('.m3u8') or 'hls' in video_file:
+        video_file = select_hls_variant(video_file, profile.height)
+        logger.info(f"Streaming HLS content: {video_file}")
+        await stream_hls_content(video_source, audio_source, video_file, profile, stats=stats, control=control)
+    else:
+        logger.info(f"Streaming MP4 content: {video_file}")
+        await stream_mp4_content(video_source, audio_source, video_file, profile, stats=stats, control=control)
+
+
+# ----------------------------
+# Shared decode fan-out
+# ----------------------------
+class FanOutVideoSource:
+    """Looks like one rtc.VideoSource but captures every frame into several"""
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def capture_frame(self, frame):
+        for source in list(self.sources.values()):
+            source.capture_frame(frame)
+
+
+class FanOutAudioSource:
+    """Looks like one rtc.AudioSource but captures every frame into several"""
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    async def capture_frame(self, frame):
+        await asyncio.gather(*(source.capture_frame(frame) for source in list(self.sources.values())))
+
+    def clear_queue(self):
+        for source in list(self.sources.values()):
+            source.clear_queue()
+
+
+# Shared playbacks running in this process, keyed by (video file, output profile)
+shared_playbacks = {}
+
+
+class SharedPlayback:
+    """
+    One decode of a movie, published to every room subscribed to it.
+
+    Rooms that ask for the same file and output profile within
+    ``BOT_FANOUT_TOLERANCE`` seconds of the playback starting join it at its
+    current position instead of decoding the file again. Playback stops once
+    the last room leaves.
+    """
+
+    def __init__(self, video_file, profile):
+        self.video_file = video_file
+        self.profile = profile
+        self.video_sources = {}
+        self.audio_sources = {}
+        self.stats = StreamStats(movie=movie_label(video_file))
+        self.control = PlaybackControl()
+        self.started_at = time.monotonic()
+        self.task = asyncio.create_task(self._run())
+
+    @property
+    def key(self):
+        return (self.video_file, self.profile)
+
+    @classmethod
+    def find_or_create(cls, video_file, profile):
+        for playback in shared_playbacks.get((video_file, profile), []):
+            if playback.accepts_subscribers():
+                return playback
+        playback = cls(video_file, profile)
+        shared_playbacks.setdefault(playback.key, []).append(playback)
+        return playback
+
+    def accepts_subscribers(self):
+        return (
+            not self.task.done()
+            and not self.control.paused
+            and time.monotonic() - self.started_at <= settings.BOT_FANOUT_TOLERANCE
+        )
+
+    def subscribe(self, room_name, video_source, audio_source):
+        self.video_sources[room_name] = video_source
+        self.audio_sources[room_name] = audio_source
+        logger.info(f"Room {room_name} joined shared playback of {self.video_file} ({len(self.video_sources)} rooms)")
+
+    def unsubscribe(self, room_name):
+        self.video_sources.pop(room_name, None)
+        self.audio_sources.pop(room_name, None)
+        if not self.video_sources:
+            self.task.cancel()
+
+    async def _run(self):
+        try:
+            await stream_media(
+                FanOutVideoSource(self.video_sources),
+                FanOutAudioSource(self.audio_sources),
+                self.video_file,
+                self.profile,
+                stats=self.stats,
+                control=self.control
+            )
+        finally:
+            playbacks = shared_playbacks.get(self.key, [])
+            if self in playbacks:
+                playbacks.remove(self)
+            if not playbacks:
+                shared_playbacks.pop(self.key, None)
+
+
+async def join_shared_playback(room_name, video_file, profile, video_source, audio_source, control=None):
+    """
+    Stream ``video_file`` into a room through a shared playback, until it ends or we are cancelled.
+
+    While the room is the playback's only subscriber, pause/resume/seek requests
+    are passed on to the playback. Otherwise the room leaves the group and
+    continues on its own playback from the current position, so it doesn't
+    pause or jump the movie for everyone else.
+    """
+    control = control or PlaybackControl()
+    playback = SharedPlayback.find_or_create(video_file, profile)
+    playback.subscribe(room_name, video_source, audio_source)
+    active_streams[room_name] = playback.stats
+    detached = False
+    try:
+        while not playback.task.done():
+            control.changed.clear()
+            changed = asyncio.create_task(control.changed.wait())
+            try:
+                # asyncio.wait doesn't cancel playback.task if this room is cancelled
+                await asyncio.wait({playback.task, changed}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                # ...nor the waiter, which would otherwise outlive the room
+                changed.cancel()
+            if not control.changed.is_set():
+                continue
+            if len(playback.video_sources) == 1:
+                control.forward_to(playback.control)
+            else:
+                detached = True
+                break
+    finally:
+        playback.unsubscribe(room_name)
+
+    if detached:
+        logger.info(f"Room {room_name} left shared playback of {video_file} to control it separately")
+        if control.seek_to is None:
+            control.seek(playback.stats.position)
+        stats = StreamStats(room_name, movie_label(video_file))
+        active_streams[room_name] = stats
+        await stream_media(video_source, audio_source, video_file, profile, stats=stats, control=control)
+
+
+# ----------------------------
+# Playback clock and stats
+# ----------------------------
+class PlaybackControl:
+    """
+    Pause, resume and seek requests for a running stream.
+
+    Set from outside (the supervisor worker or a shared playback) and polled by
+    the stream loop between frames; ``changed`` wakes anyone waiting for a
+    request.
+    """
+
+    def __init__(self):
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self.changed = asyncio.Event()
+        self.seek_to = None
+
+    @property
+    def paused(self):
+        return not self._resumed.is_set()
+
+    def pause(self):
+        self._resumed.clear()
+        self.changed.set()
+
+    def resume(self):
+        self._resumed.set()
+        self.changed.set()
+
+    def seek(self, position):
+        self.seek_to = max(0.0, float(position))
+        self.changed.set()
+
+    def take_seek(self):
+        """Return and clear the pending seek position, if any"""
+        position, self.seek_to = self.seek_to, None
+        return position
+
+    async def wait_resumed(self):
+        await self._resumed.wait()
+
+    def forward_to(self, other):
+        """Hand this control's current state and pending seek to another control"""
+        if self.paused:
+            other.pause()
+        else:
+            other.resume()
+        if self.seek_to is not None:
+            other.seek(self.take_seek())
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations in seconds, cheap enough to update every frame"""
+
+    # Upper bounds; one more bucket catches everything above the last
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def as_dict(self):
+        return {
+            "buckets": list(self.BUCKETS),
+            "counts": list(self.counts),
+            "sum": round(self.sum, 6),
+            "count": self.count,
+        }
+
+
+def movie_label(video_file):
+    """Short name of a movie for stats, e.g. the HLS folder or file name"""
+    path = urlparse(video_file).path or video_file
+    name = os.path.basename(path)
+    if name in ("master.m3u8", "movie.m3u8", "bot.mp4"):
+        # Conversion outputs are named alike; the folder tells movies apart
+        name = os.path.basename(os.path.dirname(path))
+    return name
+
+
+class StreamStats:
+    """Playback counters for one bot session, readable while it streams"""
+
+    def __init__(self, room_name=None, movie=None):
+        self.room_name = room_name
+        self.movie = movie
+        self.frames_decoded = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.audio_frames_sent = 0
+        self.queue_depth = 0
+        # Movie time (seconds) of the last published video frame
+        self.position = 0.0
+        # Seconds the last published frame was behind its scheduled time
+        self.video_drift = 0.0
+        self.audio_drift = 0.0
+        # Per-stage timings: demux+decode per packet, video scale/convert, and LiveKit capture
+        self.decode_time = LatencyHistogram()
+        self.reformat_time = LatencyHistogram()
+        self.capture_time = LatencyHistogram()
+
+    def as_dict(self):
+        return {
+            "room_name": self.room_name,
+            "movie": self.movie,
+            "frames_decoded": self.frames_decoded,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "audio_frames_sent": self.audio_frames_sent,
+            "queue_depth": self.queue_depth,
+            "position": round(self.position, 3),
+            "video_drift_ms": round(self.video_drift * 1000, 1),
+            "audio_drift_ms": round(self.audio_drift * 1000, 1),
+            "decode_seconds": self.decode_time.as_dict(),
+            "reformat_seconds": self.reformat_time.as_dict(),
+            "capture_seconds": self.capture_time.as_dict(),
+        }
+
+
+# Stats of every bot session running in this process, keyed by room name
+active_streams = {}
+
+
+def get_stream_stats(room_name=None):
+    """Return the stats of one running bot session, or of all of them"""
+    if room_name is not None:
+        stats = active_streams.get(room_name)
+        return stats.as_dict() if stats else None
+    return {name: stats.as_dict() for name, stats in list(active_streams.items())}
+
+
+class MediaClock:
+    """
+    Playback clock shared by the audio and video tracks of one stream.
+
+    The first timestamp seen is anchored to the current loop time, and every
+    later frame is due at ``anchor + (pts - first_pts)``, so playback runs at
+    the source's own rate whatever its frame rate is.
+    """
+
+    def __init__(self, loop=None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._anchor = None
+        self._origin = 0.0
+        self._paused_at = None
+
+    def pause(self):
+        if self._paused_at is None:
+            self._paused_at = self._loop.time()
+
+    def resume(self):
+        """Shift the schedule by the time spent paused"""
+        if self._paused_at is not None:
+            if self._anchor is not None:
+                self._anchor += self._loop.time() - self._paused_at
+            self._paused_at = None
+
+    def reset(self):
+        """Re-anchor on the next timestamp seen, e.g. after a seek"""
+        self._anchor = None
+
+    def lateness(self, pts):
+        """Seconds past the due time of ``pts``; negative if it is not due yet"""
+        now = self._loop.time()
+        if self._anchor is None:
+            self._anchor = now
+            self._origin = pts
+        return now - (self._anchor + pts - self._origin)
+
+
+# ----------------------------
+# Decode stage
+# ----------------------------
+class FrameBufferPool:
+    """
+    Fixed set of reusable I420 frame buffers shared by the decoder and publisher.
+
+    The decoder acquires a free buffer for every video frame and the publisher
+    releases it once LiveKit has copied the frame, so steady-state streaming
+    allocates no frame memory at all.
+    """
+
+    def __init__(self, width, height, count):
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3 // 2
+        self._free = queue.Queue()
+        for _ in range(count):
+            self._free.put(bytearray(self.frame_size))
+
+    def acquire(self, stop_event):
+        """Wait for a free buffer; None if ``stop_event`` is set first"""
+        while not stop_event.is_set():
+            try:
+                return self._free.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+
+    def release(self, buffer):
+        self._free.put(buffer)
+
+
+def copy_i420_planes(frame, buffer):
+    """Pack the Y, U and V planes of a yuv420p ``av.VideoFrame`` into ``buffer``"""
+    import numpy as np
+
+    out = np.frombuffer(buffer, dtype=np.uint8)
+    offset = 0
+    for plane in frame.planes:
+        size = plane.width * plane.height
+        if plane.line_size == plane.width:
+            out[offset:offset + size] = np.frombuffer(plane, dtype=np.uint8, count=size)
+        else:
+            # Drop the per-row padding FFmpeg adds for alignment
+            rows = np.frombuffer(plane, dtype=np.uint8).reshape(plane.height, plane.line_size)
+            out[offset:offset + size].reshape(plane.height, plane.width)[:] = rows[:, :plane.width]
+        offset += size
+
+
+class AudioChunker:
+    """
+    Cuts 48kHz stereo s16 PCM into fixed ``AUDIO_CHUNK_MS`` chunks.
+
+    Chunks are filled in a ring of preallocated buffers and handed out in
+    order, so a chunk stays valid until the ring comes back round to it;
+    ``slots`` must exceed the number of chunks alive at once: the queued ones,
+    the one being published, the one waiting to be queued and the one filling.
+    """
+
+    def __init__(self, slots, chunk_ms=AUDIO_CHUNK_MS):
+        self.samples = AUDIO_SAMPLE_RATE * chunk_ms // 1000
+        self.chunk_size = self.samples * AUDIO_CHANNELS * 2
+        self._ring = [bytearray(self.chunk_size) for _ in range(slots)]
+        self._slot = 0
+        self._fill = 0
+        self._pts = None
+
+    def reset(self):
+        """Drop any partial chunk and restart timestamps, e.g. after a seek"""
+        self._fill = 0
+        self._pts = None
+
+    def write(self, data, pts):
+        """
+        Append PCM starting at ``pts``, yielding ``(chunk, pts)`` for each chunk it completes.
+
+        A generator, so the next chunk isn't filled until the caller has dealt
+        with the last one; completed chunks never pile up outside the queue.
+        """
+        if self._pts is None:
+            self._pts = pts
+        data = memoryview(data)
+        while data:
+            count = min(len(data), self.chunk_size - self._fill)
+            self._ring[self._slot][self._fill:self._fill + count] = data[:count]
+            self._fill += count
+            data = data[count:]
+            if self._fill == self.chunk_size:
+                yield self._emit()
+
+    def flush(self):
+        """Pad the partial chunk with silence and return it; None if there is none"""
+        if not self._fill:
+            return None
+        self._ring[self._slot][self._fill:] = bytes(self.chunk_size - self._fill)
+        return self._emit()
+
+    def _emit(self):
+        chunk = (self._ring[self._slot], self._pts)
+        # Timestamps follow the sample count, so chunks are exactly contiguous
+        self._pts += self.samples / AUDIO_SAMPLE_RATE
+        self._slot = (self._slot + 1) % len(self._ring)
+        self._fill = 0
+        return chunk
+
+
+# A decoded frame ready to publish; ``pts`` is its presentation time in seconds
+DecodedFrame = namedtuple('DecodedFrame', ['kind', 'data', 'samples', 'pts'])
+
+
+class MediaDecoder:
+    """
+    Demuxes, decodes and reformats a media file in a worker thread.
+
+    Decoded frames are handed to the event loop through a bounded asyncio
+    queue. When the publisher falls behind the queue fills up and the worker
+    blocks, so decode never runs ahead by more than ``max_queue`` frames.
+
+    Video is scaled straight to I420 into pooled buffers; the publisher must
+    hand every video buffer back with ``release`` once it has been captured.
+    Audio goes through one persistent resampler and comes out as fixed-length
+    48kHz stereo chunks from an ``AudioChunker`` ring.
+
+    ``request_seek`` makes the worker seek the open container to the keyframe
+    at or before a position and queue a ``"seek"`` marker carrying the request
+    number; frames queued before the marker belong to the old position.
+    Timestamps are relative to the start of the movie.
+    """
+
+    def __init__(self, video_file, width, height, loop=None, max_queue=None, stats=None):
+        self.video_file = video_file
+        self.width = width
+        self.height = height
+        # Decode-side counters and timings are recorded here from the worker thread
+        self.stats = stats or StreamStats()
+        self.max_queue = max_queue or settings.BOT_DECODE_QUEUE_SIZE
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.max_depth = 0
+        # Every queued video frame holds a buffer, plus one being filled and one being published
+        self.buffers = FrameBufferPool(width, height, self.max_queue + 2)
+        # Audio chunks are reused in ring order instead of released: the queued ones, one being
+        # published, one waiting to be queued, one filling, and a spare for the publisher's
+        # previous chunk still being read by LiveKit (rtc.AudioFrame wraps it without copying)
+        self.audio_chunks = AudioChunker(self.max_queue + 4)
+        self._loop = loop or asyncio.get_running_loop()
+        self._stop_event = threading.Event()
+        self._seek_lock = threading.Lock()
+        self._seek_request = None
+        self.seek_count = 0
+        self._thread = threading.Thread(target=self._run, name=f"decoder-{os.path.basename(video_file)}", daemon=True)
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    async def get(self):
+        """Return the next DecodedFrame, or None at end of stream"""
+        item = await self.queue.get()
+        self.max_depth = max(self.max_depth, self.queue.qsize() + 1)
+        return item
+
+    def release(self, buffer):
+        """Return a video buffer to the pool once LiveKit has copied it"""
+        self.buffers.release(buffer)
+
+    def request_seek(self, position):
+        """Ask the worker to seek to ``position`` seconds; returns the request number"""
+        with self._seek_lock:
+            self.seek_count += 1
+            self._seek_request = (self.seek_count, position)
+            return self.seek_count
+
+    def _take_seek(self):
+        with self._seek_lock:
+            request, self._seek_request = self._seek_request, None
+            return request
+
+    def _put(self, item):
+        """Block the worker until the item is queued; False if the decoder was stopped"""
+        if self._loop.is_closed():
+            return False
+        put = self.queue.put(item)
+        try:
+            future = asyncio.run_coroutine_threadsafe(put, self._loop)
+        except RuntimeError:
+            # The event loop closed since the check; the coroutine will never run
+            put.close()
+            return False
+        while not self._stop_event.is_set():
+            try:
+                future.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                continue
+            except concurrent.futures.CancelledError:
+                # The event loop is shutting down
+                return False
+        future.cancel()
+        return False
+
+    def _new_resampler(self):
+        import av
+
+        return av.AudioResampler(format='s16', layout='stereo', rate=AUDIO_SAMPLE_RATE)
+
+    def _put_audio(self, resampled, pts):
+        """Chunk resampled frames and queue the chunks; False if the decoder was stopped"""
+        for audio_frame in resampled:
+            # Packed s16: the first plane holds all samples, possibly followed by padding
+            data = memoryview(audio_frame.planes[0])[:audio_frame.samples * AUDIO_CHANNELS * 2]
+            for chunk, chunk_pts in self.audio_chunks.write(data, pts):
+                if not self._put(DecodedFrame("audio", chunk, self.audio_chunks.samples, chunk_pts)):
+                    return False
+        return True
+
+    def _run(self):
+        import av
+        from av.video.reformatter import VideoReformatter
+
+        # Reusing one reformatter keeps the swscale context cached between frames
+        reformatter = VideoReformatter()
+        # Likewise one resampler per stream; it also carries leftover samples between frames
+        resampler = self._new_resampler()
+        container = None
+        media = None
+        try:
+            if os.path.isfile(self.video_file):
+                # Read the file ourselves in large chunks rather than through ffmpeg's 32 KiB buffer
+                media = open_local_media(self.video_file)
+                container = av.open(media, buffer_size=settings.BOT_READ_BUFFER_SIZE)
+            else:
+                container = av.open(self.video_file)
+            video_stream = container.streams.video[0] if container.streams.video else None
+            audio_stream = container.streams.audio[0] if container.streams.audio else None
+
+            if not video_stream:
+                logger.error("No video stream found in file")
+                return
+
+            logger.info(f"Video stream info: {video_stream.width}x{video_stream.height}, codec: {video_stream.codec_context.name}")
+            logger.info(f"Video frame rate: {video_stream.average_rate}, time_base: {video_stream.time_base}")
+            if audio_stream:
+                logger.info(f"Audio stream info: {audio_stream.sample_rate}Hz, {audio_stream.channels} channels, codec: {audio_stream.codec_context.name}")
+
+            # Used for frames the container leaves without a timestamp
+            frame_interval = 1.0 / float(video_stream.average_rate or 30)
+            last_video_pts = -frame_interval
+            # Timestamps are reported relative to the start of the movie
+            start_offset = (container.start_time or 0) / av.time_base
+
+            streams = [s for s in (video_stream, audio_stream) if s is not None]
+            for packet in container.demux(*streams):
+                seek = self._take_seek()
+                if seek is not None:
+                    seek_id, position = seek
+                    # Lands on the keyframe at or before the position; also flushes the decoders
+                    container.seek(int((position + start_offset) * av.time_base), backward=True)
+                    last_video_pts = position - frame_interval
+                    resampler = self._new_resampler()
+                    self.audio_chunks.reset()
+                    if not self._put(DecodedFrame("seek", seek_id, None, position)):
+                        return
+                    # This packet was read before the seek
+                    continue
+
+                decode_start = time.perf_counter()
+                frames = packet.decode()
+                self.stats.decode_time.observe(time.perf_counter() - decode_start)
+
+                for frame in frames:
                     try:
-                        # Reformat frame to target size and RGB24
-                        rgb_frame = frame.reformat(
-                            width=1280, 
-                            height=720, 
-                            format='rgb24'
-                        )
-                        
-                        # Convert to numpy array then to bytes
-                        import numpy as np
-                        frame_array = rgb_frame.to_ndarray()
-                        rgb_data = frame_array.tobytes()
-                        
-                        # Create VideoFrame for LiveKit (correct API)
-                        video_frame = rtc.VideoFrame(
-                            1280,
-                            720,
-                            rtc.VideoBufferType.RGB24,
-                            rgb_data
-                        )
-                        
-                        # Send the frame
-                        await video_source.capture_frame(video_frame)
-                        
-                        frame_count += 1
-                        
-                        # Calculate target time for this frame
-                        target_time = start_time + (frame_count * frame_duration)
-                        current_time = asyncio.get_event_loop().time()
-                        
-                        # Sleep if we're ahead of schedule
-                        if current_time < target_time:
-                            await asyncio.sleep(target_time - current_time)
-                        
-                        # Log progress every 100 frames
-                        if frame_count % 100 == 0:
-                            logger.info(f"Streamed {frame_count} frames")
-                            
+                        if packet.stream == video_stream:
+                            self.stats.frames_decoded += 1
+                            pts = frame.time - start_offset if frame.time is not None else last_video_pts + frame_interval
+                            last_video_pts = pts
+
+                            buffer = self.buffers.acquire(self._stop_event)
+                            if buffer is None:
+                                return
+                            # Scale to the target size in I420, which LiveKit encodes from directly
+                            reformat_start = time.perf_counter()
+                            yuv_frame = reformatter.reformat(
+                                frame,
+                                width=self.width,
+                                height=self.height,
+                                format='yuv420p'
+                            )
+                            copy_i420_planes(yuv_frame, buffer)
+                            self.stats.reformat_time.observe(time.perf_counter() - reformat_start)
+                            item = DecodedFrame("video", buffer, None, pts)
+                        else:
+                            pts = frame.time - start_offset if frame.time is not None else last_video_pts
+                            resampled = resampler.resample(frame)
                     except Exception as e:
-                        logger.error(f"Error processing video frame {frame_count}: {e}")
+                        logger.error(f"Error decoding {packet.stream.type} frame: {e}")
                         continue
-                        
-            elif packet.stream == audio_stream and audio_source:
-                for frame in packet.decode():
-                    try:
-                        # Reformat audio to 48kHz stereo
-                        audio_frame = frame.reformat(
-                            format='s16',
-                            layout='stereo', 
-                            rate=48000
-                        )
-                        
-                        # Convert to numpy array then to bytes
-                        import numpy as np
-                        audio_array = audio_frame.to_ndarray()
-                        audio_data = audio_array.tobytes()
-                        
-                        # Create AudioFrame for LiveKit (correct API)
-                        audio_livekit = rtc.AudioFrame(
-                            data=audio_data,
-                            sample_rate=48000,
-                            num_channels=2,
-                            samples_per_channel=audio_frame.samples
-                        )
-                        
-                        # Send audio
-                        await audio_source.capture_frame(audio_livekit)
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing audio frame: {e}")
+
+                    if packet.stream == video_stream:
+                        queued = self._put(item)
+                    else:
+                        queued = self._put_audio(resampled, pts)
+                    if not queued:
+                        return
+
+            # Drain the resampler and pad out the last chunk
+            if audio_stream and self._put_audio(resampler.resample(None), last_video_pts):
+                tail = self.audio_chunks.flush()
+                if tail:
+                    self._put(DecodedFrame("audio", tail[0], self.audio_chunks.samples, tail[1]))
+
+        except Exception as e:
+            logger.error(f"Error decoding {self.video_file}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+        finally:
+            if container is not None:
+                container.close()
+            if media is not None:
+                media.close()
+            # End of stream marker; skipped if the publisher is already gone
+            self._put(None)
+
+
+async def stream_mp4_content(video_source, audio_source, video_file, profile=DEFAULT_PROFILE, stats=None, control=None):
+    """Stream MP4 file content to LiveKit sources, paced by frame timestamps"""
+    stats = stats or StreamStats()
+    control = control or PlaybackControl()
+    decoder = MediaDecoder(video_file, profile.width, profile.height, stats=stats)
+    clock = MediaClock()
+    max_lateness = settings.BOT_MAX_VIDEO_LATENESS
+    # Frames are discarded until the decoder confirms this seek request
+    pending_seek = None
+
+    start_at = control.take_seek()
+    if start_at:
+        pending_seek = decoder.request_seek(start_at)
+    decoder.start()
+
+    try:
+        while True:
+            if control.seek_to is not None:
+                position = control.take_seek()
+                logger.info(f"Seeking to {position:.1f}s")
+                pending_seek = decoder.request_seek(position)
+                if audio_source:
+                    audio_source.clear_queue()
+            if control.paused:
+                # The decoder stalls on the full queue meanwhile, keeping the container open
+                clock.pause()
+                await control.wait_resumed()
+                clock.resume()
+                continue
+
+            item = await decoder.get()
+            if item is None:
+                break
+            stats.queue_depth = decoder.queue_depth
+
+            if pending_seek is not None:
+                if item.kind == "seek" and item.data == pending_seek:
+                    pending_seek = None
+                    clock.reset()
+                elif item.kind == "video":
+                    decoder.release(item.data)
+                continue
+
+            if item.kind == "video":
+                try:
+                    lateness = clock.lateness(item.pts)
+                    if lateness > max_lateness:
+                        # Too late to be worth showing; skip it so we catch up instead of lagging
+                        stats.frames_dropped += 1
                         continue
-        
-        logger.info(f"Finished streaming {frame_count} video frames")
-        
+                    if lateness < 0:
+                        await asyncio.sleep(-lateness)
+
+                    # Wrap the pooled I420 buffer without copying; capture_frame copies it into the SDK
+                    video_frame = rtc.VideoFrame(profile.width, profile.height, rtc.VideoBufferType.I420, item.data)
+                    capture_start = time.perf_counter()
+                    video_source.capture_frame(video_frame)
+                    stats.capture_time.observe(time.perf_counter() - capture_start)
+                    stats.frames_sent += 1
+                    stats.video_drift = max(lateness, 0.0)
+                    stats.position = item.pts
+
+                    # Log progress every 100 frames
+                    if stats.frames_sent % 100 == 0:
+                        logger.info(
+                            f"Streamed {stats.frames_sent} frames, dropped {stats.frames_dropped}, "
+                            f"drift {stats.video_drift * 1000:.0f}ms, "
+                            f"decode queue depth {decoder.queue_depth}/{decoder.max_queue}"
+                        )
+
+                except Exception as e:
+                    logger.error(f"Error processing video frame {stats.frames_sent}: {e}")
+                    continue
+                finally:
+                    decoder.release(item.data)
+
+            elif item.kind == "audio" and audio_source:
+                try:
+                    # Keep LiveKit's audio buffer a little ahead of the clock, but no further
+                    lateness = clock.lateness(item.pts - settings.BOT_AUDIO_LEAD)
+                    if lateness < 0:
+                        await asyncio.sleep(-lateness)
+
+                    audio_livekit = rtc.AudioFrame(
+                        data=item.data,
+                        sample_rate=AUDIO_SAMPLE_RATE,
+                        num_channels=AUDIO_CHANNELS,
+                        samples_per_channel=item.samples
+                    )
+                    await audio_source.capture_frame(audio_livekit)
+                    stats.audio_frames_sent += 1
+                    stats.audio_drift = max(lateness, 0.0)
+                except Exception as e:
+                    logger.error(f"Error processing audio frame: {e}")
+                    continue
+
+        logger.info(
+            f"Finished streaming {stats.frames_sent} video frames, dropped {stats.frames_dropped} "
+            f"(max decode queue depth {decoder.max_depth})"
+        )
+
     except Exception as e:
         logger.error(f"Error streaming MP4: {e}")
         import traceback
         logger.error(traceback.format_exc())
+    finally:
+        decoder.stop()
 
 
-async def stream_hls_content(video_source, audio_source, hls_url):
-    """Stream HLS content using asyncio subprocess"""
+def _open_pipe(size):
+    """Create an OS pipe, growing its kernel buffer to ``size`` bytes where supported"""
+    read_fd, write_fd = os.pipe()
     try:
-        # Use ffmpeg to read HLS and output raw video/audio
-        cmd = [
-            'ffmpeg',
-            '-i', hls_url,
-            '-f', 'rawvideo',
-            '-pix_fmt', 'rgb24',
-            '-s', '1280x720',
-            '-r', '30',
-            '-an',  # no audio for now, handle separately
-            'pipe:1'
-        ]
-        
-        logger.info(f"Starting ffmpeg for HLS: {' '.join(cmd)}")
-        
-        # Use asyncio subprocess
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        frame_size = 1280 * 720 * 3  # RGB24
-        frame_duration = 1.0 / 30.0  # 30 FPS
-        frame_count = 0
-        
-        while True:
-            try:
-                # Read frame data asynchronously
-                frame_data = await process.stdout.read(frame_size)
-                if len(frame_data) != frame_size:
-                    logger.info(f"End of stream or incomplete frame. Got {len(frame_data)} bytes, expected {frame_size}")
-                    break
-                    
-                # Create VideoFrame
-                video_frame = rtc.VideoFrame(
-                    1280,
-                    720,
-                    rtc.VideoBufferType.RGB24,
-                    frame_data
-                )
-                
-                await video_source.capture_frame(video_frame)
-                frame_count += 1
-                
-                # Log progress every 100 frames
-                if frame_count % 100 == 0:
-                    logger.info(f"Streamed {frame_count} HLS frames")
-                
-                await asyncio.sleep(frame_duration)
-                
-            except Exception as e:
-                logger.error(f"Error processing HLS frame {frame_count}: {e}")
-                break
-        
-        # Wait for process to complete
-        await process.wait()
-        logger.info(f"HLS streaming finished. Total frames: {frame_count}")
-            
+        import fcntl
+        fcntl.fcntl(read_fd, fcntl.F_SETPIPE_SZ, size)
+    except (ImportError, AttributeError, OSError) as e:
+        logger.debug(f"Could not resize pipe to {size} bytes: {e}")
+    return read_fd, write_fd
+
+
+async def _pipe_reader(read_fd, limit):
+    """Wrap the read end of a pipe in an asyncio StreamReader; returns ``(reader, transport)``"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=limit)
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, 'rb', 0))
+    return reader, transport
+
+
+def _has_audio_track(url):
+    """Whether a movie has an audio stream; an output mapping a missing one makes ffmpeg exit"""
+    import av
+
+    try:
+        with av.open(url) as container:
+            return bool(container.streams.audio)
+    except Exception as e:
+        logger.warning(f"Could not probe {url} for audio, playing it silent: {e}")
+        return False
+
+
+async def stream_hls_content(video_source, audio_source, hls_url, profile=DEFAULT_PROFILE, stats=None, control=None):
+    """
+    Stream HLS content through a single ffmpeg process.
+
+    ffmpeg writes raw I420 video to one pipe and 48kHz stereo PCM to another,
+    and both tracks are paced against one wall-clock MediaClock. A seek
+    restarts ffmpeg at the new position.
+    """
+    stats = stats or StreamStats()
+    control = control or PlaybackControl()
+    position = control.take_seek() or 0.0
+
+    try:
+        # No audio output (or pipe) at all without both a track to read and a source to publish to
+        with_audio = audio_source is not None and await asyncio.to_thread(_has_audio_track, hls_url)
+        while position is not None:
+            position = await _play_hls_from(
+                video_source, audio_source if with_audio else None, hls_url, profile, stats, control, position
+            )
+        logger.info(f"HLS streaming finished. Total frames: {stats.frames_sent}, dropped: {stats.frames_dropped}")
+
     except Exception as e:
         logger.error(f"Error streaming HLS: {e}")
         import traceback
@@ -370,3 +1298,169 @@ async def stream_hls_content(video_source, audio_source, hls_url):
         # Fallback: just keep the connection alive for 5 minutes
         logger.info("Falling back to keeping connection alive...")
         await asyncio.sleep(300)
+
+
+async def _play_hls_from(video_source, audio_source, hls_url, profile, stats, control, offset):
+    """
+    Play ``hls_url`` from ``offset`` seconds; returns the next seek position, or None at the end.
+
+    Audio is only read (and asked of ffmpeg) with an ``audio_source``, which
+    the movie must then have a track for.
+    """
+    fps = profile.fps
+    frame_size = profile.width * profile.height * 3 // 2  # I420
+    samples_per_chunk = AUDIO_SAMPLE_RATE * AUDIO_CHUNK_MS // 1000
+    chunk_size = samples_per_chunk * AUDIO_CHANNELS * 2  # s16
+    process = None
+    tasks = []
+    transports = []
+
+    try:
+        video_read_fd, video_write_fd = _open_pipe(settings.BOT_PIPE_BUFFER_SIZE)
+        write_fds = [video_write_fd]
+        if audio_source:
+            audio_read_fd, audio_write_fd = _open_pipe(settings.BOT_PIPE_BUFFER_SIZE)
+            write_fds.append(audio_write_fd)
+
+        cmd = [
+            'ffmpeg',
+            '-loglevel', 'error',
+            # Input seek: starts at the segment containing the position
+            '-ss', f'{offset:.3f}',
+            '-i', hls_url,
+            # Video: raw I420 at a fixed size and rate
+            '-map', '0:v:0',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'yuv420p',
+            '-s', f'{profile.width}x{profile.height}',
+            '-r', f'{fps:g}',
+            f'pipe:{video_write_fd}',
+        ]
+        if audio_source:
+            cmd += [
+                # Audio: raw 48kHz stereo s16le
+                '-map', '0:a:0',
+                '-f', 's16le',
+                '-ac', str(AUDIO_CHANNELS),
+                '-ar', str(AUDIO_SAMPLE_RATE),
+                f'pipe:{audio_write_fd}',
+            ]
+
+        logger.info(f"Starting ffmpeg for HLS: {' '.join(cmd)}")
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+                pass_fds=tuple(write_fds)
+            )
+        finally:
+            # Only ffmpeg writes to the pipes; closing our copies lets reads see EOF
+            for fd in write_fds:
+                os.close(fd)
+
+        video_reader, video_transport = await _pipe_reader(video_read_fd, frame_size * 2)
+        transports.append(video_transport)
+        if audio_source:
+            audio_reader, audio_transport = await _pipe_reader(audio_read_fd, chunk_size * 16)
+            transports.append(audio_transport)
+        clock = MediaClock()
+
+        async def wait_if_paused():
+            if control.paused:
+                clock.pause()
+                await control.wait_resumed()
+                clock.resume()
+
+        async def stream_video():
+            """Video drives the segment: returns the next seek position, or None at the end"""
+            frame_index = 0
+            while True:
+                if control.seek_to is not None:
+                    return control.take_seek()
+                await wait_if_paused()
+
+                try:
+                    frame_data = await video_reader.readexactly(frame_size)
+                except asyncio.IncompleteReadError as e:
+                    logger.info(f"End of HLS video stream. Got {len(e.partial)} trailing bytes")
+                    return None
+
+                pts = offset + frame_index / fps
+                frame_index += 1
+                # ffmpeg decodes and scales out of process; count what it hands us
+                stats.frames_decoded += 1
+                lateness = clock.lateness(pts)
+                if lateness > settings.BOT_MAX_VIDEO_LATENESS:
+                    stats.frames_dropped += 1
+                    continue
+                if lateness < 0:
+                    await asyncio.sleep(-lateness)
+
+                video_frame = rtc.VideoFrame(profile.width, profile.height, rtc.VideoBufferType.I420, frame_data)
+                capture_start = time.perf_counter()
+                video_source.capture_frame(video_frame)
+                stats.capture_time.observe(time.perf_counter() - capture_start)
+                stats.frames_sent += 1
+                stats.video_drift = max(lateness, 0.0)
+                stats.position = pts
+
+                # Log progress every 100 frames
+                if stats.frames_sent % 100 == 0:
+                    logger.info(f"Streamed {stats.frames_sent} HLS frames, dropped {stats.frames_dropped}")
+
+        async def stream_audio():
+            chunk_index = 0
+            while True:
+                await wait_if_paused()
+                try:
+                    chunk = await audio_reader.readexactly(chunk_size)
+                except asyncio.IncompleteReadError:
+                    return
+
+                pts = offset + chunk_index * AUDIO_CHUNK_MS / 1000
+                chunk_index += 1
+                lateness = clock.lateness(pts - settings.BOT_AUDIO_LEAD)
+                if lateness < 0:
+                    await asyncio.sleep(-lateness)
+
+                await audio_source.capture_frame(rtc.AudioFrame(
+                    data=chunk,
+                    sample_rate=AUDIO_SAMPLE_RATE,
+                    num_channels=AUDIO_CHANNELS,
+                    samples_per_channel=samples_per_chunk
+                ))
+                stats.audio_frames_sent += 1
+                stats.audio_drift = max(lateness, 0.0)
+
+        async def log_ffmpeg_errors():
+            async for line in process.stderr:
+                logger.warning(f"ffmpeg: {line.decode(errors='replace').rstrip()}")
+
+        video_task = asyncio.create_task(stream_video())
+        tasks = [video_task, asyncio.create_task(log_ffmpeg_errors())]
+        if audio_source:
+            tasks.append(asyncio.create_task(stream_audio()))
+        next_position = await video_task
+
+        if next_position is None:
+            # Let the audio tail and ffmpeg finish on their own
+            await asyncio.gather(*tasks)
+            await process.wait()
+        else:
+            logger.info(f"Seeking HLS stream to {next_position:.1f}s")
+            if audio_source:
+                audio_source.clear_queue()
+        return next_position
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+        # A restarted segment gets fresh pipes
+        for transport in transports:
+            transport.close()
@@ -1,6 +1,6 @@
 from rest_framework import viewsets, generics, status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
@@ -8,11 +8,15 @@ from datetime import timedelta
 from livekit import api
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 import asyncio
 import logging
+import uuid
 from .models import Room, Invitation
 from .serializers import RoomSerializer, InvitationSerializer
 from .tasks import start_movie_ingress, stop_movie_ingress
+from .supervisor import pause_bot_session, resume_bot_session, seek_bot_session
+from .utils import participant_token_cache_key, streams_through_bot, BOT_IDENTITY
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -44,9 +48,9 @@ class RoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if room.movie_started:
+        if room.stream_state != Room.STREAM_STOPPED:
             return Response(
-                {'error': 'Movie is already started'}, 
+                {'error': f'Movie is already {room.stream_state}'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -71,7 +75,7 @@ class RoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if not room.movie_started:
+        if room.stream_state not in (Room.STREAM_STARTING, Room.STREAM_STREAMING):
             return Response(
                 {'error': 'Movie is not currently started'}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -86,6 +90,88 @@ class RoomViewSet(viewsets.ModelViewSet):
             'movie_title': room.movie.title if room.movie else None
         })
     
+    def _playback_room(self, request, verb):
+        """Room for a playback command, or an error Response if the user may not send one"""
+        room = self.get_object()
+
+        # Check permissions - only room creator controls playback
+        if room.creator != request.user:
+            return room, Response(
+                {'error': f'Only the room creator can {verb} the movie'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if room.stream_state != Room.STREAM_STREAMING:
+            return room, Response(
+                {'error': 'Movie is not currently streaming'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # A LiveKit ingress plays the file straight through
+        if not streams_through_bot(room.ingress_id):
+            return room, Response(
+                {'error': 'Playback of a movie streamed through a LiveKit ingress can not be controlled'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return room, None
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def pause_movie(self, request, pk=None):
+        """Pause the movie playing in this room"""
+        room, error = self._playback_room(request, 'pause')
+        if error:
+            return error
+
+        pause_bot_session(room.id)
+        room.record_pause()
+
+        return Response({
+            'message': 'Movie paused',
+            'room_id': str(room.id)
+        })
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def resume_movie(self, request, pk=None):
+        """Resume the movie playing in this room"""
+        room, error = self._playback_room(request, 'resume')
+        if error:
+            return error
+
+        resume_bot_session(room.id)
+        room.record_resume()
+
+        return Response({
+            'message': 'Movie resumed',
+            'room_id': str(room.id)
+        })
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def seek_movie(self, request, pk=None):
+        """Jump the movie in this room to ``position`` seconds"""
+        room, error = self._playback_room(request, 'seek')
+        if error:
+            return error
+
+        try:
+            position = float(request.data.get('position'))
+        except (TypeError, ValueError):
+            position = -1
+        if not 0 <= position < float('inf'):
+            return Response(
+                {'error': 'position must be a number of seconds from the start of the movie'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        seek_bot_session(room.id, position)
+        room.record_seek(position)
+
+        return Response({
+            'message': 'Movie seeking',
+            'room_id': str(room.id),
+            'position': position
+        })
+
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def movie_status(self, request, pk=None):
         """Get current movie streaming status for this room"""
@@ -97,8 +183,13 @@ class RoomViewSet(viewsets.ModelViewSet):
             'has_movie': bool(room.movie),
             'movie_title': room.movie.title if room.movie else None,
             'movie_started': room.movie_started,
+            'stream_state': room.stream_state,
+            'ingress_status': room.ingress_status,
+            'bot_present': room.bot_present,
+            'livekit_updated_at': room.livekit_updated_at,
             'movie_start_time': room.movie_start_time,
             'movie_end_time': room.movie_end_time,
+            'paused_at': room.paused_at,
             'movie_url': room.movie_url,
             'ingress_id': room.ingress_id,
             'meet_datetime': room.meet_datetime,
@@ -160,11 +251,34 @@ class AcceptInvitation(generics.GenericAPIView):
 class GetLiveKitToken(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
 
+    # VideoGrants for room participants; part of the token cache key
+    PARTICIPANT_GRANTS = {
+        'room_join': True,
+        'can_publish': True,
+        'can_subscribe': True,
+    }
+
     def post(self, request, *args, **kwargs):
-        room_id = request.data.get('roomId')
+        try:
+            # Canonical form: cache keys built from any other spelling would escape invalidation
+            room_id = uuid.UUID(str(request.data.get('roomId')))
+        except ValueError:
+            return Response({'error': 'Invalid room id.'}, status=status.HTTP_400_BAD_REQUEST)
         participant_name = request.user.email
 
+        # Reconnects reuse the token already issued, without touching the database
+        try:
+            cache_key = participant_token_cache_key(room_id, request.user.pk, self.PARTICIPANT_GRANTS)
+            cached_token = cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"LiveKit token cache unavailable: {e}")
+            cache_key = cached_token = None
+        if cached_token:
+            return Response({'token': cached_token})
+
         room = get_object_or_404(Room, id=room_id)
+        # The token is only cached as long as the access it was issued for holds
+        access_expires_at = None
 
         # Check if user is the room creator or has a valid invitation
         if room.creator == request.user:
@@ -180,24 +294,96 @@ class GetLiveKitToken(generics.GenericAPIView):
                 )
                 # If invitation is not used yet, mark it as used
                 if not invitation.is_used:
-                    invitation.is_used = True
-                    invitation.save()
+                    # Update in place: saving would fire the token cache invalidation for this room
+                    Invitation.objects.filter(pk=invitation.pk).update(is_used=True)
+                access_expires_at = invitation.expires_at
             except Invitation.DoesNotExist:
                 return Response({'error': 'You do not have a valid invitation to this room.'},
                                 status=status.HTTP_403_FORBIDDEN)
 
         # Generate the LiveKit access token with specific grants
         grants = api.VideoGrants(
-            room_join=True,
             room=room.name,  # Use room.name for the LiveKit room name
-            can_publish=True,
-            can_subscribe=True,
+            **self.PARTICIPANT_GRANTS
         )
 
         token = api.AccessToken(settings.LIVEKIT_API_KEY, settings.LIVEKIT_API_SECRET)
         token.with_identity(participant_name)
         token.with_grants(grants)
+        token.with_ttl(timedelta(seconds=settings.LIVEKIT_TOKEN_TTL))
         
         jwt_token = token.to_jwt()
+
+        # Hand the token out again until it nears expiry
+        cache_timeout = settings.LIVEKIT_TOKEN_TTL - settings.LIVEKIT_TOKEN_REFRESH_MARGIN
+        if access_expires_at:
+            cache_timeout = min(cache_timeout, (access_expires_at - timezone.now()).total_seconds())
+        if cache_key and cache_timeout > 0:
+            try:
+                cache.set(cache_key, jwt_token, int(cache_timeout))
+            except Exception as e:
+                logger.warning(f"Failed to cache LiveKit token: {e}")
         
-        return Response({'token': jwt_token})
\ No newline at end of file
+        return Response({'token': jwt_token})
+
+
+class LiveKitWebhook(generics.GenericAPIView):
+    """
+    Receives LiveKit server webhooks and records what actually happened in each room.
+
+    Requests are authenticated by LiveKit's signed Authorization token, not by
+    a user session.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        receiver = api.WebhookReceiver(api.TokenVerifier(settings.LIVEKIT_API_KEY, settings.LIVEKIT_API_SECRET))
+        try:
+            event = receiver.receive(request.body.decode(), request.headers.get('Authorization', ''))
+        except Exception as e:
+            logger.warning(f"Rejected LiveKit webhook: {e}")
+            return Response({'error': 'Invalid webhook signature'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        handler = getattr(self, f'handle_{event.event}', None)
+        if handler:
+            handler(event)
+        return Response({'status': 'ok'})
+
+    def _active_rooms(self, room_name):
+        return Room.objects.filter(name=room_name, stream_state__in=[Room.STREAM_STARTING, Room.STREAM_STREAMING])
+
+    def _set_ingress_status(self, event):
+        info = event.ingress_info
+        status_name = api.IngressState.Status.Name(info.state.status)
+        Room.objects.filter(ingress_id=info.ingress_id).update(
+            ingress_status=status_name,
+            livekit_updated_at=timezone.now()
+        )
+        logger.info(f"Ingress {info.ingress_id} in room {info.room_name}: {status_name}")
+
+    def handle_ingress_started(self, event):
+        self._set_ingress_status(event)
+
+    def handle_ingress_ended(self, event):
+        self._set_ingress_status(event)
+
+    def handle_participant_joined(self, event):
+        if event.participant.identity == BOT_IDENTITY:
+            self._active_rooms(event.room.name).update(bot_present=True, livekit_updated_at=timezone.now())
+            logger.info(f"Movie bot joined room {event.room.name}")
+
+    def handle_participant_left(self, event):
+        if event.participant.identity != BOT_IDENTITY:
+            return
+        logger.info(f"Movie bot left room {event.room.name}")
+        # The bot leaves when the movie ends or its session dies; either way the stream is over
+        for room_id in self._active_rooms(event.room.name).filter(bot_present=True).values_list('id', flat=True):
+            stop_movie_ingress.delay(str(room_id))
+        Room.objects.filter(name=event.room.name).update(bot_present=False, livekit_updated_at=timezone.now())
+
+    def handle_room_finished(self, event):
+        logger.info(f"LiveKit room {event.room.name} finished")
+        for room_id in self._active_rooms(event.room.name).values_list('id', flat=True):
+            stop_movie_ingress.delay(str(room_id))
+        Room.objects.filter(name=event.room.name).update(bot_present=False, livekit_updated_at=timezone.now())
@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import Movie, MovieReview
+from .models import Movie, MovieMedia, MovieReview
 
 # Register your models here.
 
 class MovieAdmin(admin.ModelAdmin):
-    list_display = ['title', 'duration_minutes', 'release_year',  'created_at', 'is_active']
+    list_display = ['title', 'duration_minutes', 'release_year',  'created_at', 'is_active', 'conversion_status', 'conversion_progress']
     search_fields = ['title', 'description', 'genre']
-    list_filter = ['is_active', 'release_year', 'genre', 'conversion_status']
+    list_filter = ['is_active', 'release_year', 'genre', 'conversion_status', 'conversion_method']
     # raw_id_fields = ['uploaded_by']
 
 admin.site.register(Movie, MovieAdmin)
@@ -15,4 +15,11 @@ class MovieReviewAdmin(admin.ModelAdmin):
     search_fields = ['movie__title', 'user__email']
     list_filter = ['rating']
 
-admin.site.register(MovieReview, MovieReviewAdmin)
\ No newline at end of file
+admin.site.register(MovieReview, MovieReviewAdmin)
+
+class MovieMediaAdmin(admin.ModelAdmin):
+    list_display = ['file', 'content_hash', 'references', 'created_at']
+    search_fields = ['content_hash', 'file']
+    readonly_fields = ['content_hash', 'file', 'references', 'created_at']
+
+admin.site.register(MovieMedia, MovieMediaAdmin)
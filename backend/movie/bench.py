@@ -0,0 +1,53 @@
+"""Helpers shared by the benchmark management commands"""
+
+
+def write_synthetic_video(path, seconds, width=1280, height=720, fps=30):
+    """
+    Encode a test movie: a scrolling gradient with a moving box, and a tone.
+
+    The picture changes every frame, so decoding and scaling it cost roughly
+    what a real movie does.
+    """
+    import av
+    import numpy as np
+    from meet.utils import AUDIO_CHANNELS, AUDIO_SAMPLE_RATE
+
+    with av.open(path, 'w') as container:
+        codec = 'libx264' if 'libx264' in av.codecs_available else 'mpeg4'
+        video = container.add_stream(codec, rate=fps)
+        video.width = width
+        video.height = height
+        video.pix_fmt = 'yuv420p'
+        if codec == 'libx264':
+            video.options = {'preset': 'ultrafast'}
+        audio = container.add_stream('aac', rate=AUDIO_SAMPLE_RATE)
+        audio.layout = 'stereo' if AUDIO_CHANNELS == 2 else 'mono'
+
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        base = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)), (x + y) / 2], axis=-1).astype(np.uint8)
+        box = max(16, height // 6)
+
+        samples_per_frame = 1024
+        audio_pts = 0
+        for index in range(int(seconds * fps)):
+            picture = np.roll(base, index * 4, axis=1)
+            left = (index * 8) % (width - box)
+            top = (index * 5) % (height - box)
+            picture[top:top + box, left:left + box] = 255
+            frame = av.VideoFrame.from_ndarray(picture, format='rgb24')
+            frame.pts = index
+            container.mux(video.encode(frame))
+
+            # Keep audio level with the video so the file interleaves like a real one
+            while audio_pts < (index + 1) * AUDIO_SAMPLE_RATE / fps:
+                t = (audio_pts + np.arange(samples_per_frame)) / AUDIO_SAMPLE_RATE
+                tone = (0.2 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+                frame = av.AudioFrame.from_ndarray(np.tile(tone, (AUDIO_CHANNELS, 1)), format='fltp', layout=audio.layout)
+                frame.sample_rate = AUDIO_SAMPLE_RATE
+                frame.pts = audio_pts
+                container.mux(audio.encode(frame))
+                audio_pts += samples_per_frame
+
+        container.mux(video.encode())
+        container.mux(audio.encode())
@@ -0,0 +1,22 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from .progress import CONVERSION_PROGRESS_GROUP
+
+
+class ConversionProgressConsumer(AsyncWebsocketConsumer):
+    """Live progress of every movie conversion, for admins"""
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated or not user.is_staff:
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(CONVERSION_PROGRESS_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(CONVERSION_PROGRESS_GROUP, self.channel_name)
+
+    async def conversion_progress(self, event):
+        await self.send(text_data=json.dumps(event['data']))
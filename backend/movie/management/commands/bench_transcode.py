@@ -0,0 +1,73 @@
+import os
+import time
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from movie.bench import write_synthetic_video
+from movie.tasks import HLS_LADDER, HLS_SEGMENT_SECONDS, probe_movie, transcode_to_hls
+
+
+def read_playlist(path):
+    """(segment count, total seconds) of a media playlist"""
+    with open(path) as f:
+        durations = [float(line[8:].split(',')[0]) for line in f if line.startswith('#EXTINF:')]
+    return len(durations), sum(durations)
+
+
+class Command(BaseCommand):
+    help = "Time HLS conversion of a movie in one ffmpeg against the chunked, parallel pipeline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_file', nargs='?', help="Movie to convert; a synthetic one is generated if omitted")
+        parser.add_argument('--chunks', type=int, default=settings.MOVIE_TRANSCODE_CHUNKS, help="Pieces for the chunked run (defaults to MOVIE_TRANSCODE_CHUNKS)")
+        parser.add_argument('--min-chunk-seconds', type=int, default=HLS_SEGMENT_SECONDS, help="Shortest piece allowed, so short test movies still split")
+        parser.add_argument('--seconds', type=float, default=120.0, help="Length of the synthetic movie")
+        parser.add_argument('--width', type=int, default=1280, help="Width of the synthetic movie")
+        parser.add_argument('--height', type=int, default=720, help="Height of the synthetic movie")
+        parser.add_argument('--fps', type=int, default=30, help="Frame rate of the synthetic movie")
+
+    def handle(self, *args, **options):
+        if options['chunks'] < 2:
+            raise CommandError("--chunks must be at least 2 to compare against a single ffmpeg")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            video_file = options['video_file']
+            if not video_file:
+                video_file = os.path.join(tmp, 'synthetic.mp4')
+                self.stdout.write(f"Generating {options['seconds']:g}s synthetic movie {options['width']}x{options['height']}@{options['fps']}...")
+                write_synthetic_video(video_file, options['seconds'], options['width'], options['height'], options['fps'])
+            elif not os.path.isfile(video_file):
+                raise CommandError(f"No such file: {video_file}")
+
+            duration = probe_movie(video_file)[0]
+            with override_settings(MOVIE_TRANSCODE_MIN_CHUNK_SECONDS=options['min_chunk_seconds']):
+                single_folder = os.path.join(tmp, 'single')
+                started = time.monotonic()
+                transcode_to_hls(video_file, single_folder, chunks=1)
+                single_seconds = time.monotonic() - started
+
+                chunked_folder = os.path.join(tmp, 'chunked')
+                started = time.monotonic()
+                pieces = transcode_to_hls(video_file, chunked_folder, chunks=options['chunks'])
+                chunked_seconds = time.monotonic() - started
+
+            self.stdout.write(f"Movie length:        {duration:.1f} s")
+            self.stdout.write(f"Single ffmpeg:       {single_seconds:.1f} s ({duration / single_seconds:.2f}x realtime)")
+            self.stdout.write(f"Chunked ({pieces} pieces): {chunked_seconds:.1f} s ({duration / chunked_seconds:.2f}x realtime)")
+            self.stdout.write(f"Speedup:             {single_seconds / chunked_seconds:.2f}x on {os.cpu_count()} core(s)")
+
+            # The stitched ladder should match the single run segment for segment
+            for name, _, _, _ in HLS_LADDER:
+                single_playlist = os.path.join(single_folder, f"{name}.m3u8")
+                if not os.path.exists(single_playlist):
+                    continue
+                single = read_playlist(single_playlist)
+                chunked = read_playlist(os.path.join(chunked_folder, f"{name}.m3u8"))
+                style = self.style.SUCCESS if single[0] == chunked[0] and abs(single[1] - chunked[1]) < 0.5 else self.style.WARNING
+                self.stdout.write(style(
+                    f"{name}: {single[0]} segments / {single[1]:.2f} s single, "
+                    f"{chunked[0]} segments / {chunked[1]:.2f} s chunked"
+                ))
@@ -0,0 +1,172 @@
+import os
+import shutil
+import hashlib
+import logging
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Movie, MovieMedia
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# ----------------------------
+# Hashing uploads as they arrive
+# ----------------------------
+class ContentHashMixin:
+    """Upload handler mixin: SHA-256 of each file it stores, set on the file as ``content_hash``"""
+
+    def new_file(self, *args, **kwargs):
+        # Before super(): a handler taking the file raises StopFutureHandlers from new_file
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None:
+            # This handler kept the chunk, so it is the one producing the file
+            self.hasher.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class ContentHashMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class ContentHashTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def content_hash_upload_handlers(request):
+    """Django's default upload handlers, hashing what they receive"""
+    return [ContentHashMemoryFileUploadHandler(request), ContentHashTemporaryFileUploadHandler(request)]
+
+
+def hash_file(file):
+    """SHA-256 of a file, read in chunks; uses the hash computed during upload when there is one"""
+    content_hash = getattr(file, 'content_hash', None)
+    if content_hash:
+        return content_hash
+    hasher = hashlib.sha256()
+    for chunk in file.chunks(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+# ----------------------------
+# Sharing stored files between movies
+# ----------------------------
+def movies_sharing_media(movie_id):
+    """The movie and every other Movie using the same stored file (and so the same HLS output)"""
+    media_id = Movie.objects.filter(id=movie_id).values_list('media_id', flat=True).first()
+    if media_id is None:
+        return Movie.objects.filter(id=movie_id)
+    return Movie.objects.filter(media_id=media_id)
+
+
+def _claim(content_hash):
+    """Take a reference to the stored media with this hash; None if there is none"""
+    # The update waits for a concurrent release_media, so the media can't be deleted under us
+    if not MovieMedia.objects.filter(content_hash=content_hash).update(references=F('references') + 1):
+        return None
+    return MovieMedia.objects.get(content_hash=content_hash)
+
+
+def claim_stored_media(movie):
+    """
+    Before a new movie's upload is stored: point it at the stored copy if that content is already there.
+
+    The upload is then never written. Returns whether a stored copy was found.
+    """
+    content_hash = hash_file(movie.movie_file.file)
+    # For register_media, once the movie is saved
+    movie._content_hash = content_hash
+    media = _claim(content_hash)
+    if media is None:
+        return False
+    movie.media = media
+    movie.movie_file = media.file.name
+    logger.info(f"Upload of {movie.title} has the content of {media.file.name}, not storing it again")
+    return True
+
+
+def register_media(movie):
+    """After a new movie is saved with a file of its own: record it, or share an identical one found since"""
+    content_hash = getattr(movie, '_content_hash', None)
+    if content_hash is None:
+        # Created with a file already in storage (e.g. a bulk import)
+        content_hash = hash_file(movie.movie_file)
+        movie.movie_file.close()
+
+    while True:
+        try:
+            with transaction.atomic():
+                media = MovieMedia.objects.create(content_hash=content_hash, file=movie.movie_file.name, references=1)
+            break
+        except IntegrityError:
+            # The same content is stored already, e.g. uploaded at the same time
+            media = _claim(content_hash)
+            if media is None:
+                # ...and released again in between
+                continue
+            if media.file.name != movie.movie_file.name:
+                movie.movie_file.delete(save=False)
+                movie.movie_file = media.file.name
+            break
+
+    movie.media = media
+    Movie.objects.filter(id=movie.id).update(media=media, movie_file=movie.movie_file.name)
+
+
+def share_conversion(movie):
+    """
+    Give a movie the conversion of the movies it shares its file with.
+
+    Returns False when there is none, done or under way, and the movie has to
+    be converted itself.
+    """
+    others = Movie.objects.filter(media_id=movie.media_id).exclude(id=movie.id)
+    source = (
+        others.filter(conversion_status='completed').first()
+        or others.filter(conversion_status__in=['pending', 'processing']).first()
+    )
+    if source is None:
+        return False
+
+    # A conversion under way updates every movie sharing the file when it ends
+    fields = ['conversion_status', 'conversion_method', 'hls_path', 'conversion_progress', 'conversion_eta_seconds', 'conversion_updated_at']
+    for field in fields:
+        setattr(movie, field, getattr(source, field))
+    Movie.objects.filter(id=movie.id).update(**{field: getattr(source, field) for field in fields})
+    return True
+
+
+def release_media(movie):
+    """
+    Drop a deleted movie's reference to its stored file.
+
+    Once nothing uses the file, it and its HLS output are removed.
+    """
+    with transaction.atomic():
+        media = MovieMedia.objects.select_for_update().filter(id=movie.media_id).first()
+        if media is None:
+            return
+        if media.references > 1:
+            MovieMedia.objects.filter(id=media.id).update(references=F('references') - 1)
+            return
+
+        # Still holding the lock, so no new upload can claim the files being removed
+        if movie.hls_path:
+            shutil.rmtree(os.path.dirname(movie.hls_path), ignore_errors=True)
+        media.file.delete(save=False)
+        media.delete()
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0002_alter_moviereview_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='conversion_eta_seconds',
+            field=models.IntegerField(blank=True, help_text='Estimated seconds until the conversion finishes', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='conversion_fps',
+            field=models.FloatField(blank=True, help_text='Frames per second ffmpeg is converting at', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='conversion_progress',
+            field=models.FloatField(default=0.0, help_text='Percent of the movie converted'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='conversion_speed',
+            field=models.FloatField(blank=True, help_text='Conversion speed as a multiple of realtime', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='conversion_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
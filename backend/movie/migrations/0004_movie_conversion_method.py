@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0003_movie_conversion_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='conversion_method',
+            field=models.CharField(blank=True, choices=[('transcode', 'Re-encoded'), ('copy', 'Video and audio copied'), ('copy_video', 'Video copied, audio re-encoded'), ('copy_audio', 'Audio copied, video re-encoded')], max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0004_movie_conversion_method'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the file', max_length=64, unique=True)),
+                ('file', models.FileField(upload_to='movies/')),
+                ('references', models.PositiveIntegerField(default=0, help_text='Movies using this file and its HLS output')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='media',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movies', to='movie.moviemedia'),
+        ),
+    ]
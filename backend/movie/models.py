@@ -3,11 +3,23 @@ from django.utils import timezone
 from django.conf import settings
 import uuid
 # Create your models here.
+class MovieMedia(models.Model):
+    """An uploaded movie file, stored once however many movies are uploaded with the same content"""
+    content_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the file")
+    file = models.FileField(upload_to='movies/')
+    references = models.PositiveIntegerField(default=0, help_text="Movies using this file and its HLS output")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.file.name
+
 class Movie(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     movie_file = models.FileField(upload_to='movies/')
+    # Stored file shared with every movie uploaded with the same content (see movie.media)
+    media = models.ForeignKey(MovieMedia, on_delete=models.PROTECT, blank=True, null=True, editable=False, related_name='movies')
     thumbnail = models.ImageField(upload_to='movie_thumbnails/', blank=True, null=True)
     duration_minutes = models.IntegerField(help_text="Movie duration in minutes")
     genre = models.CharField(max_length=100, blank=True)
@@ -26,6 +38,24 @@ class Movie(models.Model):
         ],
         default='pending'
     )
+    # How the last conversion got the source into the HLS ladder
+    conversion_method = models.CharField(
+        max_length=20,
+        choices=[
+            ('transcode', 'Re-encoded'),
+            ('copy', 'Video and audio copied'),
+            ('copy_video', 'Video copied, audio re-encoded'),
+            ('copy_audio', 'Audio copied, video re-encoded')
+        ],
+        blank=True,
+        null=True
+    )
+    # Live progress of the conversion, updated every MOVIE_PROGRESS_INTERVAL seconds while processing
+    conversion_progress = models.FloatField(default=0.0, help_text="Percent of the movie converted")
+    conversion_fps = models.FloatField(blank=True, null=True, help_text="Frames per second ffmpeg is converting at")
+    conversion_speed = models.FloatField(blank=True, null=True, help_text="Conversion speed as a multiple of realtime")
+    conversion_eta_seconds = models.IntegerField(blank=True, null=True, help_text="Estimated seconds until the conversion finishes")
+    conversion_updated_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return self.title
@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Channel-layer group admins join for live conversion progress (see consumers.ConversionProgressConsumer)
+CONVERSION_PROGRESS_GROUP = "movie-conversions"
+
+
+def conversion_log_path(movie_id, part=None):
+    """File ffmpeg's log for a movie's conversion (or one piece of it) is written to"""
+    name = f"{movie_id}.log" if part is None else f"{movie_id}.part{part:03d}.log"
+    return os.path.join(settings.MOVIE_CONVERSION_LOG_DIR, name)
+
+
+def push_conversion_update(movie_id, **data):
+    """Send a movie's conversion state to the admins watching over the channel layer"""
+    from channels.layers import get_channel_layer
+    from asgiref.sync import async_to_sync
+
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            CONVERSION_PROGRESS_GROUP,
+            {'type': 'conversion.progress', 'data': {'movie_id': str(movie_id), **data}}
+        )
+    except Exception as e:
+        logger.warning(f"Could not push conversion progress for movie {movie_id}: {e}")
+
+
+class ConversionProgress:
+    """
+    ffmpeg progress of one movie's conversion, stored on the Movie and pushed to admins.
+
+    Each piece of a chunked conversion reports how far it got, possibly from
+    another Celery worker, so the latest report of every piece is kept in the
+    cache and summed into the movie's progress. Reports arrive twice a second
+    per ffmpeg; the database write and the push happen at most once every
+    MOVIE_PROGRESS_INTERVAL seconds per process.
+    """
+
+    def __init__(self, movie_id, duration, parts=1):
+        self.movie_id = str(movie_id)
+        self.duration = duration
+        self.parts = parts
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+
+    def _key(self, part):
+        return f"movie-conversion-progress:{self.movie_id}:{part}"
+
+    def clear(self):
+        """Forget earlier reports, before a new conversion starts"""
+        cache.delete_many([self._key(part) for part in range(self.parts)])
+
+    def reporter(self, part, length):
+        """Progress callback for the ffmpeg converting ``length`` seconds as piece ``part``"""
+        started = time.monotonic()
+
+        def report(seconds, fps, speed):
+            if seconds is None:
+                # Nothing output yet
+                return
+            done = min(max(seconds, 0.0), length)
+            # ffmpeg's own speed goes wild on pieces cut out of the middle (-copyts), so measure it here
+            elapsed = time.monotonic() - started
+            self.update(part, done, fps, done / elapsed if elapsed > 0 else speed)
+        return report
+
+    def update(self, part, done, fps, speed):
+        cache.set(self._key(part), (done, fps, speed), timeout=24 * 60 * 60)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_publish < settings.MOVIE_PROGRESS_INTERVAL:
+                return
+            self._last_publish = now
+        self.publish()
+
+    def publish(self):
+        from .media import movies_sharing_media
+
+        reports = cache.get_many([self._key(part) for part in range(self.parts)]).values()
+        done = sum(report[0] for report in reports)
+        # Pieces run side by side, so their rates add up
+        fps = sum(report[1] or 0.0 for report in reports)
+        speed = sum(report[2] or 0.0 for report in reports)
+        progress = min(100.0, 100.0 * done / self.duration) if self.duration else 0.0
+        eta = int((self.duration - done) / speed) if speed and self.duration else None
+
+        fields = {
+            'conversion_progress': round(progress, 1),
+            'conversion_fps': round(fps, 1),
+            'conversion_speed': round(speed, 2),
+            'conversion_eta_seconds': max(eta, 0) if eta is not None else None,
+        }
+        movies_sharing_media(self.movie_id).update(conversion_updated_at=timezone.now(), **fields)
+        push_conversion_update(self.movie_id, conversion_status='processing', **fields)
@@ -11,12 +11,17 @@ class MovieSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'movie_file', 'thumbnail', 
             'duration_minutes', 'genre', 'release_year', 
-            'created_at', 'is_active', 'conversion_status', 'hls_path'
+            'created_at', 'is_active', 'conversion_status', 'conversion_method', 'hls_path',
+            'conversion_progress', 'conversion_fps', 'conversion_speed',
+            'conversion_eta_seconds', 'conversion_updated_at'
+        ]
+        read_only_fields = [
+            'id',  'created_at', 'conversion_status', 'conversion_method', 'conversion_progress', 'conversion_fps',
+            'conversion_speed', 'conversion_eta_seconds', 'conversion_updated_at'
         ]
-        read_only_fields = ['id',  'created_at', 'conversion_status']
     
     def get_hls_path(self, obj):
-        """Convert absolute HLS path to relative media URL"""
+        """Media URL of the movie's HLS master playlist (every rendition of the ladder)"""
         if not obj.hls_path:
             return None
         
@@ -1,15 +1,26 @@
 # signals.py
 import os
-from django.db.models.signals import post_save,post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.db.models import Avg
 from .models import Movie, MovieReview
+from .media import claim_stored_media, register_media, share_conversion, release_media
 from .tasks import convert_movie_to_hls
 
+@receiver(pre_save, sender=Movie)
+def deduplicate_movie_file(sender, instance, **kwargs):
+    """Don't store a new movie's upload again if the same content is already stored"""
+    if instance._state.adding and instance.movie_file and not instance.movie_file._committed:
+        claim_stored_media(instance)
+
 @receiver(post_save, sender=Movie)
 def trigger_hls_conversion(sender, instance, created, **kwargs):
-    """Automatically trigger HLS conversion when a new movie is uploaded"""
+    """Automatically trigger HLS conversion when a new movie is uploaded, unless its file has one already"""
     if created and instance.movie_file:
+        if instance.media_id is None:
+            register_media(instance)
+        elif share_conversion(instance):
+            return
         # Call Celery task asynchronously to convert to HLS
         convert_movie_to_hls.delay(instance.id)
 
@@ -25,7 +36,10 @@ import shutil
 
 @receiver(post_delete, sender=Movie)
 def delete_hls_files(sender, instance, **kwargs):
-    if instance.hls_path:
+    if instance.media_id:
+        # Shared with other movies: removed with the last of them
+        release_media(instance)
+    elif instance.hls_path:
         hls_dir = os.path.dirname(instance.hls_path)
         if os.path.exists(hls_dir):
             shutil.rmtree(hls_dir, ignore_errors=True)
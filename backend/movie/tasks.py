@@ -1,43 +1,487 @@
-from celery import shared_task
+from celery import shared_task, chord
 from .models import Movie
+from .media import movies_sharing_media
+from .progress import ConversionProgress, conversion_log_path, push_conversion_update
 import os
+import math
+import time
+import tempfile
+import concurrent.futures
 from django.conf import settings
+from django.utils import timezone
 import subprocess
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Bot-ready rendition stored next to the HLS output (see meet.utils.find_bot_rendition)
+BOT_RENDITION_NAME = "bot.mp4"
+# Playlist listing every rendition of the ladder; Movie.hls_path points at it
+HLS_MASTER_PLAYLIST = "master.m3u8"
+HLS_SEGMENT_SECONDS = 10
+# Keyframes on segment boundaries, counted from the previous forced keyframe rather
+# than n_forced*10 from 0: with -copyts a part's t may count from its start (ffmpeg
+# does since 4.3) or from the movie's, and parts start on a boundary either way
+FORCE_SEGMENT_KEY_FRAMES = (
+    f"expr:if(isnan(prev_forced_t),1,gte(floor(t/{HLS_SEGMENT_SECONDS}),floor(prev_forced_t/{HLS_SEGMENT_SECONDS})+1))"
+)
+# Adaptive-bitrate ladder, largest first: (name, height, video bitrate, audio bitrate)
+HLS_LADDER = [
+    ('1080p', 1080, 5_000_000, 192_000),
+    ('720p', 720, 2_800_000, 128_000),
+    ('480p', 480, 1_400_000, 128_000),
+    ('360p', 360, 800_000, 96_000),
+]
+# A source track is copied into a rendition instead of re-encoded only up to this multiple of its bitrate
+HLS_COPY_MAX_BITRATE_RATIO = 1.5
+# H.264 profiles every HLS player decodes
+HLS_COPY_VIDEO_PROFILES = {'Constrained Baseline', 'Baseline', 'Main', 'High'}
+
+
+def probe_movie(movie_path):
+    """Duration in seconds, height of the first video stream, and whether there is any audio"""
+    import av
+
+    with av.open(movie_path) as container:
+        video = container.streams.video[0]
+        duration = container.duration / av.time_base if container.duration else 0.0
+        return duration, video.height, bool(container.streams.audio)
+
+
+def hls_ladder_for(source_height):
+    """Ladder renditions for a source, never scaling it up"""
+    rungs = [rung for rung in HLS_LADDER if rung[1] <= source_height]
+    if not rungs:
+        # Smaller than the lowest rung: one rendition at the source size
+        name, _, video_bitrate, audio_bitrate = HLS_LADDER[-1]
+        rungs = [(name, source_height - source_height % 2, video_bitrate, audio_bitrate)]
+    return rungs
+
+
+def _keyframes_on_segment_boundaries(container, video):
+    """Whether the video has a keyframe at every multiple of HLS_SEGMENT_SECONDS (reads packets, decodes nothing)"""
+    tolerance = 0.5 / float(video.average_rate or 25)
+    start = container.start_time / 1_000_000 if container.start_time else 0.0
+    boundary = 0.0
+    for packet in container.demux(video):
+        if not packet.is_keyframe or packet.pts is None:
+            continue
+        seconds = float(packet.pts * video.time_base) - start
+        if seconds > boundary + tolerance:
+            # Went past a boundary without a keyframe on it
+            return False
+        if seconds >= boundary - tolerance:
+            boundary += HLS_SEGMENT_SECONDS
+    return True
+
+
+def stream_copy_plan(movie_path, rungs):
+    """
+    Which source tracks can go into the HLS ladder as they are, without re-encoding.
+
+    The video is copied into the top rendition when it is 8-bit 4:2:0 H.264 in
+    a profile players decode, at that rendition's height and bitrate, with a
+    keyframe on every segment boundary so its segments line up with the
+    encoded renditions'. Mono or stereo AAC-LC audio is copied into every
+    rendition whose audio bitrate it fits. Returns (copy video, names of the
+    renditions copying the audio).
+    """
+    import av
+
+    with av.open(movie_path) as container:
+        video = container.streams.video[0]
+        audio = container.streams.audio[0] if container.streams.audio else None
+        name, height, video_bitrate, _ = rungs[0]
+
+        copy_audio = []
+        if (
+            audio is not None
+            and audio.codec_context.name == 'aac'
+            and audio.codec_context.profile == 'LC'
+            and audio.codec_context.channels <= 2
+            and audio.bit_rate
+        ):
+            copy_audio = [
+                rung_name for rung_name, _, _, audio_bitrate in rungs
+                if audio.bit_rate <= audio_bitrate * HLS_COPY_MAX_BITRATE_RATIO
+            ]
+
+        copy_video = (
+            video.codec_context.name == 'h264'
+            and video.codec_context.profile in HLS_COPY_VIDEO_PROFILES
+            and video.codec_context.pix_fmt == 'yuv420p'
+            and video.height == height
+            and bool(video.bit_rate)
+            and video.bit_rate <= video_bitrate * HLS_COPY_MAX_BITRATE_RATIO
+            # Last, it reads the whole file
+            and _keyframes_on_segment_boundaries(container, video)
+        )
+    logger.info(
+        f"Stream copy for {movie_path}: video {'into ' + name if copy_video else 'no'}, "
+        f"audio {'into ' + ', '.join(copy_audio) if copy_audio else 'no'}"
+    )
+    return copy_video, copy_audio
+
+
+def conversion_method(copy_video, copy_audio):
+    """Movie.conversion_method for a stream copy plan"""
+    if copy_video and copy_audio:
+        return 'copy'
+    if copy_video:
+        return 'copy_video'
+    if copy_audio:
+        return 'copy_audio'
+    return 'transcode'
+
+
+def plan_chunks(duration, chunks):
+    """
+    Split a movie into at most ``chunks`` (start, length) pieces to transcode separately.
+
+    Cuts fall on HLS segment boundaries, so the stitched playlists have the
+    same segments a single ffmpeg would have written. Pieces are at least
+    MOVIE_TRANSCODE_MIN_CHUNK_SECONDS long; the last one runs to the end of
+    the file (length None) so nothing is lost to a short probed duration.
+    """
+    chunks = min(chunks, int(duration // settings.MOVIE_TRANSCODE_MIN_CHUNK_SECONDS))
+    if chunks <= 1:
+        return [(0.0, None)]
+    segments = math.ceil(duration / HLS_SEGMENT_SECONDS)
+    chunk_seconds = math.ceil(segments / chunks) * HLS_SEGMENT_SECONDS
+    starts = range(0, int(duration), chunk_seconds)
+    return [(float(start), float(chunk_seconds)) for start in starts[:-1]] + [(float(starts[-1]), None)]
+
+
+def build_conversion_command(movie_path, hls_folder, bot_rendition, rungs, has_audio, start=0.0, length=None, part=None,
+                             copy_video=False, copy_audio=()):
+    """
+    ffmpeg command writing the HLS ladder, its master playlist and the bot rendition.
+
+    The source is decoded once and the picture split to one scaler and encoder
+    per output. Keyframes are forced on segment boundaries so every rendition
+    cuts at the same times and players can switch between them cleanly.
+
+    ``copy_video`` and ``copy_audio`` (see ``stream_copy_plan``) put the source
+    tracks into the top rendition, and the named ones, without re-encoding.
+
+    With ``part`` set, only ``length`` seconds from ``start`` are converted,
+    into part playlists for ``stitch_hls_parts``. Their segments are numbered
+    and timestamped where they fall in the whole movie.
+    """
+    from meet.utils import BOT_VIDEO_WIDTH, BOT_VIDEO_HEIGHT, BOT_MAX_FRAMERATE
+
+    scaled = rungs[1:] if copy_video else rungs
+    branches = len(scaled) + 1
+    filters = [f"[0:v]split={branches}" + "".join(f"[s{i}]" for i in range(branches))]
+    for branch, (name, height, _, _) in enumerate(scaled):
+        filters.append(f"[s{branch}]scale=w=-2:h={height}[{name}]")
+    filters.append(
+        f"[s{len(scaled)}]scale=w={BOT_VIDEO_WIDTH}:h={BOT_VIDEO_HEIGHT}"
+        ":force_original_aspect_ratio=decrease:force_divisible_by=2[bot]"
+    )
+
+    cmd = ["ffmpeg"]
+    if part is not None:
+        # Keep the source's timestamps, so the parts continue each other exactly when joined
+        cmd += ["-copyts"]
+    if start:
+        # Input seek: decodes from the keyframe before ``start`` and drops frames up to it
+        cmd += ["-ss", f"{start:.3f}"]
+    if length is not None:
+        cmd += ["-t", f"{length:.3f}"]
+    cmd += ["-i", movie_path, "-filter_complex", ";".join(filters)]
+
+    # HLS ladder: one video (and audio) stream per rendition
+    stream_map = []
+    for i, (name, _, video_bitrate, audio_bitrate) in enumerate(rungs):
+        if copy_video and i == 0:
+            cmd += ["-map", "0:v:0", f"-c:v:{i}", "copy"]
+        else:
+            cmd += [
+                "-map", f"[{name}]", f"-c:v:{i}", "h264", f"-pix_fmt:v:{i}", "yuv420p",
+                f"-force_key_frames:v:{i}", FORCE_SEGMENT_KEY_FRAMES,
+                f"-b:v:{i}", str(video_bitrate), f"-maxrate:v:{i}", str(int(video_bitrate * 1.07)), f"-bufsize:v:{i}", str(video_bitrate * 2),
+            ]
+        if has_audio:
+            cmd += ["-map", "0:a:0"]
+            if name in copy_audio:
+                cmd += [f"-c:a:{i}", "copy"]
+            else:
+                cmd += [f"-c:a:{i}", "aac", f"-ac:a:{i}", "2", f"-b:a:{i}", str(audio_bitrate)]
+            stream_map.append(f"v:{i},a:{i},name:{name}")
+        else:
+            stream_map.append(f"v:{i},name:{name}")
+    cmd += [
+        "-sc_threshold", "0",
+        "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_list_size", "0", "-hls_playlist_type", "vod",
+        "-hls_segment_filename", f"{hls_folder}/%v_%03d.ts",
+        "-var_stream_map", " ".join(stream_map),
+    ]
+    if part is None:
+        cmd += ["-master_pl_name", HLS_MASTER_PLAYLIST, f"{hls_folder}/%v.m3u8"]
+    else:
+        cmd += [
+            "-start_number", str(int(start // HLS_SEGMENT_SECONDS)),
+            # B-frames make the first part's DTS start below zero, and the muxer would shift that
+            # part alone to fix it; moving every part by the same second keeps them in step
+            "-output_ts_offset", "1",
+        ]
+        if part == 0:
+            # The variants' bandwidths and codecs are the same in every part
+            cmd += ["-master_pl_name", _part_name(HLS_MASTER_PLAYLIST, part)]
+        cmd += [f"{hls_folder}/%v.part{part:03d}.m3u8"]
+
+    # Bot rendition: already at the bot's output size, pixel format and frame rate
+    cmd += [
+        "-map", "[bot]", "-map", "0:a:0?",
+        "-pix_fmt", "yuv420p", "-fpsmax", str(BOT_MAX_FRAMERATE),
+        "-c:v", "h264", "-preset", "veryfast", "-tune", "fastdecode",
+        "-c:a", "aac", "-ar", "48000", "-ac", "2",
+        "-movflags", "+faststart",
+        "-f", "mp4", f"{bot_rendition}.part" if part is None else _part_name(bot_rendition, part),
+    ]
+    return cmd
+
+
+def _part_name(path, part):
+    """File one chunk writes in place of ``path``, e.g. master.part002.m3u8"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.part{part:03d}{ext}"
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # "N/A" until ffmpeg has output something
+        return None
+
+
+def _run_ffmpeg(cmd, log_path=None, on_progress=None):
+    """
+    Run ffmpeg with its log streamed to ``log_path`` (a temporary file if None), not held in memory.
+
+    ffmpeg's -progress reports are parsed as they arrive and passed on as
+    ``on_progress(seconds done, fps, speed)``.
+    """
+    cmd = [cmd[0], "-nostats", "-progress", "pipe:1", *cmd[1:]]
+    if log_path:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with (open(log_path, 'wb+') if log_path else tempfile.TemporaryFile()) as log:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=log, text=True)
+        report = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            report[key] = value.strip()
+            # Each report is a block of key=value lines ending with progress=continue|end;
+            # the final one has the speed of a clock that stopped, so it is left out
+            if key != 'progress':
+                continue
+            if on_progress and value.strip() == 'continue':
+                out_time_us = _number(report.get('out_time_us'))
+                try:
+                    on_progress(
+                        out_time_us / 1_000_000 if out_time_us is not None else None,
+                        _number(report.get('fps')),
+                        _number(report.get('speed', '').rstrip('x'))
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not record conversion progress: {e}")
+            report = {}
+
+        if process.wait() != 0:
+            # The end of the log has the error
+            log.seek(0, os.SEEK_END)
+            log.seek(max(0, log.tell() - 4096))
+            tail = log.read().decode(errors='replace')
+            logger.error(tail)
+            raise Exception(tail)
+
+
+def transcode_piece(movie_path, hls_folder, rungs, has_audio, start=0.0, length=None, part=None, progress=None,
+                    copy_video=False, copy_audio=()):
+    """Run the ffmpeg converting one piece of a movie (``part`` None: all of it), reporting to ``progress``"""
+    bot_rendition = os.path.join(hls_folder, BOT_RENDITION_NAME)
+    cmd = build_conversion_command(
+        movie_path, hls_folder, bot_rendition, rungs, has_audio, start, length, part, copy_video, copy_audio
+    )
+    if progress is None:
+        _run_ffmpeg(cmd)
+        return
+    if length is None:
+        length = progress.duration - start
+    _run_ffmpeg(cmd, conversion_log_path(progress.movie_id, part), progress.reporter(part or 0, length))
+    # Done, and no longer adding to the conversion's rate
+    progress.update(part or 0, length, None, None)
+
+
+def stitch_hls_parts(hls_folder, rungs, parts):
+    """
+    Join the part playlists and bot renditions of a chunked conversion.
+
+    Segments already carry the names and timestamps they have in the whole
+    movie, so each rendition's playlist is the parts' entries in order; the bot
+    rendition parts are concatenated without re-encoding.
+    """
+    for name, _, _, _ in rungs:
+        entries = []
+        for part in range(parts):
+            with open(os.path.join(hls_folder, f"{name}.part{part:03d}.m3u8")) as f:
+                lines = [line.strip() for line in f]
+            entries += [(float(line[8:].split(',')[0]), uri) for line, uri in zip(lines, lines[1:]) if line.startswith('#EXTINF:')]
+        playlist = os.path.join(hls_folder, f"{name}.m3u8")
+        with open(f"{playlist}.tmp", 'w') as f:
+            f.write("#EXTM3U\n#EXT-X-VERSION:3\n")
+            f.write(f"#EXT-X-TARGETDURATION:{math.ceil(max(duration for duration, _ in entries))}\n")
+            f.write("#EXT-X-MEDIA-SEQUENCE:0\n#EXT-X-PLAYLIST-TYPE:VOD\n")
+            for duration, uri in entries:
+                f.write(f"#EXTINF:{duration:.6f},\n{uri}\n")
+            f.write("#EXT-X-ENDLIST\n")
+        os.replace(f"{playlist}.tmp", playlist)
+
+    master = os.path.join(hls_folder, HLS_MASTER_PLAYLIST)
+    with open(_part_name(master, 0)) as f:
+        content = f.read().replace(".part000.m3u8", ".m3u8")
+    with open(f"{master}.tmp", 'w') as f:
+        f.write(content)
+    os.replace(f"{master}.tmp", master)
+
+    bot_rendition = os.path.join(hls_folder, BOT_RENDITION_NAME)
+    concat_list = os.path.join(hls_folder, "bot.parts.txt")
+    with open(concat_list, 'w') as f:
+        for part in range(parts):
+            f.write(f"file '{os.path.basename(_part_name(bot_rendition, part))}'\n")
+    _run_ffmpeg([
+        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_list,
+        "-c", "copy", "-movflags", "+faststart", "-f", "mp4", f"{bot_rendition}.part",
+    ])
+
+    os.remove(concat_list)
+    for part in range(parts):
+        os.remove(_part_name(bot_rendition, part))
+        for name, _, _, _ in rungs:
+            os.remove(os.path.join(hls_folder, f"{name}.part{part:03d}.m3u8"))
+    os.remove(_part_name(master, 0))
+
+
+def transcode_to_hls(movie_path, hls_folder, chunks=1, movie_id=None):
+    """
+    Convert a movie into ``hls_folder``: the HLS ladder, master playlist and bot rendition.
+
+    With ``chunks`` above one, the movie is cut into pieces transcoded by
+    concurrent ffmpeg processes and stitched back together. Source tracks that
+    are already HLS-ready are copied rather than re-encoded (see
+    ``stream_copy_plan``). With ``movie_id``, progress and the conversion
+    method are recorded on that Movie and ffmpeg logs go to
+    MOVIE_CONVERSION_LOG_DIR. Returns the number of pieces used.
+    """
+    os.makedirs(hls_folder, exist_ok=True)
+    bot_rendition = os.path.join(hls_folder, BOT_RENDITION_NAME)
+
+    duration, source_height, has_audio = probe_movie(movie_path)
+    rungs = hls_ladder_for(source_height)
+    copy_video, copy_audio = stream_copy_plan(movie_path, rungs)
+    pieces = plan_chunks(duration, chunks)
+    logger.info(f"Converting {movie_path} to HLS renditions {', '.join(rung[0] for rung in rungs)} in {len(pieces)} piece(s)")
+    progress = None
+    if movie_id is not None:
+        movies_sharing_media(movie_id).update(conversion_method=conversion_method(copy_video, copy_audio))
+        progress = ConversionProgress(movie_id, duration, len(pieces))
+        progress.clear()
+
+    if len(pieces) == 1:
+        # One decode feeds every HLS rendition and the bot rendition
+        transcode_piece(movie_path, hls_folder, rungs, has_audio, progress=progress, copy_video=copy_video, copy_audio=copy_audio)
+    else:
+        # ffmpeg does the work, so threads are enough to keep one process per piece busy
+        with concurrent.futures.ThreadPoolExecutor(len(pieces)) as pool:
+            futures = [
+                pool.submit(
+                    transcode_piece, movie_path, hls_folder, rungs, has_audio, start, length, part, progress,
+                    copy_video, copy_audio
+                )
+                for part, (start, length) in enumerate(pieces)
+            ]
+            for future in futures:
+                future.result()
+        stitch_hls_parts(hls_folder, rungs, len(pieces))
+
+    # Only expose the rendition once it is complete, the bot may be looking for it
+    os.replace(f"{bot_rendition}.part", bot_rendition)
+    return len(pieces)
+
+
+def _conversion_started(movie_id):
+    fields = {
+        'conversion_status': 'processing',
+        'conversion_method': None,
+        'conversion_progress': 0.0,
+        'conversion_fps': None,
+        'conversion_speed': None,
+        'conversion_eta_seconds': None,
+    }
+    movies_sharing_media(movie_id).update(conversion_updated_at=timezone.now(), **fields)
+    push_conversion_update(movie_id, **fields)
+
+
+def _conversion_finished(movie_id, hls_folder):
+    movies_sharing_media(movie_id).update(
+        hls_path=os.path.join(hls_folder, HLS_MASTER_PLAYLIST),
+        conversion_status='completed',
+        conversion_progress=100.0,
+        conversion_eta_seconds=0,
+        conversion_updated_at=timezone.now()
+    )
+    push_conversion_update(movie_id, conversion_status='completed', conversion_progress=100.0, conversion_eta_seconds=0)
+
+
+def _conversion_failed(movie_id):
+    movies_sharing_media(movie_id).update(
+        conversion_status='failed',
+        conversion_eta_seconds=None,
+        conversion_updated_at=timezone.now()
+    )
+    push_conversion_update(movie_id, conversion_status='failed')
+
+
 @shared_task
 def convert_movie_to_hls(movie_id):
     try:
         movie = Movie.objects.get(id=movie_id)
-        movie.conversion_status = 'processing'
-        movie.save(update_fields=['conversion_status'])
+        _conversion_started(movie.id)
 
         if not movie.movie_file:
-            movie.conversion_status = 'failed'
-            movie.save(update_fields=['conversion_status'])
+            _conversion_failed(movie.id)
             return "No movie file"
 
         movie_path = movie.movie_file.path
         hls_folder = f"{movie_path}_hls"
-        os.makedirs(hls_folder, exist_ok=True)
-
-        result = subprocess.run([
-            "ffmpeg", "-i", movie_path,
-            "-c:v", "h264", "-c:a", "aac",
-            "-f", "hls", "-hls_time", "10",
-            "-hls_list_size", "0",
-            f"{hls_folder}/movie.m3u8"
-        ], capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(result.stderr)
-            raise Exception(result.stderr)
-
-        movie.hls_path = f"{hls_folder}/movie.m3u8"
-        movie.conversion_status = 'completed'
-        movie.save(update_fields=['hls_path', 'conversion_status'])
+
+        if settings.MOVIE_TRANSCODE_DISTRIBUTED:
+            duration, source_height, has_audio = probe_movie(movie_path)
+            pieces = plan_chunks(duration, settings.MOVIE_TRANSCODE_CHUNKS)
+            if len(pieces) > 1:
+                os.makedirs(hls_folder, exist_ok=True)
+                rungs = hls_ladder_for(source_height)
+                copy_video, copy_audio = stream_copy_plan(movie_path, rungs)
+                movies_sharing_media(movie.id).update(conversion_method=conversion_method(copy_video, copy_audio))
+                ConversionProgress(movie.id, duration, len(pieces)).clear()
+                chord(
+                    transcode_movie_chunk.s(
+                        str(movie.id), movie_path, hls_folder, rungs, has_audio, start, length, part, duration, len(pieces),
+                        copy_video, copy_audio
+                    )
+                    for part, (start, length) in enumerate(pieces)
+                )(
+                    stitch_movie_chunks.s(str(movie.id), hls_folder, rungs, len(pieces)).on_error(
+                        mark_conversion_failed.si(str(movie.id))
+                    )
+                )
+                return f"HLS conversion queued in {len(pieces)} chunks"
+
+        transcode_to_hls(movie_path, hls_folder, settings.MOVIE_TRANSCODE_CHUNKS, movie_id=movie.id)
+        _conversion_finished(movie.id, hls_folder)
         return "HLS conversion done"
 
     except Movie.DoesNotExist:
@@ -45,10 +489,38 @@ def convert_movie_to_hls(movie_id):
     except Exception as e:
         logger.error(f"HLS conversion failed: {str(e)}")
         try:
-            movie = Movie.objects.get(id=movie_id)
-            movie.conversion_status = 'failed'
-            movie.save(update_fields=['conversion_status'])
+            _conversion_failed(movie_id)
         except:
             pass
         return f"Conversion failed: {str(e)}"
 
+
+# ----------------------------
+# Chunked conversion across Celery workers (MOVIE_TRANSCODE_DISTRIBUTED)
+# ----------------------------
+# The chord waits on these results; other tasks' results are not stored (CELERY_TASK_IGNORE_RESULT)
+@shared_task(ignore_result=False)
+def transcode_movie_chunk(movie_id, movie_path, hls_folder, rungs, has_audio, start, length, part, duration, parts,
+                          copy_video=False, copy_audio=()):
+    """Transcode one piece of a movie; every worker needs the same MEDIA_ROOT"""
+    started = time.monotonic()
+    progress = ConversionProgress(movie_id, duration, parts)
+    transcode_piece(movie_path, hls_folder, rungs, has_audio, start, length, part, progress, copy_video, copy_audio)
+    logger.info(f"Transcoded part {part} of {movie_path} in {time.monotonic() - started:.1f}s")
+    return part
+
+
+@shared_task
+def stitch_movie_chunks(parts_done, movie_id, hls_folder, rungs, parts):
+    """Chord callback: join the transcoded pieces and publish the conversion"""
+    stitch_hls_parts(hls_folder, rungs, parts)
+    bot_rendition = os.path.join(hls_folder, BOT_RENDITION_NAME)
+    os.replace(f"{bot_rendition}.part", bot_rendition)
+    _conversion_finished(movie_id, hls_folder)
+    return "HLS conversion done"
+
+
+@shared_task
+def mark_conversion_failed(movie_id):
+    logger.error(f"Chunked HLS conversion failed for movie {movie_id}")
+    _conversion_failed(movie_id)
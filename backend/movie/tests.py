@@ -1,3 +1,470 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from fractions import Fraction
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .models import Movie, MovieMedia
+from .progress import ConversionProgress
+from .tasks import (
+    FORCE_SEGMENT_KEY_FRAMES, HLS_LADDER, HLS_MASTER_PLAYLIST, HLS_SEGMENT_SECONDS, _run_ffmpeg, build_conversion_command,
+    hls_ladder_for, plan_chunks, stitch_hls_parts, stream_copy_plan,
+)
+
+
+@override_settings(MOVIE_TRANSCODE_MIN_CHUNK_SECONDS=120)
+class HlsLadderTests(SimpleTestCase):
+    def test_never_scales_up(self):
+        cases = [
+            (2160, ['1080p', '720p', '480p', '360p']),
+            (1080, ['1080p', '720p', '480p', '360p']),
+            (1079, ['720p', '480p', '360p']),
+            (720, ['720p', '480p', '360p']),
+            (480, ['480p', '360p']),
+            (360, ['360p']),
+        ]
+        for source_height, names in cases:
+            with self.subTest(source_height):
+                rungs = hls_ladder_for(source_height)
+                self.assertEqual([rung[0] for rung in rungs], names)
+                self.assertEqual(rungs, [rung for rung in HLS_LADDER if rung[0] in names])
+
+    def test_small_source_keeps_its_size(self):
+        self.assertEqual(hls_ladder_for(240), [('360p', 240, 800_000, 96_000)])
+        # Rounded down to an even height for 4:2:0
+        self.assertEqual(hls_ladder_for(181), [('360p', 180, 800_000, 96_000)])
+
+
+def option(cmd, flag):
+    """Value following ``flag`` in an ffmpeg command"""
+    return cmd[cmd.index(flag) + 1]
+
+
+class BuildConversionCommandTests(SimpleTestCase):
+    rungs = HLS_LADDER[1:]
+
+    def build(self, **kwargs):
+        kwargs.setdefault('has_audio', True)
+        return build_conversion_command('/movies/in.mp4', '/hls/1', '/hls/1/bot.mp4', self.rungs, **kwargs)
+
+    def test_whole_movie(self):
+        cmd = self.build()
+        self.assertEqual(cmd[:3], ['ffmpeg', '-i', '/movies/in.mp4'])
+        filters = option(cmd, '-filter_complex').split(';')
+        self.assertEqual(filters[0], '[0:v]split=4[s0][s1][s2][s3]')
+        self.assertEqual(
+            filters[1:4],
+            ['[s0]scale=w=-2:h=720[720p]', '[s1]scale=w=-2:h=480[480p]', '[s2]scale=w=-2:h=360[360p]']
+        )
+        self.assertTrue(filters[4].startswith('[s3]scale=') and filters[4].endswith('[bot]'))
+        for i, (name, _, video_bitrate, audio_bitrate) in enumerate(self.rungs):
+            with self.subTest(name):
+                self.assertIn(f'[{name}]', cmd)
+                self.assertEqual(option(cmd, f'-c:v:{i}'), 'h264')
+                self.assertEqual(option(cmd, f'-force_key_frames:v:{i}'), FORCE_SEGMENT_KEY_FRAMES)
+                self.assertEqual(option(cmd, f'-b:v:{i}'), str(video_bitrate))
+                self.assertEqual(option(cmd, f'-c:a:{i}'), 'aac')
+                self.assertEqual(option(cmd, f'-b:a:{i}'), str(audio_bitrate))
+        self.assertEqual(option(cmd, '-hls_time'), str(HLS_SEGMENT_SECONDS))
+        self.assertEqual(option(cmd, '-hls_segment_filename'), '/hls/1/%v_%03d.ts')
+        self.assertEqual(option(cmd, '-var_stream_map'), 'v:0,a:0,name:720p v:1,a:1,name:480p v:2,a:2,name:360p')
+        self.assertEqual(option(cmd, '-master_pl_name'), HLS_MASTER_PLAYLIST)
+        self.assertIn('/hls/1/%v.m3u8', cmd)
+        self.assertNotIn('-copyts', cmd)
+        self.assertNotIn('-start_number', cmd)
+        # Written aside, renamed into place once complete
+        self.assertEqual(cmd[-1], '/hls/1/bot.mp4.part')
+
+    def test_without_audio(self):
+        cmd = self.build(has_audio=False)
+        self.assertNotIn('0:a:0', cmd)
+        self.assertNotIn('-c:a:0', cmd)
+        self.assertEqual(option(cmd, '-var_stream_map'), 'v:0,name:720p v:1,name:480p v:2,name:360p')
+        # The bot rendition maps audio only if there is some
+        self.assertIn('0:a:0?', cmd)
+
+    def test_stream_copy(self):
+        cmd = self.build(copy_video=True, copy_audio=['720p', '480p'])
+        filters = option(cmd, '-filter_complex').split(';')
+        # The top rendition is not scaled
+        self.assertEqual(filters[0], '[0:v]split=3[s0][s1][s2]')
+        self.assertNotIn('[720p]', cmd)
+        self.assertEqual(cmd[cmd.index('-c:v:0') - 1], '0:v:0')
+        self.assertEqual(option(cmd, '-c:v:0'), 'copy')
+        self.assertNotIn('-force_key_frames:v:0', cmd)
+        self.assertEqual(option(cmd, '-c:v:1'), 'h264')
+        self.assertEqual(option(cmd, '-c:a:0'), 'copy')
+        self.assertEqual(option(cmd, '-c:a:1'), 'copy')
+        self.assertEqual(option(cmd, '-c:a:2'), 'aac')
+
+    def test_parts(self):
+        first = self.build(start=0.0, length=910.0, part=0)
+        self.assertEqual(first[:6], ['ffmpeg', '-copyts', '-t', '910.000', '-i', '/movies/in.mp4'])
+        self.assertEqual(option(first, '-start_number'), '0')
+        self.assertEqual(option(first, '-master_pl_name'), 'master.part000.m3u8')
+        self.assertIn('/hls/1/%v.part000.m3u8', first)
+        self.assertEqual(first[-1], '/hls/1/bot.part000.mp4')
+
+        last = self.build(start=1820.0, part=2)
+        self.assertEqual(last[:5], ['ffmpeg', '-copyts', '-ss', '1820.000', '-i'])
+        self.assertNotIn('-t', last)
+        self.assertEqual(option(last, '-start_number'), '182')
+        # Only the first part writes a master playlist
+        self.assertNotIn('-master_pl_name', last)
+        self.assertIn('/hls/1/%v.part002.m3u8', last)
+        self.assertEqual(last[-1], '/hls/1/bot.part002.mp4')
+
+
+class PlanChunksTests(SimpleTestCase):
+    def test_short_movie_is_one_piece(self):
+        self.assertEqual(plan_chunks(200, 4), [(0.0, None)])
+        self.assertEqual(plan_chunks(3600, 1), [(0.0, None)])
+
+    def test_pieces_cut_on_segment_boundaries(self):
+        pieces = plan_chunks(3605, 4)
+        self.assertEqual(pieces, [(0.0, 910.0), (910.0, 910.0), (1820.0, 910.0), (2730.0, None)])
+        for (start, length), (next_start, _) in zip(pieces, pieces[1:]):
+            self.assertEqual(start % HLS_SEGMENT_SECONDS, 0)
+            self.assertEqual(start + length, next_start)
+
+    def test_pieces_are_at_least_the_minimum_length(self):
+        pieces = plan_chunks(300, 8)
+        self.assertEqual(pieces, [(0.0, 150.0), (150.0, None)])
+
+
+class StitchHlsPartsTests(SimpleTestCase):
+    rungs = [('720p', 720, 2_800_000, 128_000), ('360p', 360, 800_000, 96_000)]
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def write(self, name, content):
+        with open(os.path.join(self.folder, name), 'w') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.folder, name)) as f:
+            return f.read()
+
+    def write_parts(self):
+        # As ffmpeg writes them: segments numbered where they fall in the whole movie
+        for part, durations in enumerate([(10.0, 10.0), (10.0, 4.5)]):
+            for name, _, _, _ in self.rungs:
+                entries = "".join(
+                    f"#EXTINF:{duration:.6f},\n{name}_{part * 2 + index:03d}.ts\n" for index, duration in enumerate(durations)
+                )
+                self.write(
+                    f"{name}.part{part:03d}.m3u8",
+                    f"#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:10\n#EXT-X-MEDIA-SEQUENCE:{part * 2}\n"
+                    f"#EXT-X-PLAYLIST-TYPE:VOD\n{entries}#EXT-X-ENDLIST\n"
+                )
+            self.write(f"bot.part{part:03d}.mp4", "")
+        self.write(
+            "master.part000.m3u8",
+            "#EXTM3U\n#EXT-X-VERSION:3\n"
+            "#EXT-X-STREAM-INF:BANDWIDTH=3000000\n720p.part000.m3u8\n"
+            "#EXT-X-STREAM-INF:BANDWIDTH=900000\n360p.part000.m3u8\n"
+        )
+
+    def test_stitches_playlists_and_bot_rendition(self):
+        self.write_parts()
+        concatenated = []
+
+        def run_ffmpeg(cmd, *args, **kwargs):
+            concatenated.append(self.read(cmd[cmd.index('-i') + 1]))
+
+        with mock.patch('movie.tasks._run_ffmpeg', side_effect=run_ffmpeg):
+            stitch_hls_parts(self.folder, self.rungs, 2)
+
+        for name, _, _, _ in self.rungs:
+            self.assertEqual(
+                self.read(f"{name}.m3u8"),
+                "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:10\n#EXT-X-MEDIA-SEQUENCE:0\n#EXT-X-PLAYLIST-TYPE:VOD\n"
+                f"#EXTINF:10.000000,\n{name}_000.ts\n#EXTINF:10.000000,\n{name}_001.ts\n"
+                f"#EXTINF:10.000000,\n{name}_002.ts\n#EXTINF:4.500000,\n{name}_003.ts\n"
+                "#EXT-X-ENDLIST\n"
+            )
+        master = self.read(HLS_MASTER_PLAYLIST)
+        self.assertIn("\n720p.m3u8\n", master)
+        self.assertIn("\n360p.m3u8\n", master)
+        self.assertNotIn("part", master)
+        self.assertEqual(concatenated, ["file 'bot.part000.mp4'\nfile 'bot.part001.mp4'\n"])
+        # Only the stitched output is left
+        self.assertEqual(sorted(os.listdir(self.folder)), ['360p.m3u8', '720p.m3u8', HLS_MASTER_PLAYLIST])
+
+
+class MovieMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch('movie.signals.convert_movie_to_hls.delay')
+        self.convert = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, title, content=b'same movie'):
+        return Movie.objects.create(
+            title=title, duration_minutes=90, movie_file=SimpleUploadedFile(f'{title}.mp4', content)
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.upload('first')
+        second = self.upload('second')
+        self.assertEqual(first.media_id, second.media_id)
+        self.assertEqual(first.movie_file.name, second.movie_file.name)
+        self.assertEqual(MovieMedia.objects.get().references, 2)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'movies')), [os.path.basename(first.movie_file.name)])
+        # The second shares the first's conversion instead of converting again
+        self.convert.assert_called_once_with(first.id)
+
+    def test_file_removed_with_last_movie(self):
+        first = self.upload('first')
+        second = self.upload('second')
+        other = self.upload('other', b'another movie')
+        hls_folder = os.path.join(self.media_root, 'hls', str(first.id))
+        os.makedirs(hls_folder)
+        Movie.objects.filter(media_id=first.media_id).update(hls_path=os.path.join(hls_folder, HLS_MASTER_PLAYLIST))
+        path = first.movie_file.path
+
+        Movie.objects.get(id=first.id).delete()
+        self.assertEqual(MovieMedia.objects.get(id=second.media_id).references, 1)
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.isdir(hls_folder))
+
+        Movie.objects.get(id=second.id).delete()
+        self.assertFalse(MovieMedia.objects.filter(id=second.media_id).exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(hls_folder))
+        self.assertTrue(os.path.exists(other.movie_file.path))
+
+
+class FakeContainer:
+    """What stream_copy_plan reads of an opened movie"""
+
+    def __init__(self, video, audio=None, keyframes=(), start_time=0):
+        self.streams = SimpleNamespace(video=[video], audio=[audio] if audio else [])
+        self.start_time = start_time
+        self.packets = [
+            SimpleNamespace(is_keyframe=True, pts=round((seconds + start_time / 1_000_000) / video.time_base))
+            for seconds in keyframes
+        ]
+
+    def demux(self, stream):
+        return iter(self.packets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def video_stream(codec='h264', profile='High', pix_fmt='yuv420p', height=720, bit_rate=2_500_000):
+    return SimpleNamespace(
+        codec_context=SimpleNamespace(name=codec, profile=profile, pix_fmt=pix_fmt),
+        height=height, bit_rate=bit_rate, average_rate=Fraction(25), time_base=Fraction(1, 90000)
+    )
+
+
+def audio_stream(codec='aac', profile='LC', channels=2, bit_rate=128_000):
+    return SimpleNamespace(codec_context=SimpleNamespace(name=codec, profile=profile, channels=channels), bit_rate=bit_rate)
+
+
+class StreamCopyPlanTests(SimpleTestCase):
+    # Top rendition 720p at 2.8 Mb/s, audio at 128, 128 and 96 kb/s
+    rungs = HLS_LADDER[1:]
+    on_boundaries = (0, 10, 20, 30)
+
+    def plan(self, video=None, audio=None, keyframes=on_boundaries, start_time=0):
+        container = FakeContainer(video or video_stream(), audio, keyframes, start_time)
+        with mock.patch('av.open', return_value=container):
+            return stream_copy_plan('movie.mp4', self.rungs)
+
+    def test_video(self):
+        cases = [
+            ('HLS-ready', {}, self.on_boundaries, True),
+            ('other codec', {'codec': 'hevc'}, self.on_boundaries, False),
+            ('10-bit profile', {'profile': 'High 10'}, self.on_boundaries, False),
+            ('4:2:2', {'pix_fmt': 'yuv422p'}, self.on_boundaries, False),
+            ('not the top rendition height', {'height': 1080}, self.on_boundaries, False),
+            ('unknown bitrate', {'bit_rate': 0}, self.on_boundaries, False),
+            ('bitrate far above the rendition', {'bit_rate': 4_300_000}, self.on_boundaries, False),
+            ('bitrate within the ratio', {'bit_rate': 4_100_000}, self.on_boundaries, True),
+            ('keyframes in between too', {}, (0, 5, 10, 15, 20), True),
+            ('keyframe a frame off a boundary', {}, (0, 10.01, 20), True),
+            ('boundary without keyframe', {}, (0, 12, 20), False),
+            ('keyframe interval longer than a segment', {}, (0, 20, 40), False),
+        ]
+        for label, stream, keyframes, copy in cases:
+            with self.subTest(label):
+                self.assertEqual(self.plan(video_stream(**stream), keyframes=keyframes)[0], copy)
+
+    def test_boundaries_count_from_container_start(self):
+        self.assertTrue(self.plan(keyframes=self.on_boundaries, start_time=1_400_000)[0])
+
+    def test_audio(self):
+        all_rungs = ['720p', '480p', '360p']
+        cases = [
+            ('no audio', None, []),
+            ('AAC-LC stereo', audio_stream(), all_rungs),
+            ('AAC-LC mono', audio_stream(channels=1, bit_rate=64_000), all_rungs),
+            ('too rich for the lowest rung', audio_stream(bit_rate=192_000), ['720p', '480p']),
+            ('HE-AAC', audio_stream(profile='HE-AAC'), []),
+            ('surround', audio_stream(channels=6), []),
+            ('other codec', audio_stream(codec='mp3'), []),
+            ('unknown bitrate', audio_stream(bit_rate=0), []),
+        ]
+        for label, audio, copy_audio in cases:
+            with self.subTest(label):
+                self.assertEqual(self.plan(audio=audio)[1], copy_audio)
+
+
+def progress_report(out_time_us, fps, speed, progress='continue'):
+    """One block of ffmpeg's -progress pipe:1 output"""
+    return [
+        f"frame=0\n", f"fps={fps}\n", f"out_time_us={out_time_us}\n", f"out_time=00:00:00.000000\n",
+        f"speed={speed}\n", f"progress={progress}\n",
+    ]
+
+
+class FakeFfmpeg:
+    """subprocess.Popen of an ffmpeg printing ``stdout`` and ``stderr`` then exiting with ``returncode``"""
+
+    def __init__(self, stdout, stderr=b'', returncode=0):
+        self.stdout_lines = stdout
+        self.stderr = stderr
+        self.returncode = returncode
+        self.cmd = None
+
+    def __call__(self, cmd, stdout, stderr, text):
+        self.cmd = cmd
+        stderr.write(self.stderr)
+        self.stdout = iter(self.stdout_lines)
+        return self
+
+    def wait(self):
+        return self.returncode
+
+
+class RunFfmpegTests(SimpleTestCase):
+    def run_ffmpeg(self, process, **kwargs):
+        with mock.patch('movie.tasks.subprocess.Popen', side_effect=process):
+            _run_ffmpeg(['ffmpeg', '-i', 'in.mp4', 'out.m3u8'], **kwargs)
+
+    def test_reports_progress(self):
+        process = FakeFfmpeg(
+            progress_report('N/A', '0.00', 'N/A')
+            + progress_report(2_500_000, '60.0', '2.5x')
+            + progress_report(5_000_000, '61.5', '2.46x')
+            # The last block, with the speed of a stopped clock
+            + progress_report(6_000_000, '0.0', '0.1x', progress='end')
+        )
+        reports = []
+        self.run_ffmpeg(process, on_progress=lambda *report: reports.append(report))
+        self.assertEqual(process.cmd, ['ffmpeg', '-nostats', '-progress', 'pipe:1', '-i', 'in.mp4', 'out.m3u8'])
+        self.assertEqual(reports, [(None, 0.0, None), (2.5, 60.0, 2.5), (5.0, 61.5, 2.46)])
+
+    def test_progress_callback_failure_does_not_stop_the_conversion(self):
+        process = FakeFfmpeg(progress_report(1_000_000, '30.0', '1x') + progress_report(2_000_000, '30.0', '1x'))
+        on_progress = mock.Mock(side_effect=RuntimeError("cache down"))
+        with self.assertLogs('movie.tasks', 'WARNING'):
+            self.run_ffmpeg(process, on_progress=on_progress)
+        self.assertEqual(on_progress.call_count, 2)
+
+    def test_failure_raises_with_the_end_of_the_log(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        log_path = os.path.join(folder, 'logs', '1.log')
+        process = FakeFfmpeg([], stderr=b'x' * 8000 + b'\nin.mp4: Invalid data found when processing input\n', returncode=1)
+
+        with self.assertLogs('movie.tasks', 'ERROR'), self.assertRaises(Exception) as raised:
+            self.run_ffmpeg(process, log_path=log_path)
+        self.assertTrue(str(raised.exception).endswith('Invalid data found when processing input\n'))
+        self.assertEqual(len(str(raised.exception)), 4096)
+        # The whole log is kept for the admins
+        with open(log_path, 'rb') as f:
+            self.assertEqual(len(f.read()), 8000 + 50)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    MOVIE_PROGRESS_INTERVAL=5,
+)
+class ConversionProgressTests(TestCase):
+    def setUp(self):
+        self.movie = Movie.objects.bulk_create([Movie(title='Movie', duration_minutes=2, conversion_status='processing')])[0]
+        self.clock = 1000.0
+        patcher = mock.patch('movie.progress.time.monotonic', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('movie.progress.push_conversion_update')
+        self.push = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.progress = ConversionProgress(self.movie.id, duration=120.0, parts=2)
+        self.progress.clear()
+
+    def test_pieces_add_up(self):
+        first = self.progress.reporter(0, 60.0)
+        second = self.progress.reporter(1, 60.0)
+        # Nothing output yet
+        first(None, 0.0, None)
+        self.push.assert_not_called()
+
+        self.clock += 10
+        second(15.0, 24.0, 99.0)
+        first(30.0, 25.0, 99.0)
+        self.progress.publish()
+
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.conversion_progress, 37.5)
+        self.assertEqual(self.movie.conversion_fps, 49.0)
+        # Speeds measured here, not ffmpeg's: 3x and 1.5x
+        self.assertEqual(self.movie.conversion_speed, 4.5)
+        self.assertEqual(self.movie.conversion_eta_seconds, 16)
+        self.assertIsNotNone(self.movie.conversion_updated_at)
+        self.push.assert_called_with(
+            str(self.movie.id), conversion_status='processing', conversion_progress=37.5, conversion_fps=49.0,
+            conversion_speed=4.5, conversion_eta_seconds=16,
+        )
+
+    def test_publishes_at_most_once_an_interval(self):
+        report = self.progress.reporter(0, 60.0)
+        self.clock += 10
+        report(10.0, 25.0, 1.0)
+        self.assertEqual(self.push.call_count, 1)
+        self.clock += 1
+        report(12.0, 25.0, 1.0)
+        self.assertEqual(self.push.call_count, 1)
+        self.clock += 5
+        report(20.0, 25.0, 1.0)
+        self.assertEqual(self.push.call_count, 2)
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.conversion_progress, round(100 * 20.0 / 120.0, 1))
+
+    def test_done_is_clamped_to_the_piece(self):
+        report = self.progress.reporter(0, 60.0)
+        self.clock += 10
+        # -copyts pieces can report times past their end, or before their start
+        report(75.0, 25.0, 1.0)
+        self.progress.reporter(1, 60.0)(-3.0, 25.0, 1.0)
+        self.progress.publish()
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.conversion_progress, 50.0)
+
+    def test_finished_piece_stops_adding_to_the_rate(self):
+        report = self.progress.reporter(0, 60.0)
+        self.clock += 10
+        report(30.0, 25.0, 1.0)
+        self.progress.update(1, 60.0, None, None)
+        self.progress.publish()
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.conversion_progress, 75.0)
+        self.assertEqual(self.movie.conversion_speed, 3.0)
+        self.assertEqual(self.movie.conversion_eta_seconds, 10)
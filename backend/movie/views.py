@@ -3,6 +3,7 @@ from .models import Movie, MovieReview
 from .serializers import MovieSerializer, MovieReviewSerializer
 # Create your views here.
 from .permissions import IsAuthenticatedOrAdminEdit,IsOwnerOrReadOnly
+from .media import content_hash_upload_handlers
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 class MovieViewSet(viewsets.ModelViewSet):
@@ -10,6 +11,11 @@ class MovieViewSet(viewsets.ModelViewSet):
     serializer_class = MovieSerializer
     permission_classes = [IsAuthenticatedOrAdminEdit]
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Hash uploads while they are received, so duplicates are found without reading them again
+        request.upload_handlers = content_hash_upload_handlers(request)
+        return super().initialize_request(request, *args, **kwargs)
+
 
 class MovieReviewViewSet(viewsets.ModelViewSet):
     queryset = MovieReview.objects.all()